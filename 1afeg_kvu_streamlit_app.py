@@ -1,43 +1,54 @@
 import streamlit as st
-import time, hashlib, json, random, io, zipfile
-from datetime import datetime
-
-# ------------------ CONFIG & RESEARCH ------------------
-DAU_UK, QUERIES_PER_USER = 4_000_000, 5
-NATIONAL_DAILY_KVU = (DAU_UK * QUERIES_PER_USER) * 650
-KVU_VALUE, VAT_RATE = 0.001, 0.20
+import time, random
+from collections import deque
+from datetime import datetime, time as dtime
+from afeg_ledger import get_ledger
+from afeg_commit import get_committer
+from afeg_client import get_client
+from afeg_export import iter_export_zip
+from afeg_aggregates import get_aggregates
+from afeg_index import get_index
+from afeg_rollups import by_origin, get_rollups
+from afeg_view import ORDERS, SORTS, get_ledger_view
+from afeg_merkle import get_merkle, verify_proof
+from afeg_governance import get_engine
+from afeg_kvu import KVU_VALUE, VAT_RATE, build_entry
+from afeg_simulation import TIER_SHARES, simulate
 
 # ------------------ GOVERNANCE FILTERS ------------------
+# Rule sets are compiled into one automaton (see afeg_governance / governance_rules.json).
+governance = get_engine()
+
 def pass1_input_scan(query):
-    if any(x in query.lower() for x in ["hack", "exploit", "bypass", "malicious"]):
-        return False, "Input Risk (Firewall)"
+    hit = governance.scan(query, "input")
+    if hit:
+        return False, f"Input Risk (Firewall): {hit[1]}"
     return True, "Safe"
 
 def pass2_output_scan(response):
-    if any(x in response.lower() for x in ["unsafe", "leak", "pii", "private"]):
-        return False, "Output Risk (Filter)"
+    hit = governance.scan(response, "output")
+    if hit:
+        return False, f"Output Risk (Filter): {hit[1]}"
     return True, "Safe"
 
 # ------------------ STATE ------------------
-if "ledger_compliant" not in st.session_state: st.session_state.ledger_compliant = []
-if "ledger_intercept" not in st.session_state: st.session_state.ledger_intercept = []
-if "session_rev" not in st.session_state: st.session_state.session_rev = 0.0
+# One on-disk, hash-chained ledger shared by every session of this server,
+# with running totals maintained on each commit. Commits from all sessions are
+# group-committed: one fsync per batch, and a restart loses nothing committed.
+ledger = get_ledger()
+aggregates = get_aggregates()
+ledger_index = get_index()
+rollups = get_rollups()
+ledger_view = get_ledger_view()
+merkle = get_merkle()
+ledger.sync()  # pick up commits from the gateway, importer and other apps on every rerun
+TERMINAL_LINES = 50
 if "current" not in st.session_state: st.session_state.current = None
+if "sim_result" not in st.session_state: st.session_state.sim_result = None
+if "vault_cursors" not in st.session_state: st.session_state.vault_key, st.session_state.vault_cursors = None, [None]
 
-def commit_to_ledger(query, status, reason, action, inf, res, mem):
-    total_kvu = inf + res + mem
-    entry = {"query": query, "timestamp": datetime.now().strftime("%H:%M:%S"),
-             "inf": inf, "res": res, "mem": mem, "kvu": total_kvu,
-             "value": total_kvu * KVU_VALUE, "vat": (total_kvu * KVU_VALUE) * VAT_RATE,
-             "status": status, "reason": reason, "action": action,
-             "hash": hashlib.sha256(str(random.random()).encode()).hexdigest()}
-    
-    if status == "COMPLIANT":
-        st.session_state.ledger_compliant.append(entry)
-    else:
-        st.session_state.ledger_intercept.append(entry)
-    
-    st.session_state.session_rev += entry["value"]
+def commit_to_ledger(query, status, reason, action, inf, res, mem, origin="Live"):
+    entry = get_committer().commit(build_entry(query, status, reason, action, inf, res, mem, origin))
     st.session_state.current = entry
     return entry
 
@@ -55,10 +66,10 @@ if portal == "CEO Gateway":
     # MASTER METRICS (Linked to Act 4)
     m1, m2, m3 = st.columns(3)
     def update_master_metrics():
-        t_kvu = sum(e['kvu'] for e in st.session_state.ledger_compliant + st.session_state.ledger_intercept)
-        m1.metric("GROSS REVENUE", f"£{st.session_state.session_rev:,.2f}")
-        m2.metric("VAT CAPTURE", f"£{(st.session_state.session_rev * VAT_RATE):,.2f}")
-        m3.metric("VALIDATED KVUs", f"{t_kvu:,.0f}")
+        agg = aggregates.snapshot()
+        m1.metric("GROSS REVENUE", f"£{agg['value']:,.2f}")
+        m2.metric("VAT CAPTURE", f"£{agg['vat']:,.2f}")
+        m3.metric("VALIDATED KVUs", f"{agg['kvu']:,.0f}")
 
     update_master_metrics()
 
@@ -93,12 +104,13 @@ if portal == "CEO Gateway":
         inf_m = s1.empty(); res_m = s2.empty(); mem_m = s3.empty()
         
         if st.button("EXECUTE SURGE"):
-            t_win, logs = st.empty(), []
+            # Bounded ring of terminal lines: each tick redraws at most TERMINAL_LINES, not the whole history.
+            t_win, logs = st.empty(), deque(maxlen=TERMINAL_LINES)
             r_inf, r_res, r_mem = 0, 0, 0
             for i in range(15):
                 q = f"SURGE_NODE_{random.randint(100,999)}"
                 bi, br, bm = 50000, 25000, 10000
-                commit_to_ledger(q, "COMPLIANT", "Surge", "Verified", bi, br, bm)
+                commit_to_ledger(q, "COMPLIANT", "Surge", "Verified", bi, br, bm, "Surge")
                 r_inf += bi; r_res += br; r_mem += bm
                 
                 inf_m.metric("INFERENCE", f"{r_inf:,.0f} KVU")
@@ -106,44 +118,91 @@ if portal == "CEO Gateway":
                 mem_m.metric("MEMORY", f"{r_mem:,.0f} KVU")
                 update_master_metrics()
                 
-                logs.insert(0, f"<span style='color:#00FF41'>[{datetime.now().strftime('%H:%M:%S')}] {q} | COMPLIANT | +85k KVU</span>")
+                logs.appendleft(f"<span style='color:#00FF41'>[{datetime.now().strftime('%H:%M:%S')}] {q} | COMPLIANT | +85k KVU</span>")
                 t_win.markdown(f'<div class="terminal">{"<br>".join(logs)}</div>', unsafe_allow_html=True)
                 time.sleep(2.0)
-            st.rerun()
 
     with tabs[2]:
         st.header("ACT 3: LEDGER VAULT")
-        search = st.text_input("Search Ledger (SHA-256 Integrity Check)")
-        full = st.session_state.ledger_compliant + st.session_state.ledger_intercept
-        if search:
-            full = [e for e in full if search.lower() in e['query'].lower() or search.lower() in e['hash'].lower()]
-        st.dataframe(full, use_container_width=True)
+        search = st.text_input("Search Ledger (SHA-256 Integrity Check)", help="Hash prefix, or 3+ characters of a query")
+        st.caption(f"Chain head `{ledger.head}` · {len(ledger):,} records")
+        if st.button("VERIFY CHAIN"):
+            check = ledger.verify()
+            if check["ok"]: st.success(f"Chain intact through seq {check['verified_seq']:,} ({check['checked']:,} newly verified).")
+            else: st.error(f"Integrity failure: {check['error']}")
+        seqs = ledger_index.hash_prefix(search, 1) if len(search) == 64 else []
+        if seqs and st.button("INCLUSION PROOF"):
+            proof = merkle.proof(seqs[0])
+            block = proof["block"]
+            if verify_proof(proof["record_hash"], proof["path"], block["root"]):
+                state = "open block (unsigned)" if block.get("open") else f"signed root `{block['root'][:16]}…`"
+                st.success(f"Seq {proof['seq']:,} included in hour block {block['block']} via {len(proof['path'])} hashes · {state}")
+            else: st.error("Proof does not fold to the block root.")
+            st.json(proof, expanded=False)
+        # Only the visible page is fetched and sent to the browser; cursors[-1] is the current page.
+        v1, v2, v3, v4, v5 = st.columns(5)
+        sort = v1.selectbox("Sort", SORTS, format_func={"ts": "Time", "kvu": "KVU", "status": "Status"}.get)
+        order = v2.selectbox("Order", ORDERS)
+        status_f = v3.multiselect("Status", ["COMPLIANT", "INTERCEPT"])
+        origin_f = v4.multiselect("Origin", ["Live", "Surge", "National Grid"])
+        size = v5.selectbox("Rows", [25, 50, 100, 250], index=1)
+        vault_key = (search, sort, order, tuple(status_f), tuple(origin_f), size)
+        if st.session_state.vault_key != vault_key:
+            st.session_state.vault_key, st.session_state.vault_cursors = vault_key, [None]
+        cursors = st.session_state.vault_cursors
+        page = ledger_view.page(sort, order, size, cursors[-1], status_f, origin_f, q=search or None)
+        st.dataframe(page["rows"], use_container_width=True)
+        p1, p2, p3 = st.columns([1, 1, 4])
+        if p1.button("◀ PREV", disabled=len(cursors) == 1):
+            cursors.pop(); st.rerun()
+        if p2.button("NEXT ▶", disabled=page["next_cursor"] is None):
+            cursors.append(page["next_cursor"]); st.rerun()
+        p3.caption(f"Page {len(cursors)} · {len(page['rows'])} rows")
 
     with tabs[3]:
         st.header("ACT 4: 24H ENDURANCE (SYNCED SIMULATION)")
+        paths = st.select_slider("Monte Carlo paths", [500, 1000, 2000, 5000, 10000], value=2000)
         if st.button("START FORENSIC SCALING"):
-            e_win, e_logs = st.empty(), []
-            for i in range(24):
-                time_label = f"{i:02d}:00"
-                h_kvu = (NATIONAL_DAILY_KVU / 24) * random.uniform(0.6, 1.4)
-                # Split the randomized hourly load into categories
-                commit_to_ledger(f"STRESS_{time_label}", "COMPLIANT", "Batch", "Audited", h_kvu/3, h_kvu/3, h_kvu/3)
-                
-                # Update top-level metrics in real-time during the loop
-                update_master_metrics()
-                
-                e_logs.insert(0, f"<span style='color:#00FF41'>[{time_label}] SYNC | KVU: {h_kvu:,.0f} | VAT: £{(h_kvu*KVU_VALUE*VAT_RATE):,.2f}</span>")
-                e_win.markdown(f'<div class="terminal">{"<br>".join(e_logs)}</div>', unsafe_allow_html=True)
-                time.sleep(0.5)
+            with st.spinner("Simulating national load..."):
+                sim = simulate(paths=paths, days=1)
+            # Commit the median hourly profile, split by tier, as one group commit
+            records = get_committer().commit_many(
+                build_entry(f"STRESS_{i:02d}:00", "COMPLIANT", "Batch", "Audited",
+                            h_kvu * TIER_SHARES["inf"], h_kvu * TIER_SHARES["res"], h_kvu * TIER_SHARES["mem"], "National Grid")
+                for i, h_kvu in enumerate(sim["hourly_kvu"]["p50"]))
+            st.session_state.current = records[-1]
+            st.session_state.sim_result = sim
             st.rerun()
 
+        sim = st.session_state.sim_result
+        if sim:
+            vat = sim["daily_vat"]
+            b1, b2, b3 = st.columns(3)
+            b1.metric("DAILY VAT (p5)", f"£{vat['p5']:,.0f}")
+            b2.metric("DAILY VAT (p50)", f"£{vat['p50']:,.0f}")
+            b3.metric("DAILY VAT (p95)", f"£{vat['p95']:,.0f}")
+            st.line_chart({k: sim["hourly_kvu"][k] for k in ("p5", "p50", "p95")})
+            e_logs = [f"<span style='color:#00FF41'>[{i:02d}:00] SYNC | KVU: {h:,.0f} | VAT: £{(h*KVU_VALUE*VAT_RATE):,.2f}</span>"
+                      for i, h in enumerate(sim["hourly_kvu"]["p50"])][::-1]
+            st.markdown(f'<div class="terminal">{"<br>".join(e_logs)}</div>', unsafe_allow_html=True)
+            st.caption(f"{sim['paths']:,} paths in {sim['elapsed_s']:.2f}s")
+
+        # Committed ledger VAT from the hourly rollups: cost is 24 buckets, not the day's events.
+        since = time.time() - 86_400
+        rows = [dict(r, start=datetime.fromtimestamp(r["start"]).strftime("%H:00")) for r in by_origin(rollups.query("hour", since))]
+        if rows:
+            st.subheader("LEDGER VAT BY HOUR (LAST 24H)")
+            st.bar_chart(rows, x="start", y=[k for k in rows[0] if k != "start"])
+            day = rollups.totals("hour", since)
+            st.caption(f"Intercepts: {day['intercepts']:,.0f} · " + " · ".join(f"{o}: {v['intercepts']:,.0f}" for o, v in day["origins"].items()))
+
     with tabs[4]:
         st.header("ACT 5: EXECUTIVE VALUATION ROI")
         v_col1, v_col2 = st.columns(2)
         with v_col1:
             st.subheader("Risk Mitigation Analysis")
             # Based on SHA-256 Evidence Integrity Logic
-            dispute_risk = (sum(e['kvu'] for e in st.session_state.ledger_compliant) * 0.01) * 2.0
+            dispute_risk = aggregates.dispute_risk
             st.metric("UNMITIGATED DISPUTE RISK", f"£{dispute_risk:,.2f}", delta="Critical", delta_color="inverse")
             st.write("Projected legal cost without Evidence Verification Engine (EV424).")
         with v_col2:
@@ -154,9 +213,18 @@ if portal == "CEO Gateway":
 
 else:
     st.title("HM TREASURY // AUDIT EXPORT")
-    if st.session_state.ledger_compliant or st.session_state.ledger_intercept:
-        buf = io.BytesIO()
-        with zipfile.ZipFile(buf, "x") as audit_zip:
-            audit_zip.writestr("LEDGER_COMPLIANT.json", json.dumps(st.session_state.ledger_compliant, indent=4))
-            audit_zip.writestr("LEDGER_INTERCEPTED.json", json.dumps(st.session_state.ledger_intercept, indent=4))
-        st.download_button("EXPORT TREASURY ZIP", data=buf.getvalue(), file_name="AFEG_AUDIT.zip")
\ No newline at end of file
+    if len(ledger):
+        # The gateway streams the archive (NDJSON in ZIP + MANIFEST.json); if the browser cannot reach it,
+        # the same archive is built from this server's ledger and handed over as a download.
+        rng = st.date_input("Export window (optional)", value=())
+        since = until = None
+        if len(rng) == 2:
+            since = datetime.combine(rng[0], dtime.min).timestamp()
+            until = datetime.combine(rng[1], dtime.max).timestamp()
+        link_col, local_col = st.columns(2)
+        link_col.link_button("EXPORT TREASURY ZIP", get_client().export_url(since, until))
+        if local_col.button("PREPARE ZIP ON THIS SERVER"):
+            st.session_state.export_zip = (since, until, b"".join(iter_export_zip(ledger, since, until)))
+        prepared = st.session_state.get("export_zip")
+        if prepared and prepared[:2] == (since, until):
+            local_col.download_button("DOWNLOAD TREASURY ZIP", prepared[2], file_name="AFEG_AUDIT.zip", mime="application/zip")
\ No newline at end of file
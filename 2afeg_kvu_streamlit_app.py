@@ -1,67 +1,32 @@
 import streamlit as st
-import time, hashlib, json, random, io, zipfile
-from datetime import datetime
-from fastapi import FastAPI
-from pydantic import BaseModel
-from threading import Thread
-import uvicorn
+import asyncio, time
+from collections import deque
 import requests
+from datetime import datetime
+from afeg_client import GATEWAY_URL, get_client
+from afeg_loadtest import run_load_test
+from afeg_simulation import simulate
+from afeg_metrics import histogram_quantile, parse_prometheus
+from afeg_rollups import by_origin
 
 # -----------------------------
-# FASTAPI BACKEND SETUP
+# GATEWAY CLIENT
 # -----------------------------
-app = FastAPI(title="AFEG v7 Gateway API")
+# The gateway runs as its own process (python afeg_gateway.py --workers N) and owns
+# the ledger; this dashboard only talks to it through a pooled keep-alive client.
+gateway = get_client()
 
-class QueryPayload(BaseModel):
-    query: str
-    mode: str = "live"
+def fetch_aggregates():
+    try:
+        return gateway.aggregates()
+    except requests.RequestException as exc:
+        st.warning(f"Gateway Offline ({GATEWAY_URL}): {exc}")
+        return {"count": 0, "kvu": 0.0, "value": 0.0, "vat": 0.0}
 
-def calculate_complexity_kvu(query):
-    base = 400.0 # Base computational units
-    q = query.lower()
-    label, heat = "Standard", "low"
-    if any(w in q for w in ["why", "how", "explain", "audit"]):
-        inf, res, mem = base * 0.8, base * 2.5, base * 0.5
-        label, heat = "Deep Reasoning (High Compute)", "high"
-    elif any(w in q for w in ["what", "who", "where", "list"]):
-        inf, res, mem = base * 1.2, base * 0.4, base * 0.3
-    else:
-        inf, res, mem = base, base * 0.2, base * 0.1
-    return round(inf, 2), round(res, 2), round(mem, 2), label, heat
-
-@app.post("/afeg-gateway")
-def afeg_gateway(payload: QueryPayload):
-    inf, res, mem, label, heat = calculate_complexity_kvu(payload.query)
-    total_kvu = inf + res + mem
-    
-    risky_keywords = ["hack", "bypass", "exploit", "illegal", "steal"]
-    status = "approved"
-    if any(word in payload.query.lower() for word in risky_keywords):
-        status, total_kvu = "blocked", 0.0 # Rule: Risk events don't generate revenue
-
-    return {
-        "status": status,
-        "kvu": total_kvu,
-        "metrics": {"inf": inf, "res": res, "mem": mem},
-        "complexity": label,
-        "heat": heat,
-        "hash": hashlib.sha256(f"{payload.query}{time.time()}".encode()).hexdigest()[:12]
-    }
-
-def run_api():
-    uvicorn.run(app, host="127.0.0.1", port=8000, log_level="error")
-
-if "api_thread_started" not in st.session_state:
-    Thread(target=run_api, daemon=True).start()
-    st.session_state.api_thread_started = True
-
-# -----------------------------
-# SESSION STATE & UI CONFIG
+# -----------------------------
+# UI CONFIG
 # -----------------------------
 st.set_page_config(page_title="AFEG v7 Master Prototype", layout="wide")
-if "safe_ledger" not in st.session_state: st.session_state.safe_ledger = []
-if "risk_ledger" not in st.session_state: st.session_state.risk_ledger = []
-if "kvu_total" not in st.session_state: st.session_state.kvu_total = 0.0
 
 # DYNAMIC STYLING
 text_size = st.sidebar.slider("UI Text Size", 12, 32, 16)
@@ -78,10 +43,11 @@ st.markdown(f"""<style>
 # TOP LEVEL METRICS
 # -----------------------------
 st.title("AFEG v7 // Unified Governance Gateway")
+agg = fetch_aggregates()
 m1, m2, m3 = st.columns(3)
-m1.metric("GROSS REVENUE", f"£{st.session_state.kvu_total * 0.001:,.2f}")
-m2.metric("VAT CAPTURE", f"£{(st.session_state.kvu_total * 0.001 * 0.2):,.2f}")
-m3.metric("VALIDATED KVUs", f"{st.session_state.kvu_total:,.0f}")
+m1.metric("GROSS REVENUE", f"£{agg['value']:,.2f}")
+m2.metric("VAT CAPTURE", f"£{agg['vat']:,.2f}")
+m3.metric("VALIDATED KVUs", f"{agg['kvu']:,.0f}")
 
 # -----------------------------
 # ACT 1: LIVE GATEWAY
@@ -90,9 +56,10 @@ st.subheader("ACT 1: GATEWAY AUDIT")
 user_query = st.text_input("Enter query (e.g., 'What is AI' vs 'How do I audit AI'):")
 if st.button("RUN AUDIT") and user_query:
     try:
-        r = requests.post("http://127.0.0.1:8000/afeg-gateway", json={"query": user_query}).json()
-        st.session_state.kvu_total += r["kvu"]
-        
+        r = gateway.audit(user_query)
+    except requests.RequestException as exc:
+        st.error(f"Gateway Offline: {exc}")
+    else:
         # Heatmap Display
         with st.container():
             st.markdown(f'<div class="heat-{r["heat"]}">', unsafe_allow_html=True)
@@ -104,41 +71,149 @@ if st.button("RUN AUDIT") and user_query:
         c1.metric("INF", r['metrics']['inf'])
         c2.metric("RES", r['metrics']['res'])
         c3.metric("MEM", r['metrics']['mem'])
-        
-        entry = {"timestamp": datetime.now().isoformat(), "query": user_query, "kvu": r["kvu"], "status": r["status"]}
-        if r["status"] == "approved": st.session_state.safe_ledger.append(entry)
-        else: st.session_state.risk_ledger.append(entry)
-    except: st.error("Gateway Offline")
 
 # -----------------------------
-# ACT 2: 60s REAL-TIME SURGE
+# ACT 2: NATIONAL SURGE (MEASURED LOAD TEST)
 # -----------------------------
 st.divider()
-st.subheader("ACT 2: 60-SECOND NATIONAL SURGE")
+st.subheader("ACT 2: NATIONAL SURGE")
+sc1, sc2, sc3 = st.columns(3)
+surge_requests = sc1.number_input("Requests", 100, 100_000, 2_000, step=100)
+surge_clients = sc2.number_input("Concurrent clients", 1, 512, 64)
+surge_mix = sc3.text_input("Query mix", "deep=0.3,standard=0.6,risky=0.1")
 if st.button("EXECUTE LIVE SURGE"):
-    prog = st.progress(0)
-    for i in range(30):
-        batch_kvu = random.uniform(5000, 15000)
-        st.session_state.kvu_total += batch_kvu
-        prog.progress((i + 1) / 30)
-        time.sleep(2)
-        st.rerun()
+    with st.spinner("Driving the gateway..."):
+        report = asyncio.run(run_load_test(int(surge_requests), int(surge_clients), surge_mix, url=GATEWAY_URL))
+    r1, r2, r3, r4 = st.columns(4)
+    r1.metric("THROUGHPUT", f"{report['throughput_rps']:,.0f} req/s")
+    r2.metric("p50", f"{report['latency_ms']['p50']:.1f} ms")
+    r3.metric("p95", f"{report['latency_ms']['p95']:.1f} ms")
+    r4.metric("p99", f"{report['latency_ms']['p99']:.1f} ms")
+    st.bar_chart({str(b["le"]): b["count"] for b in report["histogram_ms"]})
+    with st.expander("Full report"):
+        st.json(report)
+
+# -----------------------------
+# LIVE LEDGER FEED (SERVER-SENT EVENTS)
+# -----------------------------
+# The gateway pushes only new records and aggregate deltas; this viewer keeps a
+# bounded ring of lines and applies the deltas, so watching a surge costs the
+# same whatever the ledger size, and resumes from the last seq it saw.
+FEED_LINES, FEED_REDRAW = 200, 0.25
+if "feed_lines" not in st.session_state:
+    st.session_state.feed_lines, st.session_state.feed_seq, st.session_state.feed_totals = deque(maxlen=FEED_LINES), None, None
+
+st.divider()
+st.subheader("LIVE LEDGER FEED")
+watch_s = st.number_input("Watch for (seconds)", 5, 3_600, 60)
+if st.button("WATCH LIVE FEED"):
+    lines, totals = st.session_state.feed_lines, st.session_state.feed_totals
+    f1, f2, f3, f4 = st.columns(4)
+    f_kvu, f_vat, f_count, f_int = f1.empty(), f2.empty(), f3.empty(), f4.empty()
+    term = st.empty()
+
+    def redraw():
+        if totals:
+            f_kvu.metric("LEDGER KVUs", f"{totals['kvu']:,.0f}")
+            f_vat.metric("LEDGER VAT", f"£{totals['vat']:,.2f}")
+            f_count.metric("RECORDS", f"{totals['count']:,}")
+            f_int.metric("INTERCEPTS", f"{totals['intercepts']:,}")
+        term.code("\n".join(lines) or "waiting for ledger events...", language=None)
+
+    deadline, drawn = time.monotonic() + watch_s, 0.0
+    try:
+        for event, seq, data in gateway.feed(after=st.session_state.feed_seq):
+            if event == "snapshot":
+                totals = {"count": data["count"], "kvu": data["kvu"], "value": data["value"], "vat": data["vat"],
+                          "intercepts": data["by_status"].get("INTERCEPT", {}).get("count", 0)}
+                st.session_state.feed_seq = data["seq"]
+            elif event == "ledger":
+                lines.appendleft(f"#{seq:<8} {data.get('origin', 'Live'):<13} {data['status']:<10} "
+                                 f"{data['kvu']:>12,.0f} KVU  {data['hash'][:12]}  {data.get('query', '')[:40]}")
+                st.session_state.feed_seq = seq
+            elif event == "aggregates" and totals:
+                for k in ("count", "kvu", "value", "vat", "intercepts"):
+                    totals[k] += data[k]
+            now = time.monotonic()
+            if now - drawn >= FEED_REDRAW:
+                redraw(); drawn = now
+            if now >= deadline:
+                break
+    except requests.RequestException as exc:
+        st.warning(f"Gateway Offline: {exc}")
+    st.session_state.feed_totals = totals
+    redraw()
 
 # -----------------------------
 # ACT 5: REVENUE FORECAST (FORECASTING)
 # -----------------------------
-if st.session_state.kvu_total > 0:
+@st.cache_data(show_spinner=False)
+def annual_forecast(paths=500, seed=7):
+    return simulate(paths=paths, days=365, seed=seed)
+
+if agg["count"] > 0:
     st.sidebar.divider()
-    annual_est = (st.session_state.kvu_total * 0.001 * 365) * 1000 # Normalized scale
+    band = annual_forecast()["annual_vat"]
     st.sidebar.subheader("Annual National Forecast")
-    st.sidebar.metric("Est. Annual VAT", f"£{(annual_est * 0.2):,.0f}")
+    st.sidebar.metric("Est. Annual VAT", f"£{band['p50']:,.0f}")
+    st.sidebar.caption(f"90% band: £{band['p5']:,.0f} – £{band['p95']:,.0f}")
+
+# -----------------------------
+# FISCAL ROLLUPS (LEDGER VAT BY DAY)
+# -----------------------------
+if agg["count"] > 0:
+    st.divider()
+    st.subheader("LEDGER VAT BY DAY (LAST 30 DAYS)")
+    try:
+        days = gateway.rollups("day", since=time.time() - 30 * 86_400)["buckets"]
+    except requests.RequestException as exc:
+        st.warning(f"Gateway Offline: {exc}")
+    else:
+        rows = [dict(r, start=datetime.fromtimestamp(r["start"]).strftime("%d %b")) for r in by_origin(days)]
+        if rows:
+            st.bar_chart(rows, x="start", y=[k for k in rows[0] if k != "start"])
+        st.caption(f"{len(days)} day buckets · intercepts: {sum(b['intercepts'] for b in days):,}")
 
 # -----------------------------
 # LEDGER EXPORT
 # -----------------------------
-if st.session_state.safe_ledger or st.session_state.risk_ledger:
-    buf = io.BytesIO()
-    with zipfile.ZipFile(buf, "w") as zf:
-        zf.writestr("SAFE.json", json.dumps(st.session_state.safe_ledger))
-        zf.writestr("RISK.json", json.dumps(st.session_state.risk_ledger))
-    st.download_button("EXPORT AUDIT TICKETS", data=buf.getvalue(), file_name="AFEG_AUDIT.zip")
\ No newline at end of file
+if agg["count"] > 0:
+    # Gateway decisions are in the shared ledger; the API streams the archive. The fallback fetches it
+    # from this server for browsers that cannot reach the gateway directly.
+    link_col, fetch_col = st.columns(2)
+    link_col.link_button("EXPORT AUDIT TICKETS", gateway.export_url())
+    if fetch_col.button("FETCH ARCHIVE VIA THIS SERVER"):
+        try:
+            st.session_state.export_zip = gateway.export_zip()
+        except requests.RequestException as exc:
+            st.warning(f"Export failed: {exc}")
+    if st.session_state.get("export_zip"):
+        fetch_col.download_button("DOWNLOAD AUDIT TICKETS", st.session_state.export_zip,
+                                  file_name="AFEG_AUDIT.zip", mime="application/zip")
+
+# -----------------------------
+# DIAGNOSTICS (OPTIONAL)
+# -----------------------------
+if st.sidebar.toggle("Gateway diagnostics"):
+    st.divider()
+    st.subheader("DIAGNOSTICS // GATEWAY HOT PATH")
+    try:
+        samples = parse_prometheus(gateway.metrics_text())
+    except requests.RequestException as exc:
+        st.error(f"Gateway Offline: {exc}")
+    else:
+        buckets, sums, counts, totals = {}, {}, {}, {}
+        for name, labels, value in samples:
+            if name == "afeg_stage_seconds_bucket":
+                buckets.setdefault(labels["stage"], []).append((float(labels["le"]), value))
+            elif name == "afeg_stage_seconds_sum": sums[labels["stage"]] = value
+            elif name == "afeg_stage_seconds_count": counts[labels["stage"]] = value
+            elif name in ("afeg_decisions_total", "afeg_ledger_commits_total"): totals[labels["status"]] = value
+            elif name == "afeg_ledger_records": totals["Ledger records"] = value
+        st.dataframe([{"Stage": s, "Count": int(n), "Mean (µs)": round(sums[s] / n * 1e6, 1) if n else 0.0,
+                       "p50 (µs)": round(histogram_quantile(0.5, buckets[s]) * 1e6, 1),
+                       "p95 (µs)": round(histogram_quantile(0.95, buckets[s]) * 1e6, 1),
+                       "p99 (µs)": round(histogram_quantile(0.99, buckets[s]) * 1e6, 1)}
+                      for s, n in sorted(counts.items())], use_container_width=True, hide_index=True)
+        for col, (label, value) in zip(st.columns(max(1, len(totals))), totals.items()):
+            col.metric(label.upper(), f"{value:,.0f}")
@@ -1,36 +1,44 @@
 import streamlit as st
-import hashlib, json, random, time, io
+import random, time
 import pandas as pd
-import numpy as np
+from collections import deque
 from datetime import datetime
+from afeg_ledger import get_ledger
+from afeg_commit import get_committer
+from afeg_aggregates import get_aggregates
+from afeg_kvu import build_entry, classification_cache, classify
+from afeg_rollups import by_origin, get_rollups
+from afeg_view import get_ledger_view
+from afeg_simulation import TIER_SHARES, simulate
 
 # -----------------------------
 # CORE LOGIC (KITCHEN LOGIC)
 # -----------------------------
+MODE_MULTIPLIERS = {"Live Enforcement": 1.0, "Demo Simulation": 2.5}
+SURGE_ROWS = 50
+
 def calculate_complexity_kvu(query, mode):
-    base = 400.0
-    q = query.lower()
-    if any(w in q for w in ["why", "how", "explain", "audit"]):
-        inf, res, mem = base * 0.8, base * 2.5, base * 0.5
-        label, heat = "Deep Reasoning", "high"
-    elif any(w in q for w in ["what", "who", "where", "list"]):
-        inf, res, mem = base * 1.2, base * 0.4, base * 0.3
-        label, heat = "Standard Inference", "low"
-    else:
-        inf, res, mem = base, base * 0.2, base * 0.1
-        label, heat = "Basic System", "low"
-    
-    multiplier = 2.5 if mode == "Demo Simulation" else 1.0
-    return round(inf * multiplier, 2), round(res * multiplier, 2), round(mem * multiplier, 2), label, heat
+    # Same tier rules and process-wide cache as the gateway; mode and multiplier are part of the key.
+    c = classify(query, mode, MODE_MULTIPLIERS.get(mode, 1.0))
+    return c["inf"], c["res"], c["mem"], c["label"], c["heat"]
+
+def vault_entry(origin, query, label, inf, res, mem):
+    """Ledger entry for one vault row (ts, seq and hash are assigned by the ledger)."""
+    entry = build_entry(query, "COMPLIANT", label, "Audited", inf, res, mem, origin)
+    entry["type"] = label
+    return entry
 
 # -----------------------------
 # UI SETUP & TERMINAL STYLING
 # -----------------------------
 st.set_page_config(page_title="AFEG v7 Gateway", layout="wide")
 
-if "total_kvu" not in st.session_state: st.session_state.total_kvu = 0.0
-if "ledger" not in st.session_state: st.session_state.ledger = []
-if "cat_metrics" not in st.session_state: st.session_state.cat_metrics = {"inf": 0.0, "res": 0.0, "mem": 0.0}
+# Rows are group-committed to the on-disk ledger, so a restart keeps the day's record.
+aggregates = get_aggregates()
+rollups = get_rollups()
+vault = get_ledger_view()
+get_ledger().sync()
+if "vault_cursors" not in st.session_state: st.session_state.vault_key, st.session_state.vault_cursors = None, [None]
 
 # SIDEBAR CONTROLS
 st.sidebar.title("UI CONTROLS")
@@ -40,6 +48,10 @@ st.sidebar.title("COMPUTE GRID COUNTERS")
 s_inf = st.sidebar.empty()
 s_res = st.sidebar.empty()
 s_mem = st.sidebar.empty()
+st.sidebar.divider()
+cache_stats = classification_cache.stats()
+st.sidebar.caption(f"Classification cache: {cache_stats['size']:,} entries · hit rate {cache_stats['hit_rate']:.0%} · "
+                   f"{cache_stats['evictions']:,} evictions")
 
 # DYNAMIC CSS (SCALING + TERMINAL LOOK)
 st.markdown(f"""
@@ -62,12 +74,13 @@ st.markdown(f"""
 """, unsafe_allow_html=True)
 
 def update_all_metrics():
-    gross_placeholder.metric("GROSS REVENUE", f"£{st.session_state.total_kvu * 0.001:,.2f}")
-    vat_placeholder.metric("VAT CAPTURE", f"£{(st.session_state.total_kvu * 0.001 * 0.2):,.2f}")
-    kvu_placeholder.metric("VALIDATED KVUs", f"{st.session_state.total_kvu:,.0f}")
-    s_inf.metric("Inference Engine", f"{st.session_state.cat_metrics['inf']:,.1f}")
-    s_res.metric("Reasoning Layer", f"{st.session_state.cat_metrics['res']:,.1f}")
-    s_mem.metric("Memory Vault", f"{st.session_state.cat_metrics['mem']:,.1f}")
+    agg = aggregates.snapshot()
+    gross_placeholder.metric("GROSS REVENUE", f"£{agg['value']:,.2f}")
+    vat_placeholder.metric("VAT CAPTURE", f"£{agg['vat']:,.2f}")
+    kvu_placeholder.metric("VALIDATED KVUs", f"{agg['kvu']:,.0f}")
+    s_inf.metric("Inference Engine", f"{agg['categories']['inf']:,.1f}")
+    s_res.metric("Reasoning Layer", f"{agg['categories']['res']:,.1f}")
+    s_mem.metric("Memory Vault", f"{agg['categories']['mem']:,.1f}")
 
 # -----------------------------
 # MAIN DASHBOARD
@@ -88,15 +101,9 @@ with tabs[0]:
     
     if st.button("SUBMIT QUERY") and user_query:
         inf, res, mem, label, heat = calculate_complexity_kvu(user_query, gate_mode)
-        st.session_state.total_kvu += (inf + res + mem)
-        st.session_state.cat_metrics['inf'] += inf
-        st.session_state.cat_metrics['res'] += res
-        st.session_state.cat_metrics['mem'] += mem
-        
-        entry = {"Time": datetime.now().strftime("%H:%M:%S"), "Origin": "Live", "Query": user_query, "KVU": (inf+res+mem), "Type": label, "Hash": hashlib.sha256(user_query.encode()).hexdigest()[:12]}
-        st.session_state.ledger.insert(0, entry)
+        row = get_committer().commit(vault_entry("Live", user_query, label, inf, res, mem))
         update_all_metrics()
-        st.markdown(f'<div class="heat-{heat}"><b>{label} detected.</b> Audit Hash: <code>{entry["Hash"]}</code></div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="heat-{heat}"><b>{label} detected.</b> Audit Hash: <code>{row["hash"][:12]}</code></div>', unsafe_allow_html=True)
 
 # --- ACT 2: SURGE (BLACK/GREEN TERMINAL) ---
 with tabs[1]:
@@ -104,47 +111,76 @@ with tabs[1]:
     if st.button("EXECUTE 60s SURGE"):
         prog = st.progress(0)
         surge_log = st.empty()
-        current_surge = []
+        current_surge = deque(maxlen=SURGE_ROWS)  # newest first, bounded
         for i in range(30):
             b_inf, b_res, b_mem = random.uniform(5000, 10000), random.uniform(8000, 15000), random.uniform(1000, 3000)
-            st.session_state.total_kvu += (b_inf + b_res + b_mem)
-            st.session_state.cat_metrics['inf'] += b_inf; st.session_state.cat_metrics['res'] += b_res; st.session_state.cat_metrics['mem'] += b_mem
-            
-            ent = {"Time": datetime.now().strftime("%H:%M:%S"), "Origin": "Surge", "Batch": f"Cluster #{i+1}", "KVU": round(b_inf+b_res+b_mem, 2), "Hash": hashlib.md5(str(i).encode()).hexdigest()[:8]}
-            st.session_state.ledger.insert(0, ent)
-            current_surge.insert(0, ent)
+            row = get_committer().commit(vault_entry("Surge", f"Cluster #{i+1}", "Surge Batch", b_inf, b_res, b_mem))
+            ent = {"Time": datetime.now().strftime("%H:%M:%S"), "Origin": "Surge", "Batch": row["query"], "KVU": round(row["kvu"], 2), "Hash": row["hash"][:8]}
+            current_surge.appendleft(ent)
             update_all_metrics()
             prog.progress((i + 1) / 30)
-            surge_log.dataframe(current_surge, use_container_width=True, height=400)
+            surge_log.dataframe(list(current_surge), use_container_width=True, height=400)
             time.sleep(0.5)
 
 # --- ACT 3: SEARCHABLE LEDGER VAULT ---
 with tabs[2]:
     st.subheader("ACT 3: SEARCHABLE LEDGER VAULT")
-    if st.session_state.ledger:
-        st.data_editor(pd.DataFrame(st.session_state.ledger), use_container_width=True, hide_index=True, disabled=True, key="vault_editor")
+    if len(vault.columns):
+        # Server-side sort/filter; only the visible page is read and rendered.
+        f1, f2, f3, f4 = st.columns(4)
+        sort = f1.selectbox("Sort by", ["ts", "kvu", "status"], format_func={"ts": "Time", "kvu": "KVU", "status": "Status"}.get)
+        order = f2.selectbox("Order", ["desc", "asc"])
+        origins = f3.multiselect("Origin", ["Live", "Surge", "National Grid"])
+        needle = f4.text_input("Search", help="Hash prefix, or 3+ characters of a query")
+        vault_key = (sort, order, tuple(origins), needle)
+        if st.session_state.vault_key != vault_key:
+            st.session_state.vault_key, st.session_state.vault_cursors = vault_key, [None]
+        cursors = st.session_state.vault_cursors
+        page = vault.page(sort, order, 100, cursors[-1], origin=origins, q=needle or None)
+        view = pd.DataFrame({"Time": pd.to_datetime([r["ts"] for r in page["rows"]], unit="s"),
+                             "Origin": [r.get("origin", "Live") for r in page["rows"]],
+                             "Query": [r.get("query", "") for r in page["rows"]], "KVU": [r["kvu"] for r in page["rows"]],
+                             "Type": [r.get("type", r.get("reason", "")) for r in page["rows"]],
+                             "VAT Yield": [r["vat"] for r in page["rows"]], "Hash": [r["hash"][:12] for r in page["rows"]]})
+        st.data_editor(view, use_container_width=True, hide_index=True, disabled=True, key="vault_editor",
+                       column_config={"Time": st.column_config.DatetimeColumn(format="HH:mm:ss")})
+        n1, n2, n3 = st.columns([1, 1, 4])
+        if n1.button("◀ PREV", disabled=len(cursors) == 1):
+            cursors.pop(); st.rerun()
+        if n2.button("NEXT ▶", disabled=page["next_cursor"] is None):
+            cursors.append(page["next_cursor"]); st.rerun()
+        n3.caption(f"Page {len(cursors)} · {page['records']:,} records in the ledger")
     else:
         st.info("Vault offline. Submit data to engage.")
 
-# --- ACT 4: 24HR SIMULATION (120s RUNTIME + BLACK/GREEN TERMINAL) ---
+# --- ACT 4: 24HR SIMULATION (MONTE CARLO + BLACK/GREEN TERMINAL) ---
 with tabs[3]:
     st.subheader("ACT 4: 24-HOUR NATIONAL FISCAL LEDGER")
+    sim_days = st.select_slider("Horizon (days)", [1, 7, 30], value=1)
     if st.button("RUN 24HR FISCAL SIMULATION"):
-        sim_log_window = st.empty()
-        sim_stats = st.empty()
+        with st.spinner("Running Monte Carlo paths..."):
+            sim = simulate(paths=2000, days=sim_days)
+        # The 24 hourly rows go to the ledger as one group commit.
+        rows = get_committer().commit_many(
+            vault_entry("National Grid", f"{h:02d}:00", "Fiscal Sim", *(val * TIER_SHARES[c] for c in ("inf", "res", "mem")))
+            for h, val in enumerate(sim["hourly_kvu"]["p50"]))
         sim_ledger = []
-        
-        for h in range(24):
-            val = max(1000, 12000 * np.sin(np.pi * (h-6)/12)) * random.uniform(95, 105)
-            st.session_state.total_kvu += val
-            st.session_state.cat_metrics['inf'] += val * 0.4; st.session_state.cat_metrics['res'] += val * 0.5; st.session_state.cat_metrics['mem'] += val * 0.1
-            
-            sim_entry = {"Hour": f"{h:02d}:00", "Load": "National Grid", "KVUs": round(val, 0), "VAT Yield": round(val * 0.001 * 0.2, 2), "Hash": hashlib.sha256(str(h).encode()).hexdigest()[:10]}
-            sim_ledger.insert(0, sim_entry)
-            st.session_state.ledger.insert(0, sim_entry)
-            
-            update_all_metrics()
-            sim_log_window.dataframe(sim_ledger, use_container_width=True, height=500)
-            sim_stats.info(f"Simulating Hour {h+1}/24... 120s Fiscal Lock active.")
-            time.sleep(5) # 2 minute runtime (24*5)
-        st.success("Fiscal Projection Finalized.")
\ No newline at end of file
+        for h, (val, row) in enumerate(zip(sim["hourly_kvu"]["p50"], rows)):
+            sim_ledger.append({"Hour": row["query"], "Load": "National Grid", "KVUs": round(val, 0),
+                               "KVUs p5": round(sim["hourly_kvu"]["p5"][h], 0), "KVUs p95": round(sim["hourly_kvu"]["p95"][h], 0),
+                               "VAT Yield": round(row["vat"], 2), "Hash": row["hash"][:10]})
+        update_all_metrics()
+        vat = sim["total"]["vat"]
+        v1, v2, v3 = st.columns(3)
+        v1.metric(f"{sim_days}-DAY VAT (p5)", f"£{vat['p5']:,.0f}")
+        v2.metric(f"{sim_days}-DAY VAT (p50)", f"£{vat['p50']:,.0f}")
+        v3.metric(f"{sim_days}-DAY VAT (p95)", f"£{vat['p95']:,.0f}")
+        st.dataframe(sim_ledger[::-1], use_container_width=True, height=500)
+        st.bar_chart(sim["region_vat"])
+        st.success(f"Fiscal Projection Finalized: {sim['paths']:,} paths in {sim['elapsed_s']:.2f}s.")
+    # Committed VAT per hour and origin, read from the hourly rollups.
+    hours = by_origin(rollups.query("hour", time.time() - 86_400))
+    if hours:
+        st.caption("LEDGER VAT BY HOUR AND ORIGIN (LAST 24H)")
+        st.bar_chart([dict(r, start=datetime.fromtimestamp(r["start"]).strftime("%H:00")) for r in hours],
+                     x="start", y=[k for k in hours[0] if k != "start"])
\ No newline at end of file
@@ -0,0 +1,92 @@
+"""AFEG running aggregates.
+
+Totals the dashboards need (KVU, revenue, VAT, inf/res/mem split, per-status
+counts, dispute risk) kept up to date on every ledger commit, so reading them is
+O(1) instead of re-summing the ledger. A snapshot is saved next to the ledger
+every ``save_every`` records; on start-up only the tail after it is replayed.
+"""
+import json, os, threading
+from afeg_ledger import get_ledger
+
+DISPUTE_RATE, DISPUTE_MULTIPLIER = 0.01, 2.0  # ACT 5 unmitigated dispute risk on compliant KVU
+CATEGORIES = ("inf", "res", "mem")
+
+
+class RunningAggregates:
+    def __init__(self, state=None):
+        state = state or {}
+        self.seq = state.get("seq", -1)
+        self.head = state.get("head")
+        self.count = state.get("count", 0)
+        self.kvu = state.get("kvu", 0.0)
+        self.value = state.get("value", 0.0)
+        self.vat = state.get("vat", 0.0)
+        self.categories = dict(state.get("categories") or dict.fromkeys(CATEGORIES, 0.0))
+        self.by_status = {k: dict(v) for k, v in (state.get("by_status") or {}).items()}
+        self.path, self.save_every = None, 0
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.seq, self.head = record["seq"], record["hash"]
+            self.count += 1
+            self.kvu += record["kvu"]; self.value += record["value"]; self.vat += record["vat"]
+            for c in CATEGORIES:
+                self.categories[c] += record[c]
+            s = self.by_status.setdefault(record["status"], {"count": 0, "kvu": 0.0, "value": 0.0})
+            s["count"] += 1; s["kvu"] += record["kvu"]; s["value"] += record["value"]
+            if self.path and self.save_every and self.count % self.save_every == 0:
+                self._save()
+
+    @property
+    def dispute_risk(self):
+        return self.by_status.get("COMPLIANT", {}).get("kvu", 0.0) * DISPUTE_RATE * DISPUTE_MULTIPLIER
+
+    def _state(self):
+        return {"seq": self.seq, "head": self.head, "count": self.count, "kvu": self.kvu,
+                "value": self.value, "vat": self.vat, "categories": dict(self.categories),
+                "by_status": {k: dict(v) for k, v in self.by_status.items()}}
+
+    def snapshot(self):
+        with self._lock:
+            state = self._state()
+            state["dispute_risk"] = self.dispute_risk
+            return state
+
+    def _save(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"  # gateway workers replaying together save the same seq
+        with open(tmp, "w") as f:
+            json.dump(self._state(), f)
+        os.replace(tmp, self.path)
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+
+def attach_aggregates(ledger, save_every=10_000):
+    """Resume from the saved snapshot if it still matches the chain, else rebuild from genesis."""
+    path = os.path.join(ledger.path, "aggregates.json")
+    state = None
+    try:
+        with open(path) as f:
+            state = json.load(f)
+        if not (0 <= state["seq"] < len(ledger) and ledger.read(state["seq"])["hash"] == state["head"]):
+            state = None
+    except (OSError, ValueError, KeyError):
+        state = None
+    agg = RunningAggregates(state)
+    agg.path, agg.save_every = path, save_every
+    ledger.subscribe(agg.add, start=agg.seq + 1)
+    return agg
+
+
+_aggregates, _aggregates_lock = None, threading.Lock()
+
+def get_aggregates():
+    """Aggregates attached to the process-wide ledger."""
+    global _aggregates
+    with _aggregates_lock:
+        if _aggregates is None:
+            _aggregates = attach_aggregates(get_ledger())
+        return _aggregates
@@ -0,0 +1,71 @@
+"""AFEG classification cache.
+
+Bounded LRU + TTL cache for per-query classification results (tier, heat,
+inf/res/mem split, governance verdict). Keys are a BLAKE2b fingerprint of the
+normalised query (lower-cased, whitespace collapsed) plus the caller's mode and
+multiplier, so callers scoring the same text differently never share an entry;
+the classifier itself is always run on the normalised text, so cached and
+uncached answers agree. Passing a different ``generation`` (e.g. the governance
+rules version) drops every entry. Hit/miss/eviction counters are kept for sizing.
+"""
+import hashlib, threading, time
+from collections import OrderedDict
+
+
+def normalize(query):
+    return " ".join(query.lower().split())
+
+def fingerprint(normalized):
+    return hashlib.blake2b(normalized.encode(), digest_size=16).digest()
+
+
+class ClassificationCache:
+    def __init__(self, maxsize=100_000, ttl=3600.0):
+        self.maxsize, self.ttl = maxsize, ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._generation = None
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def lookup(self, query, compute, mode=None, multiplier=1.0, generation=None):
+        """Cached ``compute(normalized_query)``. Values are shared; treat them as read-only."""
+        q = normalize(query)
+        key = (fingerprint(q), mode, multiplier)
+        now = time.monotonic()
+        with self._lock:
+            if generation != self._generation:
+                if self._data:
+                    self.invalidations += 1
+                self._data.clear()
+                self._generation = generation
+            hit = self._data.get(key)
+            if hit is not None:
+                if hit[0] > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return hit[1]
+                del self._data[key]
+                self.expirations += 1
+            self.misses += 1
+        value = compute(q)
+        with self._lock:
+            if generation == self._generation:
+                self._data[key] = (now + self.ttl, value)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self._data), "maxsize": self.maxsize, "ttl_s": self.ttl,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "expirations": self.expirations, "invalidations": self.invalidations,
+                    "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0}
@@ -0,0 +1,139 @@
+"""AFEG gateway client for the dashboards.
+
+One pooled keep-alive ``requests.Session`` per process, with connect/read
+timeouts and retries. Connection failures are retried for every method (the
+request never reached the gateway); 502/503/504 responses only for GETs, so a
+commit is never replayed into the ledger twice.
+"""
+import json, os, threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+GATEWAY_URL = os.environ.get("AFEG_GATEWAY_URL", "http://127.0.0.1:8000")
+TIMEOUT = (3.05, 15)  # (connect, read) seconds
+
+
+class GatewayClient:
+    def __init__(self, base_url=GATEWAY_URL, pool_size=16, retries=3, timeout=TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        retry = Retry(total=retries, connect=retries, read=1, status=retries, backoff_factor=0.2,
+                      status_forcelist=(502, 503, 504), allowed_methods=frozenset({"GET"}))
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry))
+        self.session.mount("https://", HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry))
+
+    def url(self, path):
+        return f"{self.base_url}{path}"
+
+    def _get(self, path, **params):
+        r = self.session.get(self.url(path), params={k: v for k, v in params.items() if v is not None}, timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def _post(self, path, **kwargs):
+        r = self.session.post(self.url(path), timeout=self.timeout, **kwargs)
+        r.raise_for_status()
+        return r.json()
+
+    def audit(self, query, mode="live"):
+        return self._post("/afeg-gateway", json={"query": query, "mode": mode})
+
+    def batch(self, payloads):
+        return self._post("/afeg-gateway/batch", json=list(payloads))
+
+    def aggregates(self):
+        return self._get("/afeg-gateway/aggregates")
+
+    def rollups(self, granularity="hour", since=None, until=None, origin=None):
+        return self._get("/afeg-gateway/rollups", granularity=granularity, since=since, until=until, origin=origin)
+
+    def feed(self, after=None):
+        """Yield ``(event, id, data)`` from the gateway's SSE feed, resuming after seq ``after``.
+        Keep-alives yield ``(None, None, None)`` so callers regain control on an idle ledger."""
+        headers = {"Accept": "text/event-stream"}
+        if after is not None:
+            headers["Last-Event-ID"] = str(after)
+        with self.session.get(self.url("/afeg-gateway/feed"), headers=headers, stream=True, timeout=(self.timeout[0], 30)) as r:
+            r.raise_for_status()
+            event, eid, data = "message", None, []
+            for line in r.iter_lines(decode_unicode=True):
+                if line.startswith(":"):
+                    yield None, None, None
+                elif line:
+                    field, _, value = line.partition(":")
+                    value = value[1:] if value.startswith(" ") else value
+                    if field == "event": event = value
+                    elif field == "id": eid = int(value)
+                    elif field == "data": data.append(value)
+                elif data:
+                    yield event, eid, json.loads("\n".join(data))
+                    event, eid, data = "message", None, []
+
+    def cache_stats(self):
+        return self._get("/afeg-gateway/cache")
+
+    def metrics_text(self):
+        r = self.session.get(self.url("/metrics"), timeout=self.timeout)
+        r.raise_for_status()
+        return r.text
+
+    def ledger_page(self, sort="ts", order="desc", limit=50, cursor=None, **filters):
+        """One page of the server-side ledger view; filters: status, origin, min_kvu, max_kvu, since, until, q."""
+        return self._get("/afeg-gateway/ledger/page", sort=sort, order=order, limit=limit, cursor=cursor, **filters)
+
+    def search(self, q, limit=100):
+        return self._get("/afeg-gateway/ledger/search", q=q, limit=limit)
+
+    def proof(self, record_hash):
+        return self._get(f"/afeg-gateway/ledger/proof/{record_hash}")
+
+    def merkle_roots(self, since=None, until=None):
+        return self._get("/afeg-gateway/ledger/roots", since=since, until=until)
+
+    def signing_key(self):
+        return self._get("/afeg-gateway/ledger/signing-key")
+
+    def verify_day(self, day):
+        return self._get("/afeg-gateway/ledger/verify-day", day=str(day))
+
+    def import_file(self, path, fmt=None):
+        """Stream an NDJSON/CSV telemetry file to the gateway's bulk import; returns the job state."""
+        fmt = fmt or ("csv" if path.lower().endswith(".csv") else "ndjson")
+        with open(path, "rb") as f:
+            r = self.session.post(self.url("/afeg-gateway/import"), params={"format": fmt}, data=f,
+                                  timeout=(self.timeout[0], None))
+        r.raise_for_status()
+        return r.json()
+
+    def import_status(self, import_id):
+        return self._get(f"/afeg-gateway/import/{import_id}")
+
+    def resume_import(self, import_id):
+        return self._post(f"/afeg-gateway/import/{import_id}/resume")
+
+    def simulate(self, paths=2_000, days=1, seed=None):
+        return self._get("/afeg-gateway/simulate", paths=paths, days=days, seed=seed)
+
+    def export_url(self, since=None, until=None):
+        return requests.Request("GET", self.url("/afeg-gateway/export"),
+                                params={k: v for k, v in (("since", since), ("until", until)) if v is not None}).prepare().url
+
+    def export_zip(self, since=None, until=None):
+        """The export archive fetched by this process, for dashboards serving it as a download."""
+        r = self.session.get(self.url("/afeg-gateway/export"), timeout=(self.timeout[0], None),
+                             params={k: v for k, v in (("since", since), ("until", until)) if v is not None})
+        r.raise_for_status()
+        return r.content
+
+
+_client, _client_lock = None, threading.Lock()
+
+def get_client():
+    """Process-wide pooled client (shared by all Streamlit sessions)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GatewayClient()
+        return _client
@@ -0,0 +1,101 @@
+"""AFEG columnar ledger store.
+
+Compact in-memory representation of ledger rows: the sequence number and numeric
+fields in typed NumPy columns, low-cardinality strings (status/reason/action/origin,
+...) as uint16 dictionary codes. Columns grow by doubling, so ``append`` is
+amortised O(1) per row and every view handed out is a zero-copy slice of the live
+buffers. Rows are never rewritten, so a ``snapshot`` can be saved without holding
+the lock and loaded back with ``restore``.
+
+Roughly 70 bytes per row with every default field against ~1 KB for a dict; a
+store keeping only the fields it sorts and filters on (the ledger view) is a
+fraction of that. Hashes and query text stay in the ledger.
+"""
+import threading
+import numpy as np
+
+FLOAT_FIELDS = ("ts", "inf", "res", "mem", "kvu", "value", "vat")
+CODE_FIELDS = ("status", "reason", "action", "origin")
+
+
+class Dictionary:
+    """String <-> uint16 code mapping for one column."""
+
+    def __init__(self):
+        self.values, self._codes = [], {}
+
+    def encode(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def code(self, value):
+        """Existing code for ``value`` or ``None`` (never adds)."""
+        return self._codes.get(value)
+
+
+class ColumnarLedger:
+    def __init__(self, float_fields=FLOAT_FIELDS, code_fields=CODE_FIELDS, capacity=1024):
+        self.float_fields, self.code_fields = tuple(float_fields), tuple(code_fields)
+        self.dictionaries = {f: Dictionary() for f in self.code_fields}
+        self._n, self._cap = 0, capacity
+        self._cols = {"seq": np.zeros(capacity, np.int64)}
+        self._cols.update((f, np.zeros(capacity, np.float64)) for f in self.float_fields)
+        self._cols.update((f, np.zeros(capacity, np.uint16)) for f in self.code_fields)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._n
+
+    def _reserve(self, extra):
+        need = self._n + extra
+        if need <= self._cap:
+            return
+        cap = self._cap
+        while cap < need:
+            cap *= 2
+        for name, col in self._cols.items():
+            grown = np.zeros(cap, col.dtype)
+            grown[:self._n] = col[:self._n]
+            self._cols[name] = grown
+        self._cap = cap
+
+    def append(self, record):
+        """Append one ledger record (dict). Usable directly as a ``KVULedger`` listener."""
+        with self._lock:
+            self._reserve(1)
+            i = self._n
+            self._cols["seq"][i] = record.get("seq", i)
+            for f in self.float_fields:
+                self._cols[f][i] = record.get(f, 0.0)
+            for f in self.code_fields:
+                self._cols[f][i] = self.dictionaries[f].encode(record.get(f, ""))
+            self._n += 1
+            return i
+
+    # --- views ---
+    def column(self, name):
+        """Zero-copy view of a numeric/code column (codes stay encoded)."""
+        return self._cols[name][:self._n]
+
+    # --- persistence ---
+    def snapshot(self):
+        """``({column: rows so far}, {field: dictionary values})``. Appends only write past
+        these slices and growth copies, so they stay valid and unchanged once the lock is released."""
+        with self._lock:
+            return ({name: col[:self._n] for name, col in self._cols.items()},
+                    {f: list(d.values) for f, d in self.dictionaries.items()})
+
+    def restore(self, columns, dictionaries):
+        """Load the rows of a ``snapshot`` into this empty store."""
+        n = len(columns["seq"])
+        with self._lock:
+            self._reserve(n)
+            for name, col in self._cols.items():
+                col[:n] = columns[name]
+            for f, values in dictionaries.items():
+                for v in values:
+                    self.dictionaries[f].encode(v)
+            self._n = n
@@ -0,0 +1,189 @@
+"""AFEG group commit.
+
+Concurrent commits (gateway requests, surge and endurance producers) are queued
+and written by a single committer thread with ``KVULedger.append_many``: one
+write and at most one fsync per batch. A batch closes when it holds
+``max_batch`` entries or ``max_wait`` seconds after its first entry arrived,
+whichever comes first. That is the latency/throughput knob. The wait only
+applies while commits are actually concurrent (the previous batch held more than
+one entry), so a lone producer is never delayed. ``max_wait=0`` always takes
+just what queued up during the previous fsync.
+
+fsync policies (``AFEG_FSYNC``):
+
+* ``always``   -- one fsync per ``commit`` / ``commit_many`` call (no grouping);
+* ``batch``    -- one fsync per group commit (default);
+* ``interval`` -- group commit, fsync every ``interval`` seconds while there is
+  unsynced data, idle or not (a crash can lose up to that window);
+* ``none``     -- flush to the OS only (survives a process crash, not power loss).
+
+``commit`` returns only once the record is as durable as the policy promises.
+``commit_many`` queues its entries as one all-or-nothing unit, so a burst costs
+one wake-up and one wait rather than one per entry.
+"""
+import os, threading, time
+from collections import deque
+from afeg_ledger import EntryError, get_ledger
+
+FSYNC_POLICIES = ("always", "batch", "interval", "none")
+FSYNC_POLICY = os.environ.get("AFEG_FSYNC", "batch")
+MAX_BATCH = 512
+MAX_WAIT = 0.002
+
+
+class _Pending:
+    """One queued commit: a single entry (``commit``) or a group (``commit_many``)."""
+    __slots__ = ("entries", "ts", "done", "records", "error")
+
+    def __init__(self, entries, ts):
+        self.entries, self.ts = entries, ts
+        self.done = threading.Event()
+        self.records = self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.records
+
+    def result(self):
+        return self.wait()[0]
+
+
+class GroupCommitter:
+    def __init__(self, ledger, policy=FSYNC_POLICY, max_batch=MAX_BATCH, max_wait=MAX_WAIT, interval=1.0):
+        if policy not in FSYNC_POLICIES:
+            raise ValueError(f"unknown fsync policy {policy!r}; expected one of {FSYNC_POLICIES}")
+        self.ledger, self.policy = ledger, policy
+        self.max_batch = 1 if policy == "always" else max_batch
+        self.max_wait, self.interval = max_wait, interval
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._synced = time.monotonic()
+        self._last_batch = 0
+        self._dirty = False  # written but not yet fsynced (interval policy)
+        self.commits = self.batches = self.fsyncs = 0
+        self._thread = threading.Thread(target=self._run, name="afeg-group-commit", daemon=True)
+        self._thread.start()
+
+    # --- producers ---
+    def _enqueue(self, pending):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("group committer is closed")
+            self._queue.append(pending)
+            self._cond.notify_all()
+        return pending
+
+    def submit(self, entry, ts=None):
+        return self._enqueue(_Pending([entry], [ts]))
+
+    def commit(self, entry, ts=None):
+        """Append ``entry`` and wait until it is durable. Returns the stored record."""
+        return self.submit(entry, ts).result()
+
+    def commit_many(self, entries):
+        """Append ``entries`` together (all or none) and wait until they are durable."""
+        entries = list(entries)
+        if not entries:
+            return []
+        return self._enqueue(_Pending(entries, [None] * len(entries))).wait()
+
+    # --- committer thread ---
+    def _next_batch(self):
+        """The next batch of pending commits; ``[]`` when the interval fsync is due on an idle
+        queue, ``None`` once closed and drained."""
+        with self._cond:
+            while not self._queue and not self._closed:
+                if not self._dirty:
+                    self._cond.wait()
+                    continue
+                remaining = self._synced + self.interval - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._cond.wait(remaining)
+            if not self._queue:
+                return None
+            deadline = time.monotonic() + (self.max_wait if self._last_batch > 1 else 0.0)
+            while sum(len(p.entries) for p in self._queue) < self.max_batch and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [self._queue.popleft()]  # a group larger than max_batch goes alone
+            size = len(batch[0].entries)
+            while self._queue and size + len(self._queue[0].entries) <= self.max_batch:
+                size += len(self._queue[0].entries)
+                batch.append(self._queue.popleft())
+            self._last_batch = size
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            now = time.monotonic()
+            if not batch:
+                self._fsync(now)
+                continue
+            durable = self.policy in ("always", "batch") or (self.policy == "interval" and now - self._synced >= self.interval)
+            try:
+                records = self.ledger.append_many([e for p in batch for e in p.entries],
+                                                  [t for p in batch for t in p.ts], durable=durable)
+                i = 0
+                for p in batch:
+                    p.records, i = records[i:i + len(p.entries)], i + len(p.entries)
+            except EntryError:
+                # Nothing was written: commit each pending on its own so a bad entry only fails its own commit.
+                for p in batch:
+                    try:
+                        p.records = self.ledger.append_many(p.entries, p.ts, durable=durable)
+                    except Exception as exc:
+                        p.error = exc
+            except Exception as exc:
+                for p in batch:
+                    p.error = exc
+            records = [r for p in batch if p.records is not None for r in p.records]
+            if durable:
+                self._synced, self._dirty = now, False
+                self.fsyncs += 1
+            elif records and self.policy == "interval":
+                self._dirty = True
+            self.commits += len(records); self.batches += 1
+            for p in batch:
+                p.done.set()
+
+    def _fsync(self, now):
+        self._synced = now
+        try:
+            self.ledger.fsync()
+        except OSError:
+            return  # still dirty: retried after another interval
+        self._dirty = False
+        self.fsyncs += 1
+
+    def close(self):
+        """Drain the queue, stop the committer thread and fsync whatever is left."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        if self.policy != "none":
+            self.ledger.fsync()
+
+    def stats(self):
+        return {"policy": self.policy, "commits": self.commits, "batches": self.batches, "fsyncs": self.fsyncs,
+                "queued": len(self._queue), "avg_batch": round(self.commits / self.batches, 2) if self.batches else 0.0}
+
+
+_committer, _committer_lock = None, threading.Lock()
+
+def get_committer():
+    """Process-wide committer in front of the shared ledger."""
+    global _committer
+    with _committer_lock:
+        if _committer is None:
+            _committer = GroupCommitter(get_ledger())
+        return _committer
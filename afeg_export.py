@@ -0,0 +1,90 @@
+"""AFEG Treasury audit export.
+
+Streams the ledger as NDJSON straight into a ZIP archive, yielding compressed
+bytes as it goes, so memory stays flat however large the ledger is. The
+archive holds ``LEDGER_COMPLIANT.ndjson``, ``LEDGER_INTERCEPTED.ndjson`` and,
+written last, ``MANIFEST.json`` with record counts, first/last hash and a
+SHA-256 of each NDJSON member.
+
+The range is read once: compliant records stream into the first member while
+the rest are spooled to a temporary file (on disk past ``SPOOL_BYTES``) and
+copied into the second, since a ZIP is written one member at a time.
+"""
+import hashlib, io, json, tempfile, time, zipfile
+
+CHUNK_RECORDS = 5_000
+SPOOL_BYTES = 16 << 20
+COMPLIANT_MEMBER, INTERCEPTED_MEMBER = "LEDGER_COMPLIANT.ndjson", "LEDGER_INTERCEPTED.ndjson"
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, non-seekable sink; ``zipfile`` falls back to data descriptors."""
+
+    def __init__(self):
+        self._chunks, self._pos = [], 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_export_zip(ledger, since=None, until=None, chunk_records=CHUNK_RECORDS):
+    """Yield the audit ZIP in chunks for records with ``since <= ts < until`` (epoch seconds)."""
+    start = ledger.seek_time(since) if since is not None else 0
+    stop = ledger.seek_time(until) if until is not None else len(ledger)
+    manifest = {"generated_at": time.time(), "since": since, "until": until,
+                "first_seq": None, "last_seq": None, "first_hash": None, "last_hash": None,
+                "record_count": 0, "members": {}}
+    sink = _ChunkSink()
+    names = (COMPLIANT_MEMBER, INTERCEPTED_MEMBER)
+    digests, counts = {name: hashlib.sha256() for name in names}, dict.fromkeys(names, 0)
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf, \
+            tempfile.SpooledTemporaryFile(SPOOL_BYTES) as spool:
+        def flush(name, buf, out):
+            data = ("\n".join(buf) + "\n").encode(); buf.clear()
+            digests[name].update(data); out.write(data)
+
+        with zf.open(COMPLIANT_MEMBER, "w", force_zip64=True) as member:
+            compliant, intercepted, first, last = [], [], None, None
+            for rec in ledger.iter_records(start, stop):
+                first, last = first or rec, rec
+                if rec["status"] == "COMPLIANT":
+                    compliant.append(json.dumps(rec, separators=(",", ":")))
+                    counts[COMPLIANT_MEMBER] += 1
+                    if len(compliant) >= chunk_records:
+                        flush(COMPLIANT_MEMBER, compliant, member)
+                        yield sink.drain()
+                else:
+                    intercepted.append(json.dumps(rec, separators=(",", ":")))
+                    counts[INTERCEPTED_MEMBER] += 1
+                    if len(intercepted) >= chunk_records:
+                        flush(INTERCEPTED_MEMBER, intercepted, spool)
+            if compliant:
+                flush(COMPLIANT_MEMBER, compliant, member)
+            if intercepted:
+                flush(INTERCEPTED_MEMBER, intercepted, spool)
+        yield sink.drain()
+        spool.seek(0)
+        with zf.open(INTERCEPTED_MEMBER, "w", force_zip64=True) as member:
+            for data in iter(lambda: spool.read(1 << 20), b""):
+                member.write(data)
+                yield sink.drain()
+        for name in names:
+            manifest["members"][name] = {"records": counts[name], "sha256": digests[name].hexdigest()}
+            manifest["record_count"] += counts[name]
+        if first is not None:
+            manifest.update(first_seq=first["seq"], last_seq=last["seq"], first_hash=first["hash"], last_hash=last["hash"])
+        zf.writestr("MANIFEST.json", json.dumps(manifest, indent=4))
+    yield sink.drain()
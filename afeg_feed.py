@@ -0,0 +1,121 @@
+"""AFEG live ledger feed.
+
+Pushes new ledger records, and the aggregate deltas they carry, to dashboards
+over Server-Sent Events, so a viewer receives only what it has not seen yet
+instead of re-reading and re-rendering the ledger. Each record is rendered to an
+SSE frame once, into a bounded ring of ``RING_SIZE`` frames shared by every
+viewer. Resuming with ``Last-Event-ID`` (a seq) is served from the ring, or from
+the ledger itself for older seqs, up to ``MAX_REPLAY`` events behind; further
+back the viewer gets a fresh ``snapshot`` instead of the backlog.
+
+Events: ``snapshot`` (aggregate totals and their seq, on connect or reset),
+``ledger`` (one record, ``id`` = seq), ``aggregates`` (delta over the records
+just sent). Comment lines keep idle connections alive.
+"""
+import asyncio, json, threading, time
+from collections import deque
+from itertools import islice
+from afeg_ledger import get_ledger
+
+RING_SIZE = 10_000
+MAX_REPLAY = 10_000
+BATCH_MAX = 500
+POLL_INTERVAL = 0.2
+HEARTBEAT = 2.0
+FEED_FIELDS = ("seq", "ts", "query", "status", "reason", "origin", "inf", "res", "mem", "kvu", "value", "vat", "hash")
+
+
+def compact(record):
+    return {k: record[k] for k in FEED_FIELDS if k in record}
+
+def sse(event, data, id=None):
+    head = f"id: {id}\n" if id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+def delta(records):
+    d = {"seq": records[-1]["seq"], "count": len(records), "kvu": 0.0, "value": 0.0, "vat": 0.0, "intercepts": 0}
+    for r in records:
+        d["kvu"] += r.get("kvu", 0.0); d["value"] += r.get("value", 0.0); d["vat"] += r.get("vat", 0.0)
+        d["intercepts"] += r.get("status") == "INTERCEPT"
+    return d
+
+
+class LedgerFeed:
+    def __init__(self, ledger, ring_size=RING_SIZE):
+        self.ledger = ledger
+        self._ring = deque(maxlen=ring_size)  # (seq, compact record, SSE frame)
+        self._lock = threading.Lock()
+        self._synced = 0.0
+
+    def add(self, record):
+        c = compact(record)
+        frame = sse("ledger", c, record["seq"])
+        with self._lock:
+            self._ring.append((record["seq"], c, frame))
+
+    @property
+    def last_seq(self):
+        with self._lock:
+            return self._ring[-1][0] if self._ring else -1
+
+    def since(self, after, limit=BATCH_MAX):
+        """``[(compact, frame)]`` for seqs after ``after``, or ``None`` if it is over ``MAX_REPLAY`` behind."""
+        with self._lock:
+            if self._ring and after + 1 >= self._ring[0][0]:
+                start = after + 1 - self._ring[0][0]
+                return [(c, f) for _, c, f in islice(self._ring, start, start + limit)]
+            head = self._ring[-1][0] if self._ring else after
+        if head - after > MAX_REPLAY:
+            return None
+        return [(compact(r), sse("ledger", compact(r), r["seq"])) for r in self.ledger.iter_records(after + 1, min(head + 1, after + 1 + limit))]
+
+    def maybe_sync(self):
+        """Pick up other processes' appends, at most once per ``POLL_INTERVAL`` for all viewers."""
+        now = time.monotonic()
+        if now - self._synced >= POLL_INTERVAL:
+            self._synced = now
+            self.ledger.sync()
+
+    async def stream(self, snapshot, after=None, is_disconnected=None):
+        """SSE text chunks for one viewer. ``snapshot()`` returns aggregate totals including ``seq``."""
+        if after is None:
+            snap = await asyncio.to_thread(snapshot)
+            after = snap["seq"]
+            yield sse("snapshot", snap)
+        idle = time.monotonic()
+        while not (is_disconnected and await is_disconnected()):
+            batch = self.since(after)
+            if batch is None:
+                snap = await asyncio.to_thread(snapshot)
+                after = snap["seq"]
+                yield sse("snapshot", snap)
+            elif batch:
+                records = [c for c, _ in batch]
+                after = records[-1]["seq"]
+                yield "".join(f for _, f in batch) + sse("aggregates", delta(records))
+                idle = time.monotonic()
+                if len(batch) == BATCH_MAX:
+                    continue
+            elif time.monotonic() - idle >= HEARTBEAT:
+                idle = time.monotonic()
+                yield ": keep-alive\n\n"
+            await asyncio.to_thread(self.maybe_sync)
+            await asyncio.sleep(POLL_INTERVAL)
+
+
+def attach_feed(ledger, ring_size=RING_SIZE):
+    """Pre-fill the ring with the tail of the ledger so recent resumes never touch disk."""
+    feed = LedgerFeed(ledger, ring_size)
+    ledger.subscribe(feed.add, start=max(0, len(ledger) - ring_size))
+    return feed
+
+
+_feed, _feed_lock = None, threading.Lock()
+
+def get_feed():
+    """Feed attached to the process-wide ledger."""
+    global _feed
+    with _feed_lock:
+        if _feed is None:
+            _feed = attach_feed(get_ledger())
+        return _feed
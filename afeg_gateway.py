@@ -0,0 +1,335 @@
+"""AFEG v7 Gateway API.
+
+FastAPI service that scores AI platform telemetry into KVUs. ``/afeg-gateway``
+handles one query per request; ``/afeg-gateway/batch`` accepts a JSON array or
+an NDJSON body and scores the whole burst with ``afeg_kvu.score_batch``.
+Every scored event is committed to the shared ledger (approved -> COMPLIANT,
+blocked -> INTERCEPT) and the running aggregates are served from memory.
+``/afeg-gateway/import`` backfills historical NDJSON/CSV telemetry through
+``afeg_import`` as a background job.
+
+Run it as its own process, independent of the dashboards:
+
+    python afeg_gateway.py --host 0.0.0.0 --port 8000 --workers 4
+
+Workers share the on-disk ledger; each keeps its own derived views and calls
+``ledger.sync()`` before serving reads so they reflect every worker's commits.
+"""
+import argparse, json
+from datetime import date, datetime, timezone
+from contextlib import asynccontextmanager
+import uvicorn
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from afeg_kvu import TIERS, build_entry, classification_cache, classify, score_batch
+from afeg_ledger import get_ledger
+from afeg_commit import get_committer
+from afeg_aggregates import get_aggregates
+from afeg_index import get_index
+from afeg_rollups import GRANULARITIES, get_rollups
+from afeg_view import MAX_LIMIT, ORDERS, SORTS, get_ledger_view
+from afeg_feed import get_feed
+from afeg_merkle import get_merkle
+from afeg_export import iter_export_zip
+from afeg_import import FORMATS, import_status, spool_path, start_import
+from afeg_simulation import MAX_DAYS, MAX_PATHS, get_pool, shutdown_pool, simulate
+from afeg_metrics import REGISTRY, STAGE_SECONDS
+
+@asynccontextmanager
+async def lifespan(app):
+    # Attach derived views before taking traffic so the first request doesn't pay the replay.
+    await run_in_threadpool(get_aggregates)
+    await run_in_threadpool(get_index)
+    await run_in_threadpool(get_merkle)
+    await run_in_threadpool(get_rollups)
+    await run_in_threadpool(get_ledger_view)
+    await run_in_threadpool(get_feed)
+    await run_in_threadpool(get_pool)  # simulation workers start now, not forked mid-request
+    yield
+    await run_in_threadpool(get_committer().close)  # drain pending group commits
+    await run_in_threadpool(shutdown_pool)
+
+app = FastAPI(title="AFEG v7 Gateway API", lifespan=lifespan)
+
+class QueryPayload(BaseModel):
+    query: str
+    mode: str = "live"
+
+# -----------------------------
+# INSTRUMENTATION
+# -----------------------------
+REQUESTS = REGISTRY.counter("afeg_requests_total", "Gateway requests by endpoint.", ("endpoint",))
+DECISIONS = REGISTRY.counter("afeg_decisions_total", "Gateway decisions by status.", ("status",))
+COMMITS = REGISTRY.counter("afeg_ledger_commits_total", "Ledger commits by ledger status.", ("status",))
+REGISTRY.gauge("afeg_ledger_records", "Records in the shared ledger.", fn=lambda: {(): get_ledger().sync()})
+REGISTRY.gauge("afeg_ledger_head_segment", "Active ledger segment number.", fn=lambda: {(): get_ledger().active_segment})
+REGISTRY.gauge("afeg_classification_cache", "Classification cache statistics.", ("stat",),
+               fn=lambda: {(k,): v for k, v in classification_cache.stats().items()})
+REGISTRY.gauge("afeg_group_commit", "Group commit counters (commits, batches, fsyncs, queued, avg_batch).", ("stat",),
+               fn=lambda: {(k,): v for k, v in get_committer().stats().items() if k != "policy"})
+
+def decision_entry(query, rule, inf, res, mem):
+    """Ledger entry for a gateway decision; blocked events carry zero KVU."""
+    if rule:
+        return build_entry(query, "INTERCEPT", f"Gateway Risk: {rule}", "Blocked", 0.0, 0.0, 0.0)
+    return build_entry(query, "COMPLIANT", "Safe", "Delivered", inf, res, mem)
+
+def commit_event(query, rule, inf, res, mem):
+    """Record a gateway decision; returns once the group commit holding it is durable."""
+    with STAGE_SECONDS.time("commit"):
+        record = get_committer().commit(decision_entry(query, rule, inf, res, mem))
+    COMMITS.inc(record["status"])
+    return record
+
+def commit_events(events):
+    with STAGE_SECONDS.time("commit_batch"):
+        records = get_committer().commit_many([decision_entry(*event) for event in events])
+    for record in records:
+        COMMITS.inc(record["status"])
+    return records
+
+def synced_ledger():
+    ledger = get_ledger()
+    ledger.sync()
+    return ledger
+
+def parse_payload(body):
+    try:
+        return QueryPayload.model_validate_json(body)
+    except ValidationError as exc:
+        raise HTTPException(status_code=422, detail=json.loads(exc.json()))
+
+# The body is parsed by hand so the parse stage can be timed.
+@app.post("/afeg-gateway", openapi_extra={"requestBody": {"required": True, "content": {
+    "application/json": {"schema": QueryPayload.model_json_schema()}}}})
+async def afeg_gateway(request: Request):
+    REQUESTS.inc("single")
+    body = await request.body()
+    with STAGE_SECONDS.time("handler"):
+        with STAGE_SECONDS.time("parse"):
+            payload = parse_payload(body)
+        with STAGE_SECONDS.time("classify"):
+            c = classify(payload.query, payload.mode)
+        inf, res, mem, label, heat, rule = c["inf"], c["res"], c["mem"], c["label"], c["heat"], c["rule"]
+        total_kvu = inf + res + mem
+        
+        status = "approved"
+        if rule:
+            status, total_kvu = "blocked", 0.0 # Rule: Risk events don't generate revenue
+        record = await run_in_threadpool(commit_event, payload.query, rule, inf, res, mem)
+        DECISIONS.inc(status)
+    return {
+        "status": status,
+        "kvu": total_kvu,
+        "metrics": {"inf": inf, "res": res, "mem": mem},
+        "complexity": label,
+        "heat": heat,
+        "rule": rule,
+        "seq": record["seq"],
+        "hash": record["hash"]
+    }
+
+# -----------------------------
+# BATCH INGESTION
+# -----------------------------
+def parse_batch(body):
+    """Decode a JSON array or NDJSON body into ``QueryPayload`` objects."""
+    try:
+        text = body.decode("utf-8").strip()
+        items = json.loads(text) if text.startswith("[") else [json.loads(l) for l in text.splitlines() if l.strip()]
+        return [QueryPayload(**item) for item in items]
+    except (ValueError, TypeError, ValidationError) as exc:
+        raise HTTPException(status_code=422, detail=f"Invalid batch body: {exc}")
+
+@app.post("/afeg-gateway/batch")
+async def afeg_gateway_batch(request: Request):
+    REQUESTS.inc("batch")
+    body = await request.body()
+    with STAGE_SECONDS.time("batch_parse"):
+        payloads = parse_batch(body)
+    queries = [p.query for p in payloads]
+    with STAGE_SECONDS.time("batch_score"):
+        scored = score_batch(queries)
+    approved = ~scored["blocked"]
+    records = await run_in_threadpool(commit_events, zip(queries, scored["rule"], scored["inf"].tolist(),
+                                               scored["res"].tolist(), scored["mem"].tolist()))
+    DECISIONS.inc("approved", amount=int(approved.sum()))
+    DECISIONS.inc("blocked", amount=int(scored["blocked"].sum()))
+
+    labels, heats = [t[0] for t in TIERS], [t[1] for t in TIERS]
+    items = [
+        {"status": "blocked" if b else "approved", "kvu": k,
+         "metrics": {"inf": i, "res": r, "mem": m},
+         "complexity": labels[t], "heat": heats[t], "rule": rule, "seq": rec["seq"], "hash": rec["hash"]}
+        for rec, t, i, r, m, k, b, rule in zip(
+            records, scored["tier"].tolist(), scored["inf"].tolist(), scored["res"].tolist(),
+            scored["mem"].tolist(), scored["kvu"].tolist(), scored["blocked"].tolist(), scored["rule"])
+    ]
+    # Plain Python values throughout, so skip jsonable_encoder's per-field walk.
+    return JSONResponse({
+        "count": len(items),
+        "items": items,
+        "totals": {
+            "kvu": float(scored["kvu"].sum()),
+            "inf": float(scored["inf"][approved].sum()),
+            "res": float(scored["res"][approved].sum()),
+            "mem": float(scored["mem"][approved].sum()),
+            "approved": int(approved.sum()),
+            "blocked": int(scored["blocked"].sum()),
+        },
+    })
+
+
+# -----------------------------
+# LEDGER AGGREGATES
+# -----------------------------
+@app.get("/afeg-gateway/aggregates")
+def afeg_aggregates():
+    synced_ledger()
+    return get_aggregates().snapshot()
+
+@app.get("/afeg-gateway/rollups")
+def afeg_rollups(granularity: str = Query("hour", pattern="^(" + "|".join(GRANULARITIES) + ")$"),
+                 since: float | None = None, until: float | None = None, origin: str | None = None):
+    """Minute/hour/day buckets (KVU per category, value, VAT, intercepts per origin) for ``since <= start < until``."""
+    synced_ledger()
+    buckets = get_rollups().query(granularity, since, until, origin)
+    return {"granularity": granularity, "count": len(buckets), "buckets": buckets}
+
+@app.get("/afeg-gateway/feed")
+async def afeg_feed(request: Request, after: int | None = None):
+    """Server-Sent Events: new ledger records plus aggregate deltas. Resumes from ``Last-Event-ID``
+    (or ``after``); a fresh connection starts with an aggregates ``snapshot``."""
+    REQUESTS.inc("feed")
+    last_id = request.headers.get("last-event-id")
+    if last_id is not None:
+        try:
+            after = int(last_id)
+        except ValueError:
+            raise HTTPException(status_code=422, detail="Last-Event-ID must be a ledger seq")
+    stream = get_feed().stream(get_aggregates().snapshot, after, request.is_disconnected)
+    return StreamingResponse(stream, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/afeg-gateway/cache")
+def afeg_cache_stats():
+    """Classification cache hit/miss/eviction counters (per worker)."""
+    return classification_cache.stats()
+
+@app.get("/afeg-gateway/ledger/search")
+def afeg_ledger_search(q: str = Query(..., min_length=1), limit: int = Query(100, ge=1, le=1000)):
+    """Hash-prefix or query-substring lookup over the ledger vault index."""
+    synced_ledger()
+    results = get_index().search(q, limit)
+    return {"count": len(results), "results": results}
+
+@app.get("/afeg-gateway/ledger/page")
+def afeg_ledger_page(sort: str = Query("ts", pattern="^(" + "|".join(SORTS) + ")$"),
+                     order: str = Query("desc", pattern="^(" + "|".join(ORDERS) + ")$"),
+                     limit: int = Query(50, ge=1, le=MAX_LIMIT), cursor: str | None = None,
+                     status: list[str] | None = Query(None), origin: list[str] | None = Query(None),
+                     min_kvu: float | None = None, max_kvu: float | None = None,
+                     since: float | None = None, until: float | None = None, q: str | None = None):
+    """One sorted, filtered page of ledger records; pass ``next_cursor`` back as ``cursor`` for the next."""
+    synced_ledger()
+    try:
+        return get_ledger_view().page(sort, order, limit, cursor, status, origin, min_kvu, max_kvu, since, until, q)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+@app.get("/afeg-gateway/ledger/proof/{record_hash}")
+def afeg_ledger_proof(record_hash: str):
+    """Merkle inclusion proof for one record against its hourly block root."""
+    synced_ledger()
+    seqs = get_index().hash_prefix(record_hash, 1) if len(record_hash) == 64 else []
+    if not seqs:
+        raise HTTPException(status_code=404, detail="record hash not found")
+    return get_merkle().proof(seqs[0])
+
+@app.get("/afeg-gateway/ledger/roots")
+def afeg_ledger_roots(since: float | None = None, until: float | None = None):
+    """Published signed Merkle roots, one per closed hourly block."""
+    synced_ledger()
+    roots = get_merkle().published(since, until)
+    return {"count": len(roots), "roots": roots}
+
+@app.get("/afeg-gateway/ledger/signing-key")
+def afeg_ledger_signing_key():
+    """Public key that signs the Merkle roots; check a root offline with ``afeg_merkle.verify_root``."""
+    return {"algorithm": "ed25519", "public_key": get_merkle().public_key}
+
+@app.get("/afeg-gateway/ledger/verify-day")
+def afeg_ledger_verify_day(day: date):
+    """Re-hash every block of a UTC day in parallel and check roots, signatures and chain links."""
+    synced_ledger()
+    return get_merkle().verify_day(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp())
+
+@app.post("/afeg-gateway/import")
+async def afeg_import(request: Request, format: str = Query("ndjson", pattern="^(" + "|".join(FORMATS) + ")$")):
+    """Bulk import of an NDJSON/CSV telemetry file (the raw request body). The upload is spooled
+    next to the ledger and imported in the background; poll ``/afeg-gateway/import/{import_id}``."""
+    REQUESTS.inc("import")
+    path = spool_path(get_ledger(), format)
+    with open(path, "wb") as f:
+        async for chunk in request.stream():
+            await run_in_threadpool(f.write, chunk)
+    import_id = start_import(path, format)
+    return {"import_id": import_id, "source": path}
+
+@app.get("/afeg-gateway/import/{import_id}")
+def afeg_import_status(import_id: str):
+    """Progress of a bulk import: rows read, imported, intercepted, skipped, rejected, rows/s, status."""
+    state = import_status(import_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="import not found")
+    return state
+
+@app.post("/afeg-gateway/import/{import_id}/resume")
+def afeg_import_resume(import_id: str):
+    """Restart a failed or interrupted import from its last durable row. Only one run of an
+    import holds its lock at a time, whichever gateway worker gets the request."""
+    state = import_status(import_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="import not found")
+    if state["active"]:
+        raise HTTPException(status_code=409, detail="import already running")
+    start_import(state["source"], state["format"])
+    return import_status(import_id)
+
+@app.get("/afeg-gateway/export")
+def afeg_export(since: float | None = None, until: float | None = None):
+    """Streamed Treasury audit ZIP, optionally limited to ``since <= ts < until`` (epoch seconds)."""
+    return StreamingResponse(iter_export_zip(synced_ledger(), since, until), media_type="application/zip",
+                             headers={"Content-Disposition": "attachment; filename=AFEG_AUDIT.zip"})
+
+@app.get("/afeg-gateway/simulate")
+def afeg_simulate(paths: int = Query(2_000, ge=10, le=MAX_PATHS), days: int = Query(1, ge=1, le=MAX_DAYS),
+                  seed: int | None = None):
+    """Monte Carlo national fiscal simulation with p5/p50/p95 bands, run on the shared worker pool."""
+    try:
+        return simulate(paths=paths, days=days, seed=seed)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus scrape endpoint (per worker)."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+# -----------------------------
+# STANDALONE SERVER
+# -----------------------------
+def main():
+    ap = argparse.ArgumentParser(description="AFEG v7 Gateway API server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--log-level", default="warning")
+    args = ap.parse_args()
+    uvicorn.run("afeg_gateway:app", host=args.host, port=args.port, workers=args.workers, log_level=args.log_level)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""AFEG governance engine.
+
+Every governance rule set (input firewall, output filter, gateway risk list) is
+compiled once into a single Aho-Corasick automaton, so a scan costs one pass
+over the lower-cased text regardless of how many terms are loaded. Matching
+keeps the original substring semantics of ``any(term in text.lower() ...)``.
+
+Rules live in a JSON file mapping rule-set name -> list of terms
+(``AFEG_RULES_PATH``, default ``governance_rules.json``). The file is
+re-read automatically when its mtime changes; update it with ``save_rules``
+(temp file + rename) so a reload never sees it half-written. A file that does
+not load keeps the rules already in force (the defaults at start-up) and is
+logged.
+"""
+import json, logging, os, re, threading, time
+from collections import deque
+
+log = logging.getLogger("afeg.governance")
+
+# ------------------ DEFAULT RULES ------------------
+RULES_PATH = os.environ.get("AFEG_RULES_PATH", "governance_rules.json")
+# Up to this many terms one regex search (C, but it tries every term at each position) rules out
+# clean text faster than the automaton walk; bench_governance puts the crossover near 90 terms.
+PREFILTER_MAX_TERMS = 48
+DEFAULT_RULES = {
+    "input": ["hack", "exploit", "bypass", "malicious"],
+    "output": ["unsafe", "leak", "pii", "private"],
+    "gateway": ["hack", "bypass", "exploit", "illegal", "steal"],
+}
+
+
+# ------------------ AUTOMATON ------------------
+class Automaton:
+    """Aho-Corasick automaton over ``{rule_set: [terms]}``."""
+
+    def __init__(self, rules):
+        self.rules = {name: sorted({t.lower() for t in terms if t}) for name, terms in rules.items()}
+        goto, fail, out = [{}], [0], [()]
+        for name, terms in self.rules.items():
+            for term in terms:
+                node = 0
+                for ch in term:
+                    nxt = goto[node].get(ch)
+                    if nxt is None:
+                        nxt = len(goto)
+                        goto[node][ch] = nxt
+                        goto.append({}); fail.append(0); out.append(())
+                    node = nxt
+                out[node] += ((name, term),)
+        # Breadth-first fail links; each node inherits the outputs of its fail target.
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in goto[node].items():
+                queue.append(nxt)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] += out[fail[nxt]]
+        self._goto, self._fail, self._out = goto, fail, out
+        # Most text matches nothing: with a small rule set one regex search rules that out before
+        # the per-char walk. Larger sets go straight to the walk, whose cost doesn't grow with them.
+        terms = sorted({t for ts in self.rules.values() for t in ts})
+        self._any = re.compile("|".join(map(re.escape, terms))) if len(terms) <= PREFILTER_MAX_TERMS else None
+
+    def iter_matches(self, text):
+        """Yield ``(rule_set, term, end_index)`` for every occurrence in ``text``."""
+        text = text.lower()
+        if not self._goto[0] or (self._any is not None and not self._any.search(text)):
+            return
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for rule_set, term in out[node]:
+                yield rule_set, term, i
+
+    def first(self, text, rule_sets=None):
+        """First ``(rule_set, term)`` hit restricted to ``rule_sets``, or ``None``."""
+        for rule_set, term, _ in self.iter_matches(text):
+            if rule_sets is None or rule_set in rule_sets:
+                return rule_set, term
+        return None
+
+    def scan_all(self, text):
+        """One pass over ``text``: ``{rule_set: first term that fired}``."""
+        hits = {}
+        for rule_set, term, _ in self.iter_matches(text):
+            hits.setdefault(rule_set, term)
+        return hits
+
+
+# ------------------ RULES FILE ------------------
+def check_rules(rules):
+    """``rules`` if it maps rule-set names to lists of terms, else ``ValueError``."""
+    if not isinstance(rules, dict) or not all(
+            isinstance(name, str) and isinstance(terms, list) and all(isinstance(t, str) for t in terms)
+            for name, terms in rules.items()):
+        raise ValueError("rules must map rule-set names to lists of string terms")
+    return rules
+
+def save_rules(rules, path=RULES_PATH):
+    """Atomically replace the rules file; running engines pick it up on their next check."""
+    check_rules(rules)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(rules, f, indent=4)
+        f.flush(); os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# ------------------ ENGINE ------------------
+class GovernanceEngine:
+    """Hot-reloadable wrapper around a compiled ``Automaton``."""
+
+    def __init__(self, path=RULES_PATH, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.version = 0
+        self.automaton, self.error = Automaton(DEFAULT_RULES), None
+        self._lock = threading.Lock()
+        self._mtime, self._checked = None, 0.0
+        self._load()
+
+    def _load(self):
+        """Compile the rules file. On failure the current automaton stays in force; the file
+        is tried again once its mtime changes."""
+        mtime = os.path.getmtime(self.path) if self.path and os.path.exists(self.path) else None
+        self._mtime = mtime
+        rules = dict(DEFAULT_RULES)
+        try:
+            if mtime is not None:
+                with open(self.path) as f:
+                    rules.update(check_rules(json.load(f)))
+        except (OSError, ValueError) as exc:
+            self.error = f"{self.path}: {exc}"
+            log.error("governance rules not reloaded, keeping version %d: %s", self.version, self.error)
+            return
+        self.automaton, self.error = Automaton(rules), None
+        self.version += 1
+
+    def reload_if_changed(self):
+        """Recompile when the rules file changed; stat()s at most every ``check_interval`` seconds."""
+        now = time.monotonic()
+        if now - self._checked < self.check_interval:
+            return False
+        self._checked = now
+        mtime = os.path.getmtime(self.path) if self.path and os.path.exists(self.path) else None
+        if mtime == self._mtime:
+            return False
+        with self._lock:
+            if mtime != self._mtime:
+                self._load()
+        return True
+
+    def current_version(self):
+        """Rules version after picking up any pending file change (used to invalidate caches)."""
+        self.reload_if_changed()
+        return self.version
+
+    def scan(self, text, rule_set):
+        """``(rule_set, term)`` of the first ``rule_set`` term found in ``text``, else ``None``."""
+        self.reload_if_changed()
+        return self.automaton.first(text, (rule_set,))
+
+    def scan_all(self, text):
+        self.reload_if_changed()
+        return self.automaton.scan_all(text)
+
+    @property
+    def rules(self):
+        return self.automaton.rules
+
+
+_engine = None
+
+def get_engine():
+    """Process-wide engine shared by the apps and the gateway."""
+    global _engine
+    if _engine is None:
+        _engine = GovernanceEngine()
+    return _engine
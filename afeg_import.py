@@ -0,0 +1,413 @@
+"""AFEG bulk telemetry import.
+
+Backfills historical AI activity logs (NDJSON, or CSV with a header row) into the
+ledger under the same rules as live traffic: the input firewall and gateway risk
+rule sets (one automaton pass) and ``calculate_complexity_kvu``.
+
+    python afeg_import.py telemetry.ndjson [--workers 8] [--chunk-rows 50000]
+
+Pipeline: the file is streamed in chunks of ``chunk_rows``. Process-pool workers
+parse, score and ``prepare_entry`` whole chunks (the sorted JSON body and its
+SHA-256 content digest, which does not depend on the timestamp), and results
+come back in file order. Under the ledger lock the main process only stamps each
+record's ``ts``, folds it into the chain hash and bulk-appends each chunk with a
+single write and fsync, so the chain order is the file order whatever the
+worker count.
+
+Rows need a string ``query``. Optional: ``ts`` (epoch seconds) or ``timestamp``
+(ISO 8601), kept as ``event_ts`` (the ledger ``ts`` stays the ingest time, so it
+remains monotonic), and ``origin`` (a string of up to ``MAX_ORIGIN_CHARS``,
+default Live; at most ``MAX_ORIGINS`` distinct values per import, since the
+ledger view stores origins as small dictionary codes). Each record carries
+``import_id`` and ``import_row``. Blank or unparseable lines and rows without a
+query are ``skipped``; lines that are not valid UTF-8, rows that fail those
+checks, and rows whose timestamp is not a date between ``MIN_EVENT_TS`` and
+``MAX_EVENT_TS`` are ``rejected``.
+
+Progress goes to a state file (``<ledger>/imports/<import_id>.json``) after every
+chunk. Re-running the same import resumes after the last row that reached the
+ledger, including rows from a chunk that was interrupted mid-write. A run holds
+``<import_id>.lock`` throughout, so gateway workers or CLI runs started on the
+same file at once do not import it twice: all but one get ``ImportRunning``.
+"""
+import argparse, csv, hashlib, json, logging, math, os, sys, threading, time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from afeg_governance import Automaton, get_engine
+from afeg_kvu import build_entry, calculate_complexity_kvu
+from afeg_ledger import get_ledger, prepare_entry
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+CHUNK_ROWS = 50_000
+FORMATS = ("ndjson", "csv")
+MAX_ORIGIN_CHARS = 64
+MAX_ORIGINS = 32  # distinct origins per import
+MIN_EVENT_TS, MAX_EVENT_TS = 0.0, 253_402_300_799.0  # 1970-01-01 .. 9999-12-31
+log = logging.getLogger("afeg.import")
+
+
+class RowError(ValueError):
+    """A telemetry row that cannot be imported as it stands."""
+
+class ImportRunning(RuntimeError):
+    """The import is already running, in this or another process."""
+
+
+# ------------------ ROW SCORING (runs in the workers) ------------------
+def parse_ts(row):
+    """Event time of ``row`` in epoch seconds, ``None`` if it has none; ``RowError`` if it
+    is not a date ``datetime`` can represent (NaN, 1e20, ...)."""
+    value = row.get("ts", row.get("timestamp"))
+    if value in (None, ""):
+        return None
+    if isinstance(value, (dict, list, bool)):
+        raise RowError(f"bad timestamp {value!r}")
+    try:
+        ts = float(value)
+    except (TypeError, ValueError):
+        try:
+            ts = datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+        except (ValueError, OverflowError, OSError) as exc:
+            raise RowError(f"bad timestamp {value!r}") from exc
+    if not (math.isfinite(ts) and MIN_EVENT_TS <= ts <= MAX_EVENT_TS):
+        raise RowError(f"timestamp {value!r} out of range")
+    return ts
+
+def parse_origin(row):
+    origin = row.get("origin")
+    if origin in (None, ""):
+        return "Live"
+    if not isinstance(origin, str) or len(origin) > MAX_ORIGIN_CHARS:
+        raise RowError(f"origin must be a string of at most {MAX_ORIGIN_CHARS} characters")
+    return origin
+
+def score_row(row, automaton):
+    """Ledger entry for one telemetry row, as the live gateway would record it.
+    Raises ``RowError`` for a row that fails validation."""
+    query = row["query"]
+    if not isinstance(query, str):
+        raise RowError("query must be a string")
+    origin, event_ts = parse_origin(row), parse_ts(row)
+    hits = automaton.scan_all(query)
+    if "input" in hits:
+        entry = build_entry(query, "INTERCEPT", f"Input Risk (Firewall): {hits['input']}", "Blocked", 0.0, 0.0, 0.0, origin)
+    elif "gateway" in hits:
+        entry = build_entry(query, "INTERCEPT", f"Gateway Risk: {hits['gateway']}", "Blocked", 0.0, 0.0, 0.0, origin)
+    else:
+        inf, res, mem, _, _ = calculate_complexity_kvu(query)
+        entry = build_entry(query, "COMPLIANT", "Safe", "Delivered", inf, res, mem, origin)
+    if event_ts is not None:
+        entry["event_ts"] = event_ts
+        entry["timestamp"] = datetime.fromtimestamp(event_ts).strftime("%H:%M:%S")
+    return entry
+
+_automaton = None
+
+def _init_worker(rules):
+    global _automaton
+    _automaton = Automaton(rules)
+
+def _score_chunk(args):
+    """Worker: parse, score and prepare (serialise + content-hash) one chunk.
+    Returns (entries, prepared, skipped, rejected)."""
+    fmt, header, items, first_row, import_id = args
+    entries, prepared, skipped, rejected = [], [], 0, 0
+    for n, item in enumerate(items):
+        try:
+            if fmt == "ndjson":
+                item = item.decode("utf-8")
+            else:
+                "".join(item).encode("utf-8")  # surrogates left by iter_chunks for invalid bytes
+        except UnicodeError:
+            rejected += 1
+            continue
+        try:
+            row = json.loads(item) if fmt == "ndjson" else dict(zip(header, item))
+        except ValueError:
+            row = None
+        if not isinstance(row, dict) or not row.get("query"):
+            skipped += 1
+            continue
+        try:
+            entry = score_row(row, _automaton)
+        except RowError:
+            rejected += 1
+            continue
+        entry["import_id"], entry["import_row"] = import_id, first_row + n
+        entries.append(entry)
+        prepared.append(prepare_entry(entry))
+    return entries, prepared, skipped, rejected
+
+
+# ------------------ READING ------------------
+def iter_chunks(path, fmt, offset=0, row=0, chunk_rows=CHUNK_ROWS):
+    """Yield ``(header, items, first_row, end_offset)`` from byte ``offset`` (row number ``row``).
+    NDJSON items are raw byte lines (decoded and parsed in the workers); CSV items are field
+    lists, with undecodable bytes kept as surrogates for the workers to reject."""
+    with open(path, "rb") as f:
+        header = None
+        if fmt == "csv":
+            first = f.readline()
+            header = next(csv.reader([first.decode("utf-8-sig")]))
+            offset = max(offset, len(first))
+        f.seek(offset)
+        pos = [offset]
+
+        def lines():
+            for raw in f:
+                pos[0] += len(raw)
+                yield raw.decode("utf-8", "surrogateescape") if fmt == "csv" else raw
+
+        source = csv.reader(lines()) if fmt == "csv" else lines()
+        items = []
+        for item in source:
+            items.append(item)
+            if len(items) == chunk_rows:
+                yield header, items, row, pos[0]
+                row += len(items); items = []
+        if items:
+            yield header, items, row, pos[0]
+
+
+# ------------------ STATE ------------------
+def import_id_for(path):
+    path = os.path.abspath(path)
+    return f"{os.path.splitext(os.path.basename(path))[0]}-{hashlib.sha1(path.encode()).hexdigest()[:8]}"
+
+def state_path_for(ledger, import_id):
+    return os.path.join(ledger.path, "imports", f"{import_id}.json")
+
+def load_state(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_state(path, state):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+@contextmanager
+def job_lock(ledger, import_id):
+    """Hold the import's lock file (``<ledger>/imports/<import_id>.lock``) exclusively;
+    raises ``ImportRunning`` at once if another run holds it."""
+    path = os.path.join(ledger.path, "imports", f"{import_id}.lock")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a+b") as f:
+        try:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            raise ImportRunning(f"import {import_id} is already running") from None
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _admit_origin(state, origin):
+    """True if ``origin`` is, or still fits among, the import's ``MAX_ORIGINS`` distinct origins."""
+    origins = state["origins"]
+    if origin in origins:
+        return True
+    if len(origins) >= MAX_ORIGINS:
+        return False
+    origins.append(origin)
+    return True
+
+def _recover_unsaved(ledger, state):
+    """Fold records of this import written after the last saved chunk (a crash between the
+    append and the state save) into ``state``. Returns the last row already in the ledger."""
+    start = state["start_seq"] if state["last_seq"] is None else state["last_seq"] + 1
+    last = state["rows"] - 1
+    for record in ledger.iter_records(start):
+        if record.get("import_id") == state["import_id"]:
+            last = record["import_row"]
+            state["imported"] += 1
+            state["intercepted"] += record["status"] == "INTERCEPT"
+            _admit_origin(state, record.get("origin"))
+            state["first_seq"] = record["seq"] if state["first_seq"] is None else state["first_seq"]
+            state["last_seq"], state["head"] = record["seq"], record["hash"]
+    return last
+
+
+# ------------------ IMPORT ------------------
+def import_file(path, fmt=None, ledger=None, chunk_rows=CHUNK_ROWS, workers=None, durable=True, restart=False, progress=None):
+    """Import ``path`` into ``ledger`` (default: the shared one), resuming a previous run if
+    there is one. ``workers=0`` scores in-process; ``None`` uses one process per core.
+    Returns the final state dict."""
+    ledger = get_ledger() if ledger is None else ledger
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "ndjson")
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r}; expected one of {FORMATS}")
+    import_id = import_id_for(path)
+    state_path = state_path_for(ledger, import_id)
+    with job_lock(ledger, import_id):  # one run per import, across processes
+        stat = os.stat(path)
+        state = None if restart else load_state(state_path)
+        if state and (state["size"], state["mtime"]) != (stat.st_size, stat.st_mtime):
+            raise ValueError(f"{path} changed since import {import_id} started; pass restart=True to import it again")
+        if state and state["status"] == "done":
+            return state
+        if state is None:
+            state = {"import_id": import_id, "source": os.path.abspath(path), "format": fmt, "size": stat.st_size,
+                     "mtime": stat.st_mtime, "status": "running", "offset": 0, "rows": 0, "imported": 0, "intercepted": 0,
+                     "skipped": 0, "rejected": 0, "origins": [], "start_seq": ledger.sync(), "first_seq": None,
+                     "last_seq": None, "head": None, "elapsed_s": 0.0, "rows_per_s": 0.0, "error": None}
+        state["status"], state["error"] = "running", None
+        state.setdefault("rejected", 0)
+        state.setdefault("origins", [])
+        ledger.sync()
+        imported, done_row = state["imported"], _recover_unsaved(ledger, state)
+        state["skipped"] += (done_row + 1 - state["rows"]) - (state["imported"] - imported)  # not in the ledger, reason unknown
+        t0, elapsed0 = time.perf_counter(), state["elapsed_s"]
+
+        pool = None
+        rules = get_engine().rules
+        workers = (os.cpu_count() or 1) if workers is None else workers
+        if workers != 0:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(rules,))
+        else:
+            _init_worker(rules)
+        try:
+            inflight = deque()
+            limit = 2 * max(workers, 1)  # chunks in flight: keep every worker busy while one drains
+
+            def drain_one():
+                fut, end_row, end_offset = inflight.popleft()
+                entries, prepared, skipped, rejected = fut.result() if pool else fut
+                keep = [i for i, e in enumerate(entries) if _admit_origin(state, e["origin"])]
+                if len(keep) < len(entries):  # past MAX_ORIGINS distinct origins
+                    rejected += len(entries) - len(keep)
+                    entries, prepared = [entries[i] for i in keep], [prepared[i] for i in keep]
+                if entries:
+                    records = ledger.append_many(entries, None, durable, prepared)
+                    state["first_seq"] = records[0]["seq"] if state["first_seq"] is None else state["first_seq"]
+                    state["last_seq"], state["head"] = records[-1]["seq"], records[-1]["hash"]
+                    state["imported"] += len(records)
+                    state["intercepted"] += sum(1 for e in entries if e["status"] == "INTERCEPT")
+                state["skipped"] += skipped
+                state["rejected"] += rejected
+                state["rows"], state["offset"] = end_row, end_offset
+                state["elapsed_s"] = round(elapsed0 + time.perf_counter() - t0, 3)
+                state["rows_per_s"] = round(state["rows"] / state["elapsed_s"]) if state["elapsed_s"] else 0.0
+                save_state(state_path, state)
+                if progress:
+                    progress(state)
+
+            for header, items, first_row, end_offset in iter_chunks(path, fmt, state["offset"], state["rows"], chunk_rows):
+                end_row = first_row + len(items)
+                if done_row >= first_row:  # already in the ledger (interrupted chunk)
+                    items, first_row = items[done_row + 1 - first_row:], max(first_row, done_row + 1)
+                job = (fmt, header, items, first_row, import_id)
+                inflight.append((pool.submit(_score_chunk, job) if pool else _score_chunk(job), end_row, end_offset))
+                if len(inflight) >= limit:
+                    drain_one()
+            while inflight:
+                drain_one()
+            state["status"] = "done"
+        except BaseException as exc:
+            state["status"], state["error"] = "failed", repr(exc)
+            raise
+        finally:
+            save_state(state_path, state)
+            if pool:
+                pool.shutdown(cancel_futures=True)
+        return state
+
+
+# ------------------ BACKGROUND JOBS (gateway) ------------------
+_jobs, _jobs_lock = {}, threading.Lock()
+
+def spool_path(ledger, fmt):
+    """Where an uploaded file for a new import job is written."""
+    os.makedirs(os.path.join(ledger.path, "imports"), exist_ok=True)
+    return os.path.join(ledger.path, "imports", f"upload-{int(time.time() * 1000)}-{os.getpid()}.{fmt}")
+
+def start_import(path, fmt=None, ledger=None, **kwargs):
+    """Run ``import_file`` in a background thread (one per import). Returns the import id."""
+    import_id = import_id_for(path)
+    with _jobs_lock:
+        job = _jobs.get(import_id)
+        if job is None or not job.is_alive():
+            job = _jobs[import_id] = threading.Thread(target=_run_job, args=(path, fmt, ledger), kwargs=kwargs,
+                                                      name=f"afeg-import-{import_id}", daemon=True)
+            job.start()
+    return import_id
+
+def _run_job(path, fmt, ledger, **kwargs):
+    try:
+        import_file(path, fmt, ledger, **kwargs)
+    except ImportRunning:
+        log.info("import %s of %s is already running elsewhere", import_id_for(path), path)
+    except Exception as exc:
+        log.exception("import %s of %s failed", import_id_for(path), path)
+        # import_file records failures once it has a state; this covers those before it
+        # (missing or changed file, bad format) so import_status does not report "starting".
+        state_path = state_path_for(get_ledger() if ledger is None else ledger, import_id_for(path))
+        state = load_state(state_path) or {"import_id": import_id_for(path), "source": os.path.abspath(path),
+                                           "format": fmt}
+        if state.get("status") != "failed":
+            state["status"], state["error"] = "failed", repr(exc)
+            save_state(state_path, state)
+
+def _running_elsewhere(ledger, import_id):
+    if not os.path.exists(os.path.join(ledger.path, "imports", f"{import_id}.lock")):
+        return False
+    try:
+        with job_lock(ledger, import_id):
+            return False
+    except ImportRunning:
+        return True
+
+def import_status(import_id, ledger=None):
+    ledger = get_ledger() if ledger is None else ledger
+    state = load_state(state_path_for(ledger, import_id))
+    with _jobs_lock:
+        job = _jobs.get(import_id)
+    active = bool(job and job.is_alive()) or _running_elsewhere(ledger, import_id)
+    if state is None and active:
+        state = {"import_id": import_id, "status": "starting"}
+    if state is not None:
+        state["active"] = active
+    return state
+
+
+# ------------------ CLI ------------------
+def main():
+    ap = argparse.ArgumentParser(description="Bulk-import NDJSON/CSV AI activity telemetry into the AFEG ledger")
+    ap.add_argument("path")
+    ap.add_argument("--format", choices=FORMATS)
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    ap.add_argument("--workers", type=int, default=None, help="scoring processes (0 = in-process; default one per core)")
+    ap.add_argument("--no-fsync", action="store_true", help="skip the per-chunk fsync")
+    ap.add_argument("--restart", action="store_true", help="ignore saved progress and import from the first row")
+    args = ap.parse_args()
+
+    def report(state):
+        print(f"\r{state['rows']:,} rows  {state['imported']:,} imported  {state['intercepted']:,} intercepted  "
+              f"{state['skipped']:,} skipped  {state['rejected']:,} rejected  {state['rows_per_s']:,.0f} rows/s", end="", file=sys.stderr, flush=True)
+
+    state = import_file(args.path, args.format, chunk_rows=args.chunk_rows, workers=args.workers,
+                        durable=not args.no_fsync, restart=args.restart, progress=report)
+    print(file=sys.stderr)
+    print(json.dumps(state, indent=2))
+
+if __name__ == "__main__":
+    main()
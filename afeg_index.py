@@ -0,0 +1,288 @@
+"""AFEG ledger vault search index.
+
+Maintained at commit time so vault searches cost O(matches), not O(ledger):
+
+* hash prefixes -- the first ``HASH_KEY_CHARS`` hex digits of each record hash
+  as a uint64 key next to its seq, bucketed by the first ``HASH_BUCKET_CHARS``;
+* query substrings -- a trigram inverted index (trigram -> ascending uint64 seqs).
+  Candidates from the rarest trigrams are intersected, then confirmed against
+  the stored record. Substring search needs at least ``NGRAM`` characters.
+
+A snapshot of flat NumPy arrays (``index-<seq>-<pid>/``, named by
+``index.json``) is written next to the ledger in the background once the records
+added since the last one reach ``save_every`` or an eighth of the snapshot,
+whichever is larger, so saving stays amortised O(1) per record. On start-up the
+snapshot is memory-mapped read-only -- shared through the page cache by every
+gateway worker instead of rebuilt in each one's heap -- and only the tail after
+it is replayed.
+"""
+import json, logging, os, shutil, string, threading
+from array import array
+import numpy as np
+from numpy.lib.format import open_memmap
+from afeg_ledger import get_ledger
+
+NGRAM = 3
+HASH_BUCKET_CHARS, HASH_KEY_CHARS = 4, 16
+HEX = set(string.hexdigits.lower())
+SAVE_EVERY = 100_000
+
+log = logging.getLogger("afeg.index")
+
+
+def ngrams(text):
+    text = text.lower()
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+def _key_range(prefix):
+    """Inclusive uint64 key range of the hashes starting with ``prefix``."""
+    p = prefix[:HASH_KEY_CHARS]
+    return int(p.ljust(HASH_KEY_CHARS, "0"), 16), int(p.ljust(HASH_KEY_CHARS, "f"), 16)
+
+def _members(cand, parts):
+    """Mask of the ``cand`` seqs present in any of the ascending arrays ``parts``."""
+    m = np.zeros(len(cand), bool)
+    for p in parts:
+        if len(p):
+            i = np.minimum(np.searchsorted(p, cand), len(p) - 1)
+            m |= p[i] == cand
+    return m
+
+
+class _Delta:
+    """Records added since the snapshot (or since the previous delta was frozen for saving)."""
+
+    def __init__(self):
+        self.hashes = {}    # hash[:4] -> (array of keys, array of seqs)
+        self.postings = {}  # trigram -> array of seqs (ascending)
+        self.count = 0
+
+
+class _Snapshot:
+    """A saved index, memory-mapped: hash keys sorted with their seqs, and the postings of
+    every trigram (sorted) concatenated, ``offsets[i]:offsets[i + 1]`` being ``grams[i]``'s."""
+    FILES = ("keys", "seqs", "grams", "offsets", "postings")
+
+    def __init__(self, path, seq, head):
+        self.path, self.seq, self.head = path, seq, head
+        for name in self.FILES:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+
+    def __len__(self):
+        return len(self.seqs)
+
+    def posting(self, gram):
+        i = int(np.searchsorted(self.grams, gram))
+        if i < len(self.grams) and self.grams[i] == gram:
+            return self.postings[self.offsets[i]:self.offsets[i + 1]]
+        return self.postings[:0]
+
+
+def load_snapshot(ledger, meta_path):
+    """The snapshot named by ``meta_path`` if it still matches the chain, else ``None``."""
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if not (0 <= meta["seq"] < len(ledger) and ledger.read(meta["seq"])["hash"] == meta["head"]):
+            return None
+        return _Snapshot(os.path.join(ledger.path, meta["dir"]), meta["seq"], meta["head"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+def write_snapshot(ledger_path, meta_path, base, deltas, last):
+    """Merge ``base`` and the frozen ``deltas`` into a new snapshot directory and point
+    ``meta_path`` at it unless another process already saved a newer one."""
+    seq, head = last
+    name = f"index-{seq}-{os.getpid()}"
+    tmp = os.path.join(ledger_path, name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    # hash keys: merge the (small) sorted delta into the sorted base
+    flat = lambda i: np.concatenate([np.zeros(0, np.uint64)] + [np.frombuffer(b[i], np.uint64) for d in deltas for b in d.hashes.values()])
+    keys, seqs = flat(0), flat(1)
+    order = np.argsort(keys, kind="stable")
+    new = {"keys": keys[order], "seqs": seqs[order]}
+    at = np.arange(len(order)) + (np.searchsorted(base.keys, new["keys"], side="right") if base is not None else 0)
+    rest = np.ones(len(order) + len(base or ()), bool)
+    rest[at] = False
+    for field in ("keys", "seqs"):
+        out = open_memmap(os.path.join(tmp, f"{field}.npy"), mode="w+", dtype=np.uint64, shape=rest.shape)
+        out[at] = new[field]
+        if base is not None:
+            out[rest] = getattr(base, field)
+        out.flush(); del out
+
+    # postings: per trigram, the base run followed by each delta's (all seqs ascend)
+    base_index = {g: i for i, g in enumerate(base.grams.tolist())} if base is not None else {}
+    grams = sorted(set(base_index).union(*(d.postings for d in deltas)))
+    total = (len(base.postings) if base is not None else 0) + sum(len(a) for d in deltas for a in d.postings.values())
+    postings = open_memmap(os.path.join(tmp, "postings.npy"), mode="w+", dtype=np.uint64, shape=(total,))
+    offsets, end = np.zeros(len(grams) + 1, np.int64), 0
+    for i, g in enumerate(grams):
+        offsets[i] = end
+        j = base_index.get(g)
+        if j is not None:
+            run = base.postings[base.offsets[j]:base.offsets[j + 1]]
+            postings[end:end + len(run)] = run
+            end += len(run)
+        for d in deltas:
+            a = d.postings.get(g)
+            if a:
+                postings[end:end + len(a)] = np.frombuffer(a, np.uint64)
+                end += len(a)
+    offsets[-1] = end
+    postings.flush(); del postings
+    np.save(os.path.join(tmp, "grams.npy"), np.array(grams, dtype=f"<U{NGRAM}"))
+    np.save(os.path.join(tmp, "offsets.npy"), offsets)
+
+    final = os.path.join(ledger_path, name)
+    shutil.rmtree(final, ignore_errors=True)
+    os.replace(tmp, final)
+    snapshot = _Snapshot(final, seq, head)
+    try:
+        with open(meta_path) as f:
+            current = json.load(f)
+    except (OSError, ValueError):
+        current = None
+    if current is None or current.get("seq", -1) < seq:
+        with open(meta_path + f".{os.getpid()}.tmp", "w") as f:
+            json.dump({"seq": seq, "head": head, "dir": name}, f)
+        os.replace(meta_path + f".{os.getpid()}.tmp", meta_path)
+        current = {"seq": seq, "dir": name}
+    # Older snapshots are no longer named; workers still mapping one keep it until they unmap (POSIX).
+    for old in os.listdir(ledger_path):
+        parts = old.split("-")
+        if (old.startswith("index-") and not old.endswith(".tmp") and old not in (name, current.get("dir"))
+                and len(parts) == 3 and parts[1].isdigit() and int(parts[1]) < current["seq"]):
+            shutil.rmtree(os.path.join(ledger_path, old), ignore_errors=True)
+    return snapshot
+
+
+class LedgerIndex:
+    def __init__(self, ledger, snapshot=None):
+        self.ledger, self.base = ledger, snapshot
+        self.path, self.save_every = None, 0
+        self._deltas = [_Delta()]  # oldest first; only the last one takes new records
+        self._last = None  # (seq, hash) of the newest record added
+        self._saving = False
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        seq, h = record["seq"], record["hash"]
+        with self._lock:
+            d = self._deltas[-1]
+            keys, seqs = d.hashes.setdefault(h[:HASH_BUCKET_CHARS], (array("Q"), array("Q")))
+            keys.append(int(h[:HASH_KEY_CHARS], 16)); seqs.append(seq)
+            for g in ngrams(record.get("query", "")):
+                d.postings.setdefault(g, array("Q")).append(seq)
+            d.count += 1
+            self._last = (seq, h)
+            if (self.path and self.save_every and not self._saving
+                    and d.count >= max(self.save_every, len(self.base or ()) // 8)):
+                threading.Thread(target=self._save, args=self._freeze(), name="afeg-index-save", daemon=True).start()
+
+    # --- snapshots ---
+    def _freeze(self):
+        """(lock held) Start a new delta; returns what the snapshot being saved covers."""
+        self._deltas.append(_Delta())
+        self._saving = True
+        return self.base, self._deltas[:-1], self._last
+
+    def _save(self, base, deltas, last):
+        snapshot = None
+        try:
+            snapshot = write_snapshot(self.ledger.path, self.path, base, deltas, last)
+        except (OSError, ValueError):
+            log.exception("index snapshot at seq %d not saved", last[0])
+        with self._lock:
+            if snapshot is not None:
+                self.base = snapshot
+                del self._deltas[:len(deltas)]
+            self._saving = False
+
+    def save(self):
+        """Write a snapshot of everything added so far (blocking)."""
+        with self._lock:
+            if self._saving or not self._deltas[-1].count:
+                return
+            args = self._freeze()
+        self._save(*args)
+
+    # --- lookups ---
+    def hash_prefix(self, prefix, limit=100):
+        """Seqs whose hash starts with ``prefix`` (hex, any length), newest first."""
+        prefix = prefix.lower()
+        if not prefix or not set(prefix) <= HEX:
+            return []
+        lo, hi = _key_range(prefix)
+        seqs = []
+        with self._lock:
+            base = self.base
+            for d in self._deltas:
+                if len(prefix) >= HASH_BUCKET_CHARS:
+                    buckets = [d.hashes.get(prefix[:HASH_BUCKET_CHARS], ((), ()))]
+                else:
+                    buckets = [b for k, b in d.hashes.items() if k.startswith(prefix)]
+                seqs.extend(s for keys, ss in buckets for k, s in zip(keys, ss) if lo <= k <= hi)
+        if base is not None:
+            run = base.seqs[np.searchsorted(base.keys, np.uint64(lo)):np.searchsorted(base.keys, np.uint64(hi), side="right")]
+            if len(run) > limit:
+                run = np.partition(run, len(run) - limit)[-limit:]
+            seqs.extend(run.tolist())
+        seqs.sort(reverse=True)
+        if len(prefix) > HASH_KEY_CHARS:
+            seqs = [s for s in seqs if self.ledger.read(s)["hash"].startswith(prefix)]
+        return seqs[:limit]
+
+    def query_substring(self, term, limit=100):
+        """Seqs whose query contains ``term`` (case-insensitive), newest first."""
+        term = term.lower()
+        grams = ngrams(term)
+        if not grams:
+            return []
+        with self._lock:
+            base = self.base
+            # copies: the live delta's arrays keep growing once the lock is released
+            deltas = {g: [np.array(d.postings[g], np.uint64) for d in self._deltas if g in d.postings] for g in grams}
+        lists = sorted((([base.posting(g)] if base is not None else []) + deltas[g] for g in grams),
+                       key=lambda parts: sum(len(p) for p in parts))
+        candidates = np.concatenate(lists[0]) if lists[0] else np.zeros(0, np.uint64)
+        for parts in lists[1:]:
+            if not len(candidates):
+                break
+            candidates = candidates[_members(candidates, parts)]
+        out = []
+        for seq in reversed(candidates.tolist()):
+            if term in self.ledger.read(seq).get("query", "").lower():
+                out.append(seq)
+                if len(out) >= limit:
+                    break
+        return out
+
+    def search(self, text, limit=100):
+        """Records matching ``text`` as a hash prefix or a query substring, newest first."""
+        text = text.strip()
+        seqs = set(self.hash_prefix(text, limit)) | set(self.query_substring(text, limit))
+        return [self.ledger.read(s) for s in sorted(seqs, reverse=True)[:limit]]
+
+
+def attach_index(ledger, save_every=SAVE_EVERY):
+    """Map the saved snapshot if it still matches the chain and replay the tail, else build from genesis."""
+    meta_path = os.path.join(ledger.path, "index.json")
+    snapshot = load_snapshot(ledger, meta_path)
+    index = LedgerIndex(ledger, snapshot)
+    index.path, index.save_every = meta_path, save_every
+    ledger.subscribe(index.add, start=snapshot.seq + 1 if snapshot else 0)
+    return index
+
+
+_index, _index_lock = None, threading.Lock()
+
+def get_index():
+    """Search index attached to the process-wide ledger."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = attach_index(get_ledger())
+        return _index
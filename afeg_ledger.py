@@ -0,0 +1,486 @@
+"""AFEG KVU ledger engine.
+
+Append-only, SHA-256 hash-chained ledger kept on disk as fixed-size NDJSON
+segments. Every segment ``segment-NNNNNN.ndjson`` has a sidecar
+``segment-NNNNNN.idx`` holding one little-endian uint64 byte offset per record,
+so any record can be located from its sequence number without an in-memory
+index. Recent segments are read through read-only memory maps.
+
+Derived views (aggregates, indexes, rollups) register with ``subscribe`` and
+are fed every record once, in chain order, as it is appended.
+
+Several processes (e.g. gateway workers and the dashboard) may share one
+ledger directory: appends take an inter-process lock on ``ledger.lock`` and
+first absorb any records other processes wrote; readers call ``sync()``.
+
+The active segment doubles as the write-ahead log: a record reaches the data
+file (and, with ``durable=True``, stable storage) before any listener or reader
+sees it, and ``_recover`` replays the file on start-up, dropping a torn tail and
+rebuilding the idx. ``afeg_commit`` batches concurrent appends into group
+commits with one fsync each.
+
+Record hash = sha256(f"{seq}:{prev_hash}:{ts}:{content_digest}") where the
+content digest is the SHA-256 of the canonical JSON of the entry (every field but
+seq/ts/prev/hash). The digest does not depend on the timestamp, so it can be
+computed ahead of the append, outside the lock (``prepare_entry``, e.g. in a
+process pool); under the lock each record only gets its seq, ts and chain fold.
+"""
+import hashlib, json, logging, mmap, os, threading, time
+from array import array
+from collections import OrderedDict
+from afeg_metrics import STAGE_SECONDS
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# ------------------ CONFIG ------------------
+LEDGER_DIR = os.environ.get("AFEG_LEDGER_DIR", "afeg_ledger_data")
+SEGMENT_RECORDS = 100_000
+GENESIS_HASH = "0" * 64
+RESERVED_FIELDS = ("seq", "ts", "prev", "hash")
+log = logging.getLogger("afeg.ledger")
+
+
+class EntryError(ValueError):
+    """An entry could not be serialised; raised by ``append_many`` before anything is written."""
+
+
+# ------------------ HASHING ------------------
+_RESERVED = frozenset(RESERVED_FIELDS)
+_sorted_json = json.JSONEncoder(sort_keys=True, separators=(",", ":")).encode
+
+def _fields(entry):
+    """``entry`` without reserved fields (itself when it has none, the usual case)."""
+    return entry if _RESERVED.isdisjoint(entry) else {k: v for k, v in entry.items() if k not in _RESERVED}
+
+def content_body(entry):
+    """The key-sorted JSON object that ``content_digest`` hashes."""
+    return _sorted_json(_fields(entry))
+
+def content_digest(entry):
+    return hashlib.sha256(content_body(entry).encode()).hexdigest()
+
+def chain_hash(seq, prev, ts, digest):
+    return hashlib.sha256(f"{seq}:{prev}:{float(ts)!r}:{digest}".encode()).hexdigest()
+
+def prepare_entry(entry):
+    """``(body, digest)``: ``content_body(entry)`` and its ``content_digest``. Everything about a
+    record except its timestamp and chain position, so it can be computed ahead of time (e.g.
+    in a process pool). ``EntryError`` if the entry isn't JSON-serialisable."""
+    try:
+        body = content_body(entry)
+    except (TypeError, ValueError) as exc:
+        raise EntryError(f"entry is not JSON-serialisable: {exc}") from exc
+    return body, hashlib.sha256(body.encode()).hexdigest()
+
+
+# ------------------ LOCKING ------------------
+class _FileLock:
+    """Exclusive inter-process lock (flock on POSIX, msvcrt.locking on Windows).
+    Re-entrant for the owning thread; callers hold the ledger's RLock first."""
+
+    def __init__(self, path):
+        self._f = open(path, "a+b")
+        self._depth = 0
+
+    def __enter__(self):
+        if self._depth == 0:
+            if fcntl:
+                fcntl.flock(self._f, fcntl.LOCK_EX)
+            else:
+                self._f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(self._f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        pass
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl:
+                fcntl.flock(self._f, fcntl.LOCK_UN)
+            else:
+                self._f.seek(0)
+                msvcrt.locking(self._f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def close(self):
+        self._f.close()
+
+
+def _fsync_dir(path):
+    """Persist directory entries (no-op on Windows, where directories can't be fsynced)."""
+    if fcntl:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+# ------------------ LEDGER ------------------
+class KVULedger:
+    """Segmented append-only ledger. Thread-safe, and safe to share across processes."""
+
+    def __init__(self, path=LEDGER_DIR, segment_records=SEGMENT_RECORDS, cache_segments=4):
+        self.path = path
+        self.segment_records = segment_records
+        self.cache_segments = cache_segments
+        self._lock = threading.RLock()
+        self._maps = OrderedDict()  # closed segment -> (mmap, offsets)
+        self._data = self._idx = None
+        self._listeners = []
+        os.makedirs(path, exist_ok=True)
+        self._flock = _FileLock(os.path.join(path, "ledger.lock"))
+        with self._lock, self._flock:
+            self._recover()
+
+    # --- file layout ---
+    def _seg_path(self, seg, ext):
+        return os.path.join(self.path, f"segment-{seg:06d}.{ext}")
+
+    def _segments(self):
+        segs = [int(n[8:14]) for n in os.listdir(self.path) if n.startswith("segment-") and n.endswith(".ndjson")]
+        return sorted(segs)
+
+    def _recover(self):
+        """Find the chain head, repairing a torn write at the tail of the last segment. A last
+        segment left empty (a crash while writing its first record) becomes the active one."""
+        segs = self._segments()
+        self._seg = segs[-1] if segs else 0
+        data_path, idx_path = self._seg_path(self._seg, "ndjson"), self._seg_path(self._seg, "idx")
+        offsets, last, good = array("Q"), None, 0
+        if os.path.exists(data_path):
+            with open(data_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        last = json.loads(line)
+                    except ValueError:
+                        break
+                    offsets.append(good)
+                    good += len(line)
+            if good != os.path.getsize(data_path):
+                with open(data_path, "r+b") as f:
+                    f.truncate(good)
+        with open(idx_path, "wb") as f:
+            offsets.tofile(f)
+        self._offsets, self._end = offsets, good
+        self.next_seq = self._seg * self.segment_records + len(offsets)
+        if last is not None:
+            self.head = last["hash"]
+        elif self._seg > 0:
+            self.head = self.read(self.next_seq - 1)["hash"]
+        else:
+            self.head = GENESIS_HASH
+        self._open_active()
+
+    def _open_active(self):
+        self._data = open(self._seg_path(self._seg, "ndjson"), "ab")
+        self._idx = open(self._seg_path(self._seg, "idx"), "ab")
+
+    def _roll(self):
+        self._data.close(); self._idx.close()
+        self._seg += 1
+        self._offsets, self._end = array("Q"), 0
+        self._open_active()
+        _fsync_dir(self.path)  # the new segment's directory entries must survive a power loss too
+
+    def _catch_up(self):
+        """Absorb records other processes appended since we last looked (flock held).
+        Under the flock nobody is mid-write, so bytes past the last complete record are a
+        torn tail left by a writer that died: they are cut off before anything is appended
+        after them, and the idx is brought back in line with the data."""
+        while True:
+            path = self._seg_path(self._seg, "ndjson")
+            size = os.path.getsize(path)
+            if size > self._end:
+                with open(path, "rb") as f:
+                    f.seek(self._end)
+                    chunk = f.read(size - self._end)
+                for line in chunk.splitlines(keepends=True):
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    self._offsets.append(self._end)
+                    self._end += len(line)
+                    self.head, self.next_seq = record["hash"], record["seq"] + 1
+                    self._notify(record)
+                if self._end < size:
+                    os.truncate(path, self._end)
+                self._sync_idx()
+            if len(self._offsets) >= self.segment_records and os.path.exists(self._seg_path(self._seg + 1, "ndjson")):
+                self._roll()
+            else:
+                return
+
+    def _sync_idx(self):
+        """Make the active idx hold exactly ``_offsets`` (a writer may have died between its
+        data and idx writes, or mid-entry)."""
+        path = self._seg_path(self._seg, "idx")
+        size, want = os.path.getsize(path), len(self._offsets) * 8
+        if size != want:
+            keep = min(size, want) // 8 * 8
+            os.truncate(path, keep)
+            self._idx.write(self._offsets[keep // 8:].tobytes()); self._idx.flush()
+
+    def sync(self):
+        """Bring this handle (and its listeners) up to date with other writers. Returns the length."""
+        with self._lock, self._flock:
+            self._catch_up()
+            return self.next_seq
+
+    # --- writes ---
+    def _write(self, lines, offsets, durable):
+        """Write buffered lines of the active segment; fsync the data file when ``durable``.
+        The idx sidecar is rebuilt from the data by ``_recover``, so it only needs a flush."""
+        if lines:
+            self._data.write(b"".join(lines)); self._data.flush()
+            self._idx.write(offsets.tobytes()); self._idx.flush()
+            if durable:
+                os.fsync(self._data.fileno())
+        del lines[:], offsets[:]
+
+    def append(self, entry, ts=None, durable=False):
+        """Chain ``entry`` onto the head and persist it. Returns the stored record."""
+        return self.append_many([entry], None if ts is None else [ts], durable)[0]
+
+    def append_many(self, entries, ts=None, durable=False, prepared=None):
+        """Chain ``entries`` onto the head with one write (and, if ``durable``, one fsync) per
+        segment touched. ``ts`` is an optional per-entry list of timestamps (None = now, taken
+        under the lock so the chain stays in time order); ``prepared`` optional ``prepare_entry``
+        results for them, otherwise computed here before the lock is taken. Each record is
+        serialised and content-hashed once (its line embeds that body after ``seq`` and ``ts``);
+        under the lock it only gets its ts and chain hash (timed as the ``hash`` and
+        ``hash_chain`` stages). All-or-nothing: a bad entry raises ``EntryError`` before anything
+        is written. Listeners see the records only once they are written; their errors are
+        logged, not raised. Returns the stored records."""
+        if prepared is None:
+            with STAGE_SECONDS.time("hash"):
+                prepared = []
+                for i, entry in enumerate(entries):
+                    try:
+                        prepared.append(prepare_entry(entry))
+                    except EntryError as exc:
+                        raise EntryError(f"entry {i}: {exc}") from exc
+        with self._lock, self._flock:
+            self._catch_up()
+            records, seq, head = [], self.next_seq, self.head
+            with STAGE_SECONDS.time("hash_chain"):
+                for i, entry in enumerate(entries):
+                    t = float(ts[i] if ts is not None and ts[i] is not None else time.time())
+                    record = {"seq": seq, "ts": t, **_fields(entry)}
+                    record["prev"] = prev = head
+                    record["hash"] = head = chain_hash(seq, prev, t, prepared[i][1])
+                    records.append(record)
+                    seq += 1
+            lines, offsets = [], array("Q")
+            for record, (body, _) in zip(records, prepared):
+                fields = f",{body[1:-1]}" if len(body) > 2 else ""
+                line = (f'{{"seq":{record["seq"]},"ts":{record["ts"]!r}{fields},'
+                        f'"prev":"{record["prev"]}","hash":"{record["hash"]}"}}\n').encode()
+                if len(self._offsets) >= self.segment_records:
+                    self._write(lines, offsets, durable)
+                    if durable:
+                        os.fsync(self._idx.fileno())  # closed segments are never re-indexed
+                    self._roll()
+                lines.append(line); offsets.append(self._end); self._offsets.append(self._end)
+                self._end += len(line)
+            self._write(lines, offsets, durable)
+            self.head, self.next_seq = head, seq
+            for record in records:
+                self._notify(record)
+            return records
+
+    def _notify(self, record):
+        """Feed a written record to every listener. The record is already on disk, so a failing
+        listener is logged, not raised: the append succeeded and must not be retried."""
+        for listener in self._listeners:
+            try:
+                listener(record)
+            except Exception:
+                log.exception("ledger listener %r failed on seq %d", listener, record["seq"])
+
+    def fsync(self):
+        """Force everything written so far to stable storage."""
+        with self._lock:
+            os.fsync(self._data.fileno()); os.fsync(self._idx.fileno())
+
+    def subscribe(self, listener, start=0):
+        """Replay records from ``start`` into ``listener`` then feed it every new append."""
+        with self._lock:
+            for record in self.iter_records(start):
+                listener(record)
+            self._listeners.append(listener)
+
+    # --- reads ---
+    def _view(self, seg):
+        """(mmap, offsets, transient) for ``seg``. Closed segments are cached; the
+        active segment is mapped up to its current size and must be closed by the caller."""
+        if seg == self._seg:
+            size = self._end
+            if not size:
+                return None, self._offsets, False
+            with open(self._seg_path(seg, "ndjson"), "rb") as f:
+                return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ), self._offsets, True
+        if seg in self._maps:
+            self._maps.move_to_end(seg)
+            return self._maps[seg] + (False,)
+        with open(self._seg_path(seg, "ndjson"), "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        offsets = array("Q")
+        with open(self._seg_path(seg, "idx"), "rb") as f:
+            offsets.frombytes(f.read())
+        self._maps[seg] = (mm, offsets)
+        while len(self._maps) > self.cache_segments:
+            self._maps.popitem(last=False)[1][0].close()
+        return mm, offsets, False
+
+    def _slice(self, seg, first, last):
+        """Raw NDJSON bytes for segment positions ``first <= pos < last``."""
+        mm, offsets, transient = self._view(seg)
+        try:
+            end = offsets[last] if last < len(offsets) else len(mm)
+            return mm[offsets[first]:end]
+        finally:
+            if transient:
+                mm.close()
+
+    def __len__(self):
+        return self.next_seq
+
+    @property
+    def active_segment(self):
+        """Number of the segment new records are appended to."""
+        return self._seg
+
+    def read(self, seq):
+        if not 0 <= seq < self.next_seq:
+            raise IndexError(f"ledger seq {seq} out of range")
+        with self._lock:
+            seg, pos = divmod(seq, self.segment_records)
+            return json.loads(self._slice(seg, pos, pos + 1))
+
+    def iter_records(self, start=0, stop=None):
+        """Yield records in chain order for ``start <= seq < stop``, one segment slice at a time."""
+        stop = self.next_seq if stop is None else min(stop, self.next_seq)
+        seq = max(start, 0)
+        while seq < stop:
+            seg, pos = divmod(seq, self.segment_records)
+            end = min(stop, (seg + 1) * self.segment_records)
+            with self._lock:
+                chunk = self._slice(seg, pos, end - seg * self.segment_records)
+            for line in chunk.splitlines():
+                yield json.loads(line)
+            seq = end
+
+    def seek_time(self, ts):
+        """First seq whose record ``ts >= ts`` (binary search; records are appended in time order)."""
+        lo, hi = 0, self.next_seq
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.read(mid)["ts"] < ts: lo = mid + 1
+            else: hi = mid
+        return lo
+
+    def recent(self, n=50):
+        """Newest-first list of the last ``n`` records."""
+        return list(self.iter_records(self.next_seq - n))[::-1]
+
+    # --- verification ---
+    def _checkpoint_path(self):
+        return os.path.join(self.path, "checkpoint.json")
+
+    def checkpoint(self):
+        try:
+            with open(self._checkpoint_path()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"seq": -1, "hash": GENESIS_HASH}
+
+    def verify(self, full=False):
+        """Re-hash the chain from the last verified checkpoint (or genesis if ``full``)."""
+        cp = {"seq": -1, "hash": GENESIS_HASH} if full else self.checkpoint()
+        if cp["seq"] >= self.next_seq:
+            return {"ok": False, "verified_seq": cp["seq"], "checked": 0, "error": "ledger shorter than checkpoint"}
+        prev, seq, checked = cp["hash"], cp["seq"], 0
+        if seq >= 0 and self.read(seq)["hash"] != prev:
+            return {"ok": False, "verified_seq": seq, "checked": 0, "error": f"checkpoint hash mismatch at seq {seq}"}
+        for rec in self.iter_records(seq + 1):
+            expected = chain_hash(rec["seq"], prev, rec["ts"], content_digest(rec))
+            if rec["prev"] != prev or rec["hash"] != expected:
+                return {"ok": False, "verified_seq": seq, "checked": checked, "error": f"chain broken at seq {rec['seq']}"}
+            prev, seq, checked = rec["hash"], rec["seq"], checked + 1
+        tmp = self._checkpoint_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"seq": seq, "hash": prev, "verified_at": time.time()}, f)
+        os.replace(tmp, self._checkpoint_path())
+        return {"ok": True, "verified_seq": seq, "checked": checked, "error": None}
+
+    def close(self):
+        with self._lock:
+            for mm, _ in self._maps.values():
+                mm.close()
+            self._maps.clear()
+            self._data.close(); self._idx.close()
+            self._flock.close()
+
+
+# ------------------ READ-ONLY ACCESS ------------------
+class LedgerReader:
+    """Read-only access to a ledger directory from another process (e.g. verification
+    workers): no lock, no recovery, no writes. It only returns complete records, so it is
+    safe alongside live writers; records still being written just aren't there yet."""
+
+    def __init__(self, path=LEDGER_DIR, segment_records=SEGMENT_RECORDS):
+        self.path = path
+        self.segment_records = segment_records
+
+    def _seg_path(self, seg, ext):
+        return os.path.join(self.path, f"segment-{seg:06d}.{ext}")
+
+    def _seek(self, f, seg, pos):
+        """Position ``f`` (segment ``seg``'s data) at record ``pos``."""
+        with open(self._seg_path(seg, "idx"), "rb") as idx:
+            idx.seek(pos * 8)
+            raw = idx.read(8)
+        if len(raw) == 8:
+            f.seek(array("Q", raw)[0])
+            return
+        for _ in range(pos):  # idx behind the data (a writer died between the two): count lines
+            f.readline()
+
+    def iter_records(self, start, stop):
+        """Yield records for ``start <= seq < stop``; ``IndexError`` if one isn't fully written."""
+        seq = max(start, 0)
+        while seq < stop:
+            seg, pos = divmod(seq, self.segment_records)
+            end = min(stop, (seg + 1) * self.segment_records)
+            with open(self._seg_path(seg, "ndjson"), "rb") as f:
+                self._seek(f, seg, pos)
+                for seq in range(seq, end):
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        raise IndexError(f"ledger seq {seq} is not written")
+                    yield json.loads(line)
+            seq = end
+
+
+_ledger, _ledger_lock = None, threading.Lock()
+
+def get_ledger():
+    """Process-wide ledger shared by the dashboards and the gateway."""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = KVULedger()
+        return _ledger
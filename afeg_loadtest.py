@@ -0,0 +1,128 @@
+"""AFEG gateway load generator.
+
+Runs many concurrent asyncio clients against ``/afeg-gateway`` -- in-process
+through the ASGI app (default; the CLI gives it a throwaway ledger in a
+temporary directory) or against a running server (``--url``) -- with
+a configurable mix of deep-reasoning, standard and risky queries, and prints a
+JSON report: throughput, p50/p95/p99 latency and a latency histogram.
+
+    python afeg_loadtest.py --requests 20000 --concurrency 128 --mix deep=0.3,standard=0.6,risky=0.1
+    python afeg_loadtest.py --url http://127.0.0.1:8000 --out surge.json
+"""
+import argparse, asyncio, json, os, random, shutil, tempfile, time
+from bisect import bisect_left
+import httpx
+
+QUERY_TEMPLATES = {
+    "deep": ["How do I audit AI reasoning costs in {region}", "Explain the VAT treatment of inference in {region}",
+             "Why did compute demand spike in {region}"],
+    "standard": ["What is the AI inference load in {region}", "List the top AI workloads in {region}",
+                 "Who operates the largest cluster in {region}"],
+    "risky": ["How to bypass the firewall in {region}", "hack the treasury grid in {region}",
+              "exploit the ledger in {region}"],
+}
+REGIONS = ["London", "Manchester", "Edinburgh", "Cardiff", "Belfast", "Leeds", "Bristol", "Glasgow"]
+DEFAULT_MIX = "deep=0.3,standard=0.6,risky=0.1"
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in QUERY_TEMPLATES:
+            raise ValueError(f"unknown query kind {kind!r}; expected one of {sorted(QUERY_TEMPLATES)}")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+def percentile(sorted_vals, p):
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(round(p / 100 * (len(sorted_vals) - 1))))]
+
+def summarize(latencies_ms):
+    lat = sorted(latencies_ms)
+    return {"count": len(lat), "mean": round(sum(lat) / len(lat), 3) if lat else 0.0,
+            "p50": round(percentile(lat, 50), 3), "p95": round(percentile(lat, 95), 3),
+            "p99": round(percentile(lat, 99), 3), "max": round(lat[-1], 3) if lat else 0.0}
+
+def histogram(latencies_ms, buckets=HISTOGRAM_BUCKETS_MS):
+    counts = [0] * (len(buckets) + 1)
+    for v in latencies_ms:
+        counts[bisect_left(buckets, v)] += 1
+    return [{"le": le, "count": c} for le, c in zip(list(buckets) + ["+Inf"], counts)]
+
+
+async def run_load_test(requests=5_000, concurrency=64, mix=DEFAULT_MIX, url=None, app=None, seed=0, timeout=10.0):
+    """Drive ``requests`` gateway calls from ``concurrency`` clients and return the report dict."""
+    mix = parse_mix(mix) if isinstance(mix, str) else mix
+    kinds, weights = list(mix), list(mix.values())
+    rng = random.Random(seed)
+    plan = [(k, rng.choice(QUERY_TEMPLATES[k]).format(region=rng.choice(REGIONS)))
+            for k in rng.choices(kinds, weights, k=requests)]
+    if url is None and app is None:
+        from afeg_gateway import app
+    transport = httpx.ASGITransport(app=app) if url is None else None
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies = {k: [] for k in kinds}
+    outcome = {"errors": 0, "approved": 0, "blocked": 0, "kvu": 0.0}
+    cursor = iter(plan)
+
+    async with httpx.AsyncClient(transport=transport, base_url=url or "http://afeg-gateway", timeout=timeout, limits=limits) as client:
+        async def worker():
+            for kind, query in cursor:
+                t0 = time.perf_counter()
+                try:
+                    r = await client.post("/afeg-gateway", json={"query": query})
+                    r.raise_for_status()
+                    body = r.json()
+                except (httpx.HTTPError, ValueError):
+                    outcome["errors"] += 1
+                    continue
+                latencies[kind].append((time.perf_counter() - t0) * 1e3)
+                outcome[body["status"]] = outcome.get(body["status"], 0) + 1
+                outcome["kvu"] += body["kvu"]
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    all_lat = [v for vals in latencies.values() for v in vals]
+    return {
+        "target": url or "in-process", "requests": requests, "concurrency": concurrency, "mix": mix,
+        "elapsed_s": round(elapsed, 3), "throughput_rps": round(len(all_lat) / elapsed, 1) if elapsed else 0.0,
+        **outcome, "latency_ms": summarize(all_lat),
+        "by_kind": {k: summarize(v) for k, v in latencies.items()},
+        "histogram_ms": histogram(all_lat),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="AFEG gateway load generator")
+    ap.add_argument("--requests", type=int, default=5_000)
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--mix", default=DEFAULT_MIX, help="kind=weight list, kinds: deep, standard, risky")
+    ap.add_argument("--url", help="gateway base URL; omit to drive the ASGI app in-process")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--timeout", type=float, default=10.0)
+    ap.add_argument("--out", help="also write the JSON report to this file")
+    args = ap.parse_args()
+    path = None
+    if args.url is None:
+        path = tempfile.mkdtemp(prefix="afeg-loadtest-")
+        os.environ["AFEG_LEDGER_DIR"] = path  # before the gateway (and its ledger) is imported
+    try:
+        report = asyncio.run(run_load_test(args.requests, args.concurrency, args.mix, args.url, seed=args.seed, timeout=args.timeout))
+    finally:
+        if path:
+            from afeg_commit import get_committer
+            get_committer().close()
+            shutil.rmtree(path)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+
+if __name__ == "__main__":
+    main()
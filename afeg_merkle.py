@@ -0,0 +1,278 @@
+"""AFEG Merkle checkpoints.
+
+The ledger is cut into hourly blocks (the ACT 4 buckets): a block is the
+contiguous run of records appended while the clock stays in one UTC hour. When
+a block closes its record hashes are folded into a Merkle tree and the signed
+root is appended to ``merkle_roots.ndjson`` in the ledger directory.
+
+* inclusion proof for one record: O(log n) sibling hashes, checkable offline
+  with ``verify_proof`` against the published root;
+* whole-day verification: each block is re-hashed (chain links + Merkle root)
+  in its own process, then the block boundaries are linked up.
+
+Leaves and nodes are domain-separated (RFC 6962 style); an unpaired node is
+promoted to the next level unchanged. Roots are signed with Ed25519. The private
+key lives outside the ledger directory (``AFEG_SIGNING_KEY_FILE``, default
+``~/.afeg/signing-key.pem``, generated on first use), so rewriting the ledger
+does not let anyone re-sign its roots; anyone holding the public key
+(``/afeg-gateway/ledger/signing-key``) can check a root with ``verify_root``.
+"""
+import hashlib, json, os, threading, time
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+from cryptography.hazmat.primitives.serialization import (Encoding, NoEncryption, PrivateFormat, PublicFormat,
+                                                          load_pem_private_key)
+from afeg_ledger import GENESIS_HASH, LedgerReader, chain_hash, content_digest, get_ledger
+
+BLOCK_SECONDS = 3600
+SIGNING_KEY_FILE = os.path.join(os.path.expanduser("~"), ".afeg", "signing-key.pem")
+LEVELS_CACHE = 48  # sealed blocks whose trees are kept for proofs
+
+
+# ------------------ TREE ------------------
+def leaf_hash(record_hash):
+    return hashlib.sha256(b"\x00" + bytes.fromhex(record_hash)).digest()
+
+def node_hash(left, right):
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+def build_levels(leaves):
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        prev = levels[-1]
+        nxt = [node_hash(prev[i], prev[i + 1]) for i in range(0, len(prev) - 1, 2)]
+        if len(prev) % 2:
+            nxt.append(prev[-1])
+        levels.append(nxt)
+    return levels
+
+def merkle_root(leaves):
+    return build_levels(leaves)[-1][0].hex() if leaves else hashlib.sha256(b"").hexdigest()
+
+def inclusion_proof(levels, index):
+    """Sibling path for leaf ``index``: ``[{"side": "L"|"R", "hash": hex}]`` from leaf to root."""
+    path = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            path.append({"side": "L" if sibling < index else "R", "hash": level[sibling].hex()})
+        index //= 2
+    return path
+
+def verify_proof(record_hash, path, root):
+    """True if ``record_hash`` folds up through ``path`` to ``root`` (hex)."""
+    h = leaf_hash(record_hash)
+    for step in path:
+        sib = bytes.fromhex(step["hash"])
+        h = node_hash(sib, h) if step["side"] == "L" else node_hash(h, sib)
+    return h.hex() == root
+
+
+# ------------------ SIGNING ------------------
+def load_signing_key(ledger_path, key_file=None):
+    """Ed25519 private key for block roots from ``key_file`` (default ``AFEG_SIGNING_KEY_FILE``,
+    else ``SIGNING_KEY_FILE``), generated there if missing. ``ValueError`` if it is inside the
+    ledger directory."""
+    path = os.path.abspath(key_file or os.environ.get("AFEG_SIGNING_KEY_FILE") or SIGNING_KEY_FILE)
+    ledger_path = os.path.abspath(ledger_path)
+    if os.path.commonpath([path, ledger_path]) == ledger_path:
+        raise ValueError(f"signing key {path} must live outside the ledger directory {ledger_path}")
+    if not os.path.exists(path):
+        _create_signing_key(path)
+    with open(path, "rb") as f:
+        return load_pem_private_key(f.read(), password=None)
+
+def _create_signing_key(path):
+    """Write a new key to a private tmp file and hard-link it into place. The link fails if
+    another worker got there first, and then its key is used: a key file is never half-written."""
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    pem = Ed25519PrivateKey.generate().private_bytes(Encoding.PEM, PrivateFormat.PKCS8, NoEncryption())
+    tmp = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(pem); f.flush(); os.fsync(f.fileno())
+        os.link(tmp, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.unlink(tmp)
+
+def public_key_hex(key):
+    """Raw 32-byte Ed25519 public key (of a private or public key) as hex."""
+    if isinstance(key, Ed25519PrivateKey):
+        key = key.public_key()
+    return key.public_bytes(Encoding.Raw, PublicFormat.Raw).hex()
+
+def _signed_payload(root_entry):
+    fields = ("block", "first_seq", "last_seq", "size", "root")
+    return json.dumps({k: root_entry[k] for k in fields}, sort_keys=True, separators=(",", ":")).encode()
+
+def sign_root(key, root_entry):
+    return key.sign(_signed_payload(root_entry)).hex()
+
+def verify_root(public_key, root_entry):
+    """True if ``root_entry`` carries a valid signature by ``public_key`` (hex, as published)."""
+    try:
+        Ed25519PublicKey.from_public_bytes(bytes.fromhex(public_key)).verify(
+            bytes.fromhex(root_entry.get("signature") or ""), _signed_payload(root_entry))
+        return True
+    except (InvalidSignature, ValueError):
+        return False
+
+
+# ------------------ BLOCK VERIFICATION (worker) ------------------
+def _verify_block(args):
+    """Re-hash one block in a worker process: chain links, content digests and Merkle root.
+    Reads through a ``LedgerReader``, so live writers are never locked out or repaired under."""
+    path, segment_records, entry = args
+    leaves, prev, first_prev = [], None, None
+    for rec in LedgerReader(path, segment_records).iter_records(entry["first_seq"], entry["last_seq"] + 1):
+        if prev is None:
+            first_prev = rec["prev"]
+        elif rec["prev"] != prev:
+            return {"block": entry["block"], "ok": False, "error": f"chain broken at seq {rec['seq']}"}
+        if rec["hash"] != chain_hash(rec["seq"], rec["prev"], rec["ts"], content_digest(rec)):
+            return {"block": entry["block"], "ok": False, "error": f"record tampered at seq {rec['seq']}"}
+        leaves.append(leaf_hash(rec["hash"]))
+        prev = rec["hash"]
+    ok = merkle_root(leaves) == entry["root"]
+    return {"block": entry["block"], "ok": ok, "error": None if ok else "merkle root mismatch",
+            "first_prev": first_prev, "last_hash": prev}
+
+
+# ------------------ CHECKPOINTER ------------------
+class MerkleCheckpointer:
+    """Ledger listener that closes hourly blocks and publishes signed Merkle roots."""
+
+    def __init__(self, ledger, block_seconds=BLOCK_SECONDS):
+        self.ledger = ledger
+        self.block_seconds = block_seconds
+        self.key = load_signing_key(ledger.path)
+        self.public_key = public_key_hex(self.key)
+        self.roots_path = os.path.join(ledger.path, "merkle_roots.ndjson")
+        self.roots = self._load_roots()
+        self._open = None  # [block, first_seq, [leaf, ...]]
+        self._levels = OrderedDict()  # sealed block -> tree levels (LRU)
+        self._lock = threading.Lock()
+
+    def _load_roots(self):
+        roots = []
+        if os.path.exists(self.roots_path):
+            with open(self.roots_path) as f:
+                roots = [json.loads(l) for l in f if l.strip()]
+        return roots
+
+    def add(self, record):
+        block = int(record["ts"] // self.block_seconds)
+        with self._lock:
+            if self._open is not None and block > self._open[0]:
+                self._publish()
+            if self._open is None:
+                self._open = [block, record["seq"], []]
+            self._open[2].append(leaf_hash(record["hash"]))
+
+    def _publish(self):
+        block, first_seq, leaves = self._open
+        self._open = None
+        levels = build_levels(leaves)
+        self._cache_levels(block, levels)
+        entry = {"block": block, "hour_start": block * self.block_seconds, "first_seq": first_seq,
+                 "last_seq": first_seq + len(leaves) - 1, "size": len(leaves), "root": levels[-1][0].hex()}
+        entry["signature"] = sign_root(self.key, entry)
+        entry["signed_at"] = time.time()
+        # Several gateway workers replay the same records; only the first one publishes.
+        with self.ledger._flock:
+            self.roots = self._load_roots()
+            if self.roots and self.roots[-1]["last_seq"] >= entry["last_seq"]:
+                return
+            with open(self.roots_path, "a") as f:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+                f.flush(); os.fsync(f.fileno())
+            self.roots.append(entry)
+
+    # --- queries ---
+    def published(self, since=None, until=None):
+        return [r for r in self.roots if (since is None or r["hour_start"] >= since) and (until is None or r["hour_start"] < until)]
+
+    def _block_for(self, seq):
+        with self._lock:
+            if self._open is not None and seq >= self._open[1]:
+                block, first, leaves = self._open
+                entry = {"block": block, "hour_start": block * self.block_seconds, "first_seq": first,
+                         "last_seq": first + len(leaves) - 1, "size": len(leaves), "signature": None, "open": True}
+                return entry, list(leaves)
+        i = bisect_right([r["first_seq"] for r in self.roots], seq) - 1
+        if i < 0 or seq > self.roots[i]["last_seq"]:
+            raise KeyError(f"seq {seq} is not in a published block")
+        return self.roots[i], None
+
+    def proof(self, seq):
+        """Inclusion proof for ledger ``seq`` against its block root (open blocks: unsigned current root)."""
+        entry, leaves = self._block_for(seq)
+        if leaves is not None:
+            levels = build_levels(leaves)
+            entry = dict(entry, root=levels[-1][0].hex())
+        else:
+            with self._lock:
+                levels = self._levels.get(entry["block"])
+                if levels is not None:
+                    self._levels.move_to_end(entry["block"])
+            if levels is None:  # published before a restart or by another worker: read once
+                levels = build_levels([leaf_hash(r["hash"]) for r in self.ledger.iter_records(entry["first_seq"], entry["last_seq"] + 1)])
+                with self._lock:
+                    self._cache_levels(entry["block"], levels)
+        record = self.ledger.read(seq)
+        return {"seq": seq, "record_hash": record["hash"], "leaf_index": seq - entry["first_seq"],
+                "path": inclusion_proof(levels, seq - entry["first_seq"]), "block": entry}
+
+    def _cache_levels(self, block, levels):
+        """(lock held)"""
+        self._levels[block] = levels
+        self._levels.move_to_end(block)
+        while len(self._levels) > LEVELS_CACHE:
+            self._levels.popitem(last=False)
+
+    def verify_signature(self, entry):
+        return verify_root(self.public_key, entry)
+
+    def verify_blocks(self, entries, workers=None):
+        """Re-hash ``entries`` one block per process and link their boundaries."""
+        jobs = [(self.ledger.path, self.ledger.segment_records, e) for e in entries]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_verify_block, jobs))
+        prev_last = None
+        for entry, res in zip(entries, results):
+            if res["ok"] and not self.verify_signature(entry):
+                res.update(ok=False, error="bad root signature")
+            if res["ok"] and entry["first_seq"] == 0 and res["first_prev"] != GENESIS_HASH:
+                res.update(ok=False, error="genesis link broken")
+            if res["ok"] and prev_last is not None and res["first_prev"] != prev_last:
+                res.update(ok=False, error="block boundary link broken")
+            prev_last = res.get("last_hash")
+        return {"ok": all(r["ok"] for r in results), "blocks": len(results), "results": results}
+
+    def verify_day(self, day_start, workers=None):
+        """Parallel verification of every published block in the 24h from ``day_start`` (epoch seconds)."""
+        return self.verify_blocks(self.published(day_start, day_start + 86_400), workers)
+
+
+def attach_merkle(ledger, block_seconds=BLOCK_SECONDS):
+    """Resume after the last published block rather than re-hashing the whole ledger."""
+    cp = MerkleCheckpointer(ledger, block_seconds)
+    ledger.subscribe(cp.add, start=cp.roots[-1]["last_seq"] + 1 if cp.roots else 0)
+    return cp
+
+
+_merkle, _merkle_lock = None, threading.Lock()
+
+def get_merkle():
+    """Checkpointer attached to the process-wide ledger."""
+    global _merkle
+    with _merkle_lock:
+        if _merkle is None:
+            _merkle = attach_merkle(get_ledger())
+        return _merkle
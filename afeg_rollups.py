@@ -0,0 +1,153 @@
+"""AFEG time-bucketed rollups.
+
+Minute, hour and day buckets updated on every ledger commit, each holding the
+record count, KVU per category, value, VAT and intercepts, overall and per
+origin (Live / Surge / National Grid). A range query touches only the buckets
+inside the range, so "VAT by hour for last month" costs ~720 bucket reads
+however many events the month had.
+
+Buckets are keyed by their UTC start (epoch seconds); imported records land in
+the bucket of their original ``event_ts`` rather than their ingest time. Minute
+buckets are pruned after ``MINUTE_RETENTION`` seconds; hours and days are kept. Like the running
+aggregates, a snapshot is saved next to the ledger every ``save_every`` records
+and only the tail after it is replayed on start-up.
+"""
+import json, os, threading
+from bisect import bisect_left, insort
+from afeg_ledger import get_ledger
+
+GRANULARITIES = {"minute": 60, "hour": 3_600, "day": 86_400}
+MINUTE_RETENTION = 7 * 86_400
+METRICS = ("count", "kvu", "inf", "res", "mem", "value", "vat", "intercepts")
+ORIGIN_METRICS = ("count", "kvu", "vat", "intercepts")
+DEFAULT_ORIGIN = "Live"  # gateway and ACT 1 records written before origins were stored
+
+
+def record_origin(record):
+    return record.get("origin") or DEFAULT_ORIGIN
+
+def _new_bucket(start):
+    bucket = dict.fromkeys(METRICS, 0.0)
+    bucket.update(start=start, count=0, intercepts=0, origins={})
+    return bucket
+
+
+class Rollups:
+    def __init__(self, state=None, minute_retention=MINUTE_RETENTION):
+        state = state or {}
+        self.seq = state.get("seq", -1)
+        self.head = state.get("head")
+        self.minute_retention = minute_retention
+        self.buckets = {g: {b["start"]: b for b in state.get("buckets", {}).get(g, [])} for g in GRANULARITIES}
+        self._starts = {g: sorted(b) for g, b in self.buckets.items()}
+        self.path, self.save_every = None, 0
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        ts, origin = record.get("event_ts", record["ts"]), record_origin(record)
+        intercept = 1 if record.get("status") == "INTERCEPT" else 0
+        with self._lock:
+            self.seq, self.head = record["seq"], record["hash"]
+            for g, width in GRANULARITIES.items():
+                start = int(ts // width) * width
+                bucket = self.buckets[g].get(start)
+                if bucket is None:
+                    bucket = self.buckets[g][start] = _new_bucket(start)
+                    insort(self._starts[g], start)
+                    if g == "minute":
+                        self._prune(start - self.minute_retention)
+                bucket["count"] += 1; bucket["intercepts"] += intercept
+                for k in ("kvu", "inf", "res", "mem", "value", "vat"):
+                    bucket[k] += record.get(k, 0.0)
+                o = bucket["origins"].get(origin)
+                if o is None:
+                    o = bucket["origins"][origin] = {"count": 0, "kvu": 0.0, "vat": 0.0, "intercepts": 0}
+                o["count"] += 1; o["kvu"] += record.get("kvu", 0.0); o["vat"] += record.get("vat", 0.0)
+                o["intercepts"] += intercept
+            if self.path and self.save_every and (self.seq + 1) % self.save_every == 0:
+                self._save()
+
+    def _prune(self, before):
+        starts = self._starts["minute"]
+        cut = bisect_left(starts, before)
+        for start in starts[:cut]:
+            del self.buckets["minute"][start]
+        del starts[:cut]
+
+    # --- queries ---
+    def query(self, granularity="hour", since=None, until=None, origin=None):
+        """Buckets with ``since <= start < until`` in time order. With ``origin`` each bucket is
+        that origin's slice (count, kvu, vat, intercepts)."""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"unknown granularity {granularity!r}; expected one of {tuple(GRANULARITIES)}")
+        with self._lock:
+            starts = self._starts[granularity]
+            lo = 0 if since is None else bisect_left(starts, since)
+            hi = len(starts) if until is None else bisect_left(starts, until)
+            buckets = self.buckets[granularity]
+            if origin is None:
+                return [dict(buckets[s], origins={k: dict(v) for k, v in buckets[s]["origins"].items()}) for s in starts[lo:hi]]
+            empty = dict.fromkeys(ORIGIN_METRICS, 0)
+            return [dict(buckets[s]["origins"].get(origin, empty), start=s) for s in starts[lo:hi]]
+
+    def totals(self, granularity="day", since=None, until=None):
+        """Sum of the metrics over a range (plus intercepts per origin)."""
+        out, origins = dict.fromkeys(METRICS, 0.0), {}
+        for b in self.query(granularity, since, until):
+            for k in METRICS:
+                out[k] += b[k]
+            for name, o in b["origins"].items():
+                acc = origins.setdefault(name, dict.fromkeys(ORIGIN_METRICS, 0.0))
+                for k in ORIGIN_METRICS:
+                    acc[k] += o[k]
+        out["origins"] = origins
+        return out
+
+    # --- persistence ---
+    def _state(self):
+        return {"seq": self.seq, "head": self.head,
+                "buckets": {g: [self.buckets[g][s] for s in self._starts[g]] for g in GRANULARITIES}}
+
+    def _save(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"  # gateway workers replaying together save the same seq
+        with open(tmp, "w") as f:
+            json.dump(self._state(), f)
+        os.replace(tmp, self.path)
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+
+def attach_rollups(ledger, save_every=10_000):
+    """Resume from the saved snapshot if it still matches the chain, else rebuild from genesis."""
+    path = os.path.join(ledger.path, "rollups.json")
+    state = None
+    try:
+        with open(path) as f:
+            state = json.load(f)
+        if not (0 <= state["seq"] < len(ledger) and ledger.read(state["seq"])["hash"] == state["head"]):
+            state = None
+    except (OSError, ValueError, KeyError):
+        state = None
+    rollups = Rollups(state)
+    rollups.path, rollups.save_every = path, save_every
+    ledger.subscribe(rollups.add, start=rollups.seq + 1)
+    return rollups
+
+
+def by_origin(buckets, metric="vat"):
+    """Chart rows ``[{"start": ..., origin: value, ...}]`` from ``query`` output (or its JSON)."""
+    names = sorted({o for b in buckets for o in b["origins"]})
+    return [dict({"start": b["start"]}, **{o: b["origins"].get(o, {}).get(metric, 0) for o in names}) for b in buckets]
+
+
+_rollups, _rollups_lock = None, threading.Lock()
+
+def get_rollups():
+    """Rollups attached to the process-wide ledger."""
+    global _rollups
+    with _rollups_lock:
+        if _rollups is None:
+            _rollups = attach_rollups(get_ledger())
+        return _rollups
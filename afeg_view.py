@@ -0,0 +1,260 @@
+"""AFEG ledger view.
+
+Server-side windowed access to the ledger for the vault UIs: filter, sort and
+cursor-paginate without shipping the ledger to the browser. The sortable and
+filterable fields (ts, kvu, status, origin: about 28 bytes a row) live in a
+``ColumnarLedger`` fed by ``subscribe`` (row == seq), so a page costs NumPy work
+over the columns plus one ledger read per row served.
+
+* ``ts``     -- chain order. Scans back (or forward) from the cursor in blocks of
+  ``SCAN_BLOCK`` rows until the page is full, so an unfiltered page costs the
+  same at a thousand rows or ten million;
+* ``status`` -- one chain-order scan per status value, in name order;
+* ``kvu``    -- keyset on ``(kvu, seq)`` over a cached ``(kvu, seq)`` order: new
+  rows are merged into it, and a page binary-searches the cursor and scans from
+  there like ``ts``.
+
+Cursors are opaque tokens carrying the sort key and seq of the last row served.
+The columns are saved to ``view.npz`` next to the ledger once the rows added
+since the last save reach ``save_every`` or an eighth of the saved rows; on
+start-up they are loaded back and only the tail is replayed.
+"""
+import base64, json, logging, os, threading
+import numpy as np
+from afeg_columnar import ColumnarLedger
+from afeg_index import get_index
+from afeg_ledger import get_ledger
+from afeg_rollups import DEFAULT_ORIGIN
+
+SORTS, ORDERS = ("ts", "kvu", "status"), ("desc", "asc")
+MAX_LIMIT = 500
+SCAN_BLOCK = 65_536
+SEARCH_LIMIT = 10_000  # index hits considered for a ``q`` filter
+SAVE_EVERY = 100_000
+COLUMNS = {"float_fields": ("ts", "kvu"), "code_fields": ("status", "origin")}
+
+log = logging.getLogger("afeg.view")
+
+
+def encode_cursor(key, seq):
+    return base64.urlsafe_b64encode(json.dumps([key, seq]).encode()).decode()
+
+def decode_cursor(token):
+    try:
+        key, seq = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return key, int(seq)
+    except (ValueError, TypeError) as exc:
+        raise ValueError(f"invalid cursor: {token!r}") from exc
+
+
+class LedgerView:
+    def __init__(self, ledger, index=None):
+        self.ledger, self.index = ledger, index
+        self.columns = ColumnarLedger(**COLUMNS)
+        self.path, self.save_every = None, 0
+        self._saved = 0  # rows in the last saved snapshot
+        self._saving = False
+        self._order = (np.zeros(0, np.int64), np.zeros(0))  # (seqs by (kvu, seq), their kvu)
+        self._order_lock = threading.Lock()
+
+    def add(self, record):
+        """Ledger listener."""
+        n = self.columns.append(record) + 1
+        if (self.path and self.save_every and not self._saving
+                and n - self._saved >= max(self.save_every, self._saved // 8)):
+            self._saving = True
+            columns, dictionaries = self.columns.snapshot()
+            threading.Thread(target=self._save, args=(columns, dictionaries, record["hash"]),
+                             name="afeg-view-save", daemon=True).start()
+
+    # --- snapshots ---
+    def _save(self, columns, dictionaries, head):
+        n = len(columns["seq"])
+        try:
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                meta = {"seq": n - 1, "head": head, "dictionaries": dictionaries}
+                np.savez(f, meta=np.array(json.dumps(meta)), **columns)
+            os.replace(tmp, self.path)
+            self._saved = n
+        except (OSError, ValueError):
+            log.exception("ledger view snapshot at seq %d not saved", n - 1)
+        finally:
+            self._saving = False
+
+    def save(self):
+        """Save the columns now (blocking)."""
+        columns, dictionaries = self.columns.snapshot()
+        if len(columns["seq"]):
+            self._save(columns, dictionaries, self.ledger.read(len(columns["seq"]) - 1)["hash"])
+
+    def load(self, path):
+        """Restore the columns saved at ``path`` if they still match the chain. Returns the
+        number of rows restored (the seq to replay from)."""
+        try:
+            with np.load(path) as data:
+                meta = json.loads(str(data["meta"]))
+                if not (0 <= meta["seq"] < len(self.ledger) and self.ledger.read(meta["seq"])["hash"] == meta["head"]):
+                    return 0
+                self.columns.restore({name: data[name] for name in data.files if name != "meta"}, meta["dictionaries"])
+        except (OSError, ValueError, KeyError):
+            return 0
+        self._saved = len(self.columns)
+        return self._saved
+
+    # --- filters ---
+    def _codes(self, field, values):
+        d = self.columns.dictionaries[field]
+        codes = [d.code(v) for v in values]
+        if field == "origin" and DEFAULT_ORIGIN in values:
+            codes.append(d.code(""))  # records written before origins were stored
+        return [c for c in codes if c is not None]
+
+    def _filters(self, status, origin, min_kvu, max_kvu, since, until, q):
+        f = {"min_kvu": min_kvu, "max_kvu": max_kvu, "since": since, "until": until}
+        f["status"] = None if not status else self._codes("status", status)
+        f["origin"] = None if not origin else self._codes("origin", origin)
+        f["seqs"], f["truncated"] = None, False
+        if q and self.index is not None:
+            q = q.strip()
+            by_hash, by_query = self.index.hash_prefix(q, SEARCH_LIMIT + 1), self.index.query_substring(q, SEARCH_LIMIT + 1)
+            f["truncated"] = max(len(by_hash), len(by_query)) > SEARCH_LIMIT
+            f["seqs"] = np.array(sorted(set(by_hash) | set(by_query))[-SEARCH_LIMIT:], np.int64)
+        return f
+
+    def _mask(self, rows, f):
+        """Filter mask over ``rows``: a slice of seqs or an array of them."""
+        col = lambda name: self.columns.column(name)[rows]
+        seqs = np.arange(rows.start, rows.stop) if isinstance(rows, slice) else rows
+        m = np.ones(len(seqs), bool)
+        if f["status"] is not None:
+            m &= np.isin(col("status"), f["status"])
+        if f["origin"] is not None:
+            m &= np.isin(col("origin"), f["origin"])
+        if f["min_kvu"] is not None:
+            m &= col("kvu") >= f["min_kvu"]
+        if f["max_kvu"] is not None:
+            m &= col("kvu") <= f["max_kvu"]
+        if f["since"] is not None:
+            m &= col("ts") >= f["since"]
+        if f["until"] is not None:
+            m &= col("ts") < f["until"]
+        if f["seqs"] is not None:
+            m &= np.isin(seqs, f["seqs"])
+        return m
+
+    # --- scans ---
+    def _scan(self, n, f, limit, desc, after=None, extra=None):
+        """Rows in chain order (newest first if ``desc``) strictly after seq ``after``."""
+        out = []
+        if desc:
+            hi = n if after is None else min(after, n)
+            while hi > 0 and len(out) < limit:
+                lo = max(0, hi - SCAN_BLOCK)
+                m = self._mask(slice(lo, hi), f) if extra is None else self._mask(slice(lo, hi), f) & extra(lo, hi)
+                out.extend((np.flatnonzero(m)[::-1] + lo)[:limit - len(out)].tolist())
+                hi = lo
+        else:
+            lo = 0 if after is None else after + 1
+            while lo < n and len(out) < limit:
+                hi = min(n, lo + SCAN_BLOCK)
+                m = self._mask(slice(lo, hi), f) if extra is None else self._mask(slice(lo, hi), f) & extra(lo, hi)
+                out.extend((np.flatnonzero(m) + lo)[:limit - len(out)].tolist())
+                lo = hi
+        return out
+
+    def _by_status(self, n, f, limit, desc, cursor):
+        names = sorted(v for v in self.columns.dictionaries["status"].values)
+        if desc:
+            names.reverse()
+        if f["status"] is not None:
+            names = [s for s in names if self.columns.dictionaries["status"].code(s) in f["status"]]
+        out, after = [], None
+        if cursor is not None:
+            names = names[next((i for i, s in enumerate(names) if s == cursor[0]), len(names)):]
+            after = cursor[1]
+        status_col = self.columns.column("status")
+        for name in names:
+            code = self.columns.dictionaries["status"].code(name)
+            seqs = self._scan(n, f, limit - len(out), True, after, lambda lo, hi: status_col[lo:hi] == code)
+            out.extend(seqs)
+            after = None
+            if len(out) >= limit:
+                break
+        return out
+
+    def _kvu_order(self, n):
+        """Seqs sorted by ``(kvu, seq)`` and their kvu, covering at least the first ``n`` rows.
+        Rows added since the last call are sorted on their own and merged in, so a page
+        never re-sorts the ledger."""
+        with self._order_lock:
+            order, keys = self._order
+            if len(order) < n:
+                kvu = self.columns.column("kvu")
+                new = np.arange(len(order), n)
+                new = new[np.argsort(kvu[new], kind="stable")]
+                at = np.searchsorted(keys, kvu[new], side="right")  # ties: new rows have the higher seqs
+                self._order = order, keys = np.insert(order, at, new), np.insert(keys, at, kvu[new])
+            return order, keys
+
+    def _by_kvu(self, n, f, limit, desc, cursor):
+        order, keys = self._kvu_order(n)
+        if cursor is None:
+            pos = len(order) if desc else 0
+        else:
+            k, s = cursor
+            lo, hi = np.searchsorted(keys, k, side="left"), np.searchsorted(keys, k, side="right")
+            pos = lo + int(np.searchsorted(order[lo:hi], s, side="left" if desc else "right"))  # seqs ascend within a tie
+        out = []
+        while len(out) < limit and (pos > 0 if desc else pos < len(order)):
+            lo, hi = (max(0, pos - SCAN_BLOCK), pos) if desc else (pos, min(len(order), pos + SCAN_BLOCK))
+            rows = order[lo:hi][::-1] if desc else order[lo:hi]
+            rows = rows[rows < n]  # merged in by a concurrent page after ours started
+            out.extend(rows[self._mask(rows, f)][:limit - len(out)].tolist())
+            pos = lo if desc else hi
+        return out
+
+    # --- page ---
+    def page(self, sort="ts", order="desc", limit=50, cursor=None, status=None, origin=None,
+             min_kvu=None, max_kvu=None, since=None, until=None, q=None):
+        """One page of full records plus ``next_cursor`` (``None`` on the last page). ``truncated``
+        is true when ``q`` matched more than ``SEARCH_LIMIT`` records and only the newest were kept."""
+        if sort not in SORTS or order not in ORDERS:
+            raise ValueError(f"sort must be one of {SORTS} and order one of {ORDERS}")
+        limit = max(1, min(limit, MAX_LIMIT))
+        key = decode_cursor(cursor) if cursor else None
+        f = self._filters(status, origin, min_kvu, max_kvu, since, until, q)
+        n, desc = len(self.columns), order == "desc"
+        if sort == "ts":
+            seqs = self._scan(n, f, limit + 1, desc, None if key is None else key[1])
+        elif sort == "status":
+            seqs = self._by_status(n, f, limit + 1, desc, key)
+        else:
+            seqs = self._by_kvu(n, f, limit + 1, desc, key)
+        more, seqs = len(seqs) > limit, seqs[:limit]
+        rows = [self.ledger.read(s) for s in seqs]
+        next_cursor = None
+        if more and rows:
+            last = rows[-1]
+            next_cursor = encode_cursor({"ts": last["ts"], "kvu": last.get("kvu", 0.0), "status": last.get("status", "")}[sort], last["seq"])
+        return {"rows": rows, "next_cursor": next_cursor, "sort": sort, "order": order, "limit": limit, "records": n,
+                "truncated": f["truncated"]}
+
+
+def attach_view(ledger, index=None, save_every=SAVE_EVERY):
+    """Load the saved columns if they still match the chain and replay the tail, else build from genesis."""
+    view = LedgerView(ledger, index)
+    view.path, view.save_every = os.path.join(ledger.path, "view.npz"), save_every
+    ledger.subscribe(view.add, start=view.load(view.path))
+    return view
+
+
+_view, _view_lock = None, threading.Lock()
+
+def get_ledger_view():
+    """View over the process-wide ledger (``q`` filters go through the vault index)."""
+    global _view
+    with _view_lock:
+        if _view is None:
+            _view = attach_view(get_ledger(), get_index())
+        return _view
@@ -0,0 +1,53 @@
+"""Benchmark: durable ledger commits/sec under each fsync policy.
+
+    python bench_commit.py [--commits 4000] [--threads 1 16 64] [--policies always batch interval none]
+
+Each run starts from an empty ledger in a temporary directory and has
+``threads`` producers commit gateway-sized entries through a ``GroupCommitter``.
+Reports throughput, commit latency percentiles, mean batch size and fsync count.
+"""
+import argparse, json, shutil, tempfile, threading, time
+from afeg_commit import FSYNC_POLICIES, MAX_BATCH, MAX_WAIT, GroupCommitter
+from afeg_kvu import build_entry
+from afeg_ledger import KVULedger
+
+def run(policy, commits, threads, max_batch, max_wait):
+    path = tempfile.mkdtemp(prefix="afeg-bench-")
+    ledger = KVULedger(path)
+    committer = GroupCommitter(ledger, policy, max_batch, max_wait)
+    per_thread = commits // threads
+    latencies = [[] for _ in range(threads)]
+
+    def producer(n):
+        out = latencies[n]
+        for i in range(per_thread):
+            t0 = time.perf_counter()
+            committer.commit(build_entry(f"bench query {n}-{i}", "COMPLIANT", "Safe", "Delivered", 320.0, 1000.0, 200.0))
+            out.append(time.perf_counter() - t0)
+
+    workers = [threading.Thread(target=producer, args=(n,)) for n in range(threads)]
+    t0 = time.perf_counter()
+    for w in workers: w.start()
+    for w in workers: w.join()
+    elapsed = time.perf_counter() - t0
+    stats = committer.stats()
+    committer.close(); ledger.close()
+    shutil.rmtree(path)
+    lat = sorted(x for l in latencies for x in l)
+    pct = lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))] * 1e3, 3)
+    return {"policy": policy, "threads": threads, "commits": len(lat), "commits_per_s": round(len(lat) / elapsed),
+            "p50_ms": pct(0.50), "p99_ms": pct(0.99), "avg_batch": stats["avg_batch"], "fsyncs": stats["fsyncs"]}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--commits", type=int, default=4000)
+    ap.add_argument("--threads", type=int, nargs="+", default=[1, 16, 64])
+    ap.add_argument("--policies", nargs="+", default=list(FSYNC_POLICIES), choices=FSYNC_POLICIES)
+    ap.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    ap.add_argument("--max-wait", type=float, default=MAX_WAIT)
+    args = ap.parse_args()
+    rows = [run(p, args.commits, t, args.max_batch, args.max_wait) for p in args.policies for t in args.threads]
+    print(json.dumps(rows, indent=2))
+
+if __name__ == "__main__":
+    main()
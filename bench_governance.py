@@ -0,0 +1,60 @@
+"""Benchmark: compiled governance automaton vs the original ``any(x in text.lower() ...)`` loops.
+
+    python bench_governance.py [--texts 2000] [--sizes 10 1000 10000]
+
+Each query is scanned against one rule set of N synthetic terms (plus the real
+defaults). Most queries are clean, which is the worst case for the loop since
+it must try every term. ``prefilter_us_per_text`` times the automaton with its
+regex prefilter forced on, to check ``PREFILTER_MAX_TERMS`` against the
+crossover (about 90 terms on a single-core box: ~2 us vs ~11 us at 14 terms,
+~300 us vs ~15 us at 1k, ~3 ms vs ~17 us at 10k).
+"""
+import argparse, json, random, re, string, time
+from afeg_governance import Automaton, DEFAULT_RULES
+
+SAMPLE_QUERIES = ["What is the national AI inference load today", "How do I audit AI reasoning costs",
+                  "Explain the VAT treatment of memory operations", "List the regions with the highest compute",
+                  "Summarise the compliance posture of the gateway for the treasury"]
+
+def make_terms(n, rng):
+    terms = set(DEFAULT_RULES["gateway"])
+    while len(terms) < n:
+        terms.add("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 10))))
+    return sorted(terms)[:n]
+
+def make_texts(n, rng):
+    return [f"{rng.choice(SAMPLE_QUERIES)} #{rng.randint(0, 10**6)}" for _ in range(n)]
+
+def bench(fn, texts):
+    t0 = time.perf_counter()
+    hits = sum(1 for t in texts if fn(t))
+    return time.perf_counter() - t0, hits
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--texts", type=int, default=2000)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10, 48, 96, 1000, 10000])
+    args = ap.parse_args()
+    rng = random.Random(7)
+    texts = make_texts(args.texts, rng)
+    rows = []
+    for n in args.sizes:
+        terms = make_terms(n, rng)
+        t0 = time.perf_counter()
+        automaton = Automaton({"gateway": terms})
+        compile_s = time.perf_counter() - t0
+        loop_s, loop_hits = bench(lambda t: any(x in t.lower() for x in terms), texts)
+        ac_s, ac_hits = bench(lambda t: automaton.first(t) is not None, texts)
+        prefiltered = Automaton({"gateway": terms})
+        prefiltered._any = re.compile("|".join(map(re.escape, prefiltered.rules["gateway"])))
+        pf_s, pf_hits = bench(lambda t: prefiltered.first(t) is not None, texts)
+        assert loop_hits == ac_hits == pf_hits
+        rows.append({"terms": n, "texts": len(texts), "compile_ms": round(compile_s * 1e3, 2),
+                     "loop_us_per_text": round(loop_s / len(texts) * 1e6, 2),
+                     "automaton_us_per_text": round(ac_s / len(texts) * 1e6, 2),
+                     "prefilter_us_per_text": round(pf_s / len(texts) * 1e6, 2),
+                     "speedup": round(loop_s / ac_s, 2)})
+    print(json.dumps(rows, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import pytest
+from afeg_ledger import KVULedger
+
+
+def entry(i):
+    return {"query": f"q{i}", "status": "COMPLIANT", "kvu": float(i)}
+
+
+@pytest.fixture
+def make_ledger(tmp_path):
+    """``make_ledger(name="ledger", **kwargs)``: a ``KVULedger`` under ``tmp_path``, closed after the test."""
+    opened = []
+
+    def make(name="ledger", **kwargs):
+        opened.append(KVULedger(str(tmp_path / name), **kwargs))
+        return opened[-1]
+    yield make
+    for ledger in opened:
+        ledger.close()
+
+
+@pytest.fixture
+def ledger(make_ledger):
+    return make_ledger()
+
+
+@pytest.fixture
+def gateway(tmp_path, make_ledger, monkeypatch):
+    """TestClient for the gateway app over a fresh ledger, with every process-wide view reset."""
+    from fastapi.testclient import TestClient
+    import afeg_aggregates, afeg_commit, afeg_feed, afeg_index, afeg_ledger, afeg_merkle, afeg_rollups, afeg_view
+    from afeg_gateway import app
+    monkeypatch.setenv("AFEG_SIGNING_KEY_FILE", str(tmp_path / "keys" / "signing-key.pem"))
+    monkeypatch.setattr(afeg_ledger, "_ledger", make_ledger())
+    for module, name in ((afeg_commit, "_committer"), (afeg_aggregates, "_aggregates"), (afeg_index, "_index"),
+                         (afeg_merkle, "_merkle"), (afeg_rollups, "_rollups"), (afeg_view, "_view"), (afeg_feed, "_feed")):
+        monkeypatch.setattr(module, name, None)
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,39 @@
+import json, multiprocessing, os
+from afeg_aggregates import attach_aggregates
+from afeg_ledger import KVULedger
+from afeg_rollups import attach_rollups
+
+
+def entry(i):
+    return {"query": f"q{i}", "status": ("COMPLIANT", "INTERCEPT")[i % 3 == 0], "origin": ("Live", "Surge")[i % 2],
+            "kvu": float(i % 10), "value": i * 0.5, "vat": i * 0.1, "inf": 1.0, "res": 2.0, "mem": 3.0}
+
+
+def replay(path):
+    ledger = KVULedger(path)
+    attach_aggregates(ledger, save_every=10)
+    attach_rollups(ledger, save_every=10)
+    ledger.close()
+
+
+def test_workers_replaying_together_save_without_racing(ledger):
+    """Gateway workers started together replay the same tail and reach every save point at once."""
+    ledger.append_many([entry(i) for i in range(3000)], [1_700_000_000.0 + i for i in range(3000)])
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=replay, args=(ledger.path,)) for _ in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join(60)
+    assert [w.exitcode for w in workers] == [0] * 4
+    with open(os.path.join(ledger.path, "aggregates.json")) as f:
+        assert json.load(f)["count"] == 3000
+    assert [n for n in os.listdir(ledger.path) if n.endswith(".tmp")] == []
+
+
+def test_snapshot_resumes_with_the_same_totals(ledger):
+    ledger.append_many([entry(i) for i in range(95)])
+    full = attach_aggregates(ledger, save_every=10).snapshot()
+    with open(os.path.join(ledger.path, "aggregates.json")) as f:
+        assert json.load(f)["seq"] == 89
+    assert attach_aggregates(ledger, save_every=10).snapshot() == full
@@ -0,0 +1,63 @@
+import afeg_cache
+from afeg_cache import ClassificationCache
+from afeg_kvu import classify
+
+
+class Counter:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, q):
+        self.calls.append(q)
+        return {"q": q}
+
+
+def test_lru_evicts_least_recently_used():
+    cache, compute = ClassificationCache(maxsize=2), Counter()
+    cache.lookup("a", compute); cache.lookup("b", compute)
+    cache.lookup("a", compute)  # "b" is now the oldest
+    cache.lookup("c", compute)
+    cache.lookup("a", compute)
+    assert compute.calls == ["a", "b", "c"]
+    cache.lookup("b", compute)
+    assert compute.calls == ["a", "b", "c", "b"]
+    assert cache.stats()["evictions"] == 2 and cache.stats()["size"] == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1_000.0]
+    monkeypatch.setattr(afeg_cache.time, "monotonic", lambda: now[0])
+    cache, compute = ClassificationCache(ttl=10.0), Counter()
+    cache.lookup("a", compute)
+    now[0] += 9.9
+    cache.lookup("a", compute)
+    now[0] += 0.2
+    cache.lookup("a", compute)
+    assert compute.calls == ["a", "a"]
+    assert cache.stats()["expirations"] == 1
+
+
+def test_keys_separate_mode_and_multiplier():
+    cache, compute = ClassificationCache(), Counter()
+    cache.lookup("Why  TAX", compute)
+    cache.lookup("why tax", compute)  # same normalised text
+    cache.lookup("why tax", compute, mode="demo")
+    cache.lookup("why tax", compute, multiplier=2.5)
+    cache.lookup("why tax", compute, mode="demo", multiplier=2.5)
+    cache.lookup("why tax", compute, mode="demo", multiplier=2.5)
+    assert len(compute.calls) == 4 and cache.stats()["hits"] == 2
+
+
+def test_generation_change_drops_entries():
+    cache, compute = ClassificationCache(), Counter()
+    cache.lookup("a", compute, generation=1)
+    cache.lookup("a", compute, generation=2)
+    assert len(compute.calls) == 2 and cache.stats()["invalidations"] == 1
+
+
+def test_classify_scales_by_multiplier():
+    live = classify("why is the sky blue", "cache-test")
+    demo = classify("why is the sky blue", "cache-test-demo", 2.5)
+    assert (live["inf"], live["res"], live["mem"]) == (320.0, 1000.0, 200.0)
+    assert (demo["inf"], demo["res"], demo["mem"]) == (800.0, 2500.0, 500.0)
+    assert classify("why is the sky blue", "cache-test") is live
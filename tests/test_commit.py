@@ -0,0 +1,60 @@
+import time
+import pytest
+from afeg_commit import FSYNC_POLICIES, GroupCommitter
+from afeg_ledger import EntryError
+from conftest import entry
+
+
+@pytest.mark.parametrize("policy", FSYNC_POLICIES)
+def test_policies_commit_in_order(ledger, policy):
+    committer = GroupCommitter(ledger, policy, interval=0.05)
+    records = committer.commit_many([entry(i) for i in range(50)])
+    records.append(committer.commit(entry(50)))
+    committer.close()
+    assert [r["seq"] for r in records] == list(range(51))
+    assert [r["query"] for r in ledger.iter_records()] == [f"q{i}" for i in range(51)]
+    assert ledger.verify(full=True)["ok"]
+    stats = committer.stats()
+    assert stats["commits"] == 51
+    if policy == "always":
+        assert stats["fsyncs"] == stats["batches"] == 2  # commit_many is one all-or-nothing commit
+    if policy == "none":
+        assert stats["fsyncs"] == 0
+
+
+def test_interval_fsyncs_an_idle_ledger(ledger):
+    committer = GroupCommitter(ledger, "interval", interval=0.05)
+    committer.commit(entry(0))  # first batch lands inside the window: not fsynced yet
+    fsyncs = committer.stats()["fsyncs"]
+    deadline = time.monotonic() + 2
+    while committer.stats()["fsyncs"] == fsyncs and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert committer.stats()["fsyncs"] == fsyncs + 1
+    committer.close()
+
+
+def test_bad_entry_fails_alone(ledger):
+    committer = GroupCommitter(ledger, "batch", max_wait=0.05)
+    pending = [committer.submit(entry(0)), committer.submit({"query": {1, 2}}), committer.submit(entry(2))]
+    assert pending[0].result()["query"] == "q0"
+    with pytest.raises(EntryError):
+        pending[1].result()
+    assert pending[2].result()["query"] == "q2"
+    committer.close()
+    assert len(ledger) == 2
+
+
+def test_listener_error_does_not_fail_the_commit(ledger, caplog):
+    seen = []
+
+    def listener(record):
+        if record["query"] == "q1":
+            raise ValueError("listener failed")
+        seen.append(record["seq"])
+    ledger.subscribe(listener)
+    committer = GroupCommitter(ledger, "batch")
+    records = committer.commit_many([entry(0), entry(1), entry(2)])
+    committer.close()
+    assert [r["seq"] for r in records] == [0, 1, 2] and seen == [0, 2]
+    assert [r["query"] for r in ledger.iter_records()] == ["q0", "q1", "q2"]
+    assert "failed on seq 1" in caplog.text
@@ -0,0 +1,48 @@
+import hashlib, io, json, zipfile
+from afeg_export import COMPLIANT_MEMBER, INTERCEPTED_MEMBER, iter_export_zip
+
+
+def fill(ledger, n=50):
+    entries = [{"query": f"q{i}", "status": "INTERCEPT" if i % 4 == 0 else "COMPLIANT", "kvu": float(i)} for i in range(n)]
+    return ledger.append_many(entries, [1_000.0 + i for i in range(n)])
+
+def export(ledger, **kwargs):
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(iter_export_zip(ledger, **kwargs))))
+    members = {name: archive.read(name) for name in (COMPLIANT_MEMBER, INTERCEPTED_MEMBER)}
+    return json.loads(archive.read("MANIFEST.json")), members
+
+def seqs(data):
+    return [json.loads(line)["seq"] for line in data.splitlines()]
+
+
+def test_manifest_describes_the_members(ledger):
+    records = fill(ledger)
+    manifest, members = export(ledger, chunk_records=7)
+    assert seqs(members[COMPLIANT_MEMBER]) == [r["seq"] for r in records if r["status"] == "COMPLIANT"]
+    assert seqs(members[INTERCEPTED_MEMBER]) == [r["seq"] for r in records if r["status"] == "INTERCEPT"]
+    for name, data in members.items():
+        assert manifest["members"][name] == {"records": len(seqs(data)), "sha256": hashlib.sha256(data).hexdigest()}
+    assert manifest["record_count"] == 50
+    assert (manifest["first_seq"], manifest["last_seq"]) == (0, 49)
+    assert (manifest["first_hash"], manifest["last_hash"]) == (records[0]["hash"], records[-1]["hash"])
+    assert json.loads(members[COMPLIANT_MEMBER].splitlines()[0]) == records[1]
+
+
+def test_time_range_filter(ledger):
+    fill(ledger)
+    manifest, members = export(ledger, since=1_010.0, until=1_020.0)
+    assert seqs(members[COMPLIANT_MEMBER]) == [10, 11, 13, 14, 15, 17, 18, 19]
+    assert seqs(members[INTERCEPTED_MEMBER]) == [12, 16]
+    assert (manifest["since"], manifest["until"], manifest["record_count"]) == (1_010.0, 1_020.0, 10)
+    assert (manifest["first_seq"], manifest["last_seq"]) == (10, 19)
+    empty, members = export(ledger, since=5_000.0)
+    assert empty["record_count"] == 0 and empty["first_hash"] is None and members[COMPLIANT_MEMBER] == b""
+
+
+def test_range_is_read_once(ledger, monkeypatch):
+    fill(ledger)
+    calls = []
+    read = ledger.iter_records
+    monkeypatch.setattr(ledger, "iter_records", lambda *a: calls.append(a) or read(*a))
+    export(ledger)
+    assert calls == [(0, 50)]
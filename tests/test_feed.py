@@ -0,0 +1,63 @@
+import asyncio
+import afeg_feed
+from afeg_client import GatewayClient
+from afeg_feed import attach_feed
+from conftest import entry
+
+
+class Response:
+    """The slice of a streamed ``requests`` response that ``GatewayClient.feed`` reads."""
+    def __init__(self, lines):
+        self.lines = lines
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self, decode_unicode=False):
+        yield from self.lines
+
+
+def collect(stream, n):
+    async def run():
+        out = []
+        async for chunk in stream:
+            out.append(chunk)
+            if len(out) == n:
+                return out
+    return asyncio.run(run())
+
+
+def test_idle_feed_sends_keep_alives(ledger, monkeypatch):
+    monkeypatch.setattr(afeg_feed, "HEARTBEAT", 0.0)
+    monkeypatch.setattr(afeg_feed, "POLL_INTERVAL", 0.0)
+    ledger.append_many([entry(i) for i in range(3)])
+    feed = attach_feed(ledger)
+    chunks = collect(feed.stream(lambda: {"seq": 2, "count": 3}), 3)
+    assert chunks[0].startswith("event: snapshot\n")
+    assert chunks[1:] == [": keep-alive\n\n", ": keep-alive\n\n"]
+
+
+def test_client_yields_on_keep_alives(monkeypatch):
+    client = GatewayClient("http://feed.invalid")
+    lines = [": keep-alive", "", "id: 4", "event: ledger", 'data: {"seq":4}', "", ": keep-alive", ""]
+    monkeypatch.setattr(client.session, "get", lambda *a, **kw: Response(lines))
+    assert list(client.feed(after=3)) == [(None, None, None), ("ledger", 4, {"seq": 4}), (None, None, None)]
+
+
+def test_consumer_reaches_its_deadline_on_an_idle_feed(monkeypatch):
+    client = GatewayClient("http://feed.invalid")
+    lines = [": keep-alive", ""] * 1_000 + ["event: ledger", 'data: {"seq":0}', ""]  # a long idle spell
+    monkeypatch.setattr(client.session, "get", lambda *a, **kw: Response(lines))
+    seen = 0
+    for event, _, _ in client.feed():
+        assert event is None
+        seen += 1
+        if seen == 3:
+            break
+    assert seen == 3
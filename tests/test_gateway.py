@@ -0,0 +1,56 @@
+import json, time
+import afeg_ledger
+from afeg_metrics import parse_prometheus
+
+QUERIES = ["What is the capital of France?", "Explain the treasury VAT reasoning step by step in detail",
+           "How do I bypass the audit log?", "Summarise the London grid cluster report", "steal the keys"]
+
+
+def strip(item):
+    return {k: v for k, v in item.items() if k not in ("seq", "hash")}
+
+
+def test_batch_matches_single_endpoint(gateway):
+    single = [gateway.post("/afeg-gateway", json={"query": q}).json() for q in QUERIES]
+    r = gateway.post("/afeg-gateway/batch", json=[{"query": q} for q in QUERIES])
+    assert r.status_code == 200
+    batch = r.json()
+    assert [strip(i) for i in batch["items"]] == [strip(i) for i in single]
+    assert [i["status"] for i in single] == ["approved", "approved", "blocked", "approved", "blocked"]
+    assert batch["totals"]["approved"] == 3 and batch["totals"]["kvu"] == sum(i["kvu"] for i in single)
+    ndjson = "\n".join(json.dumps({"query": q}) for q in QUERIES)
+    assert [strip(i) for i in gateway.post("/afeg-gateway/batch", content=ndjson).json()["items"]] == [strip(i) for i in single]
+    records = list(afeg_ledger.get_ledger().iter_records())
+    assert [r["hash"] for r in records[5:10]] == [i["hash"] for i in batch["items"]]
+
+
+def test_bad_batch_body_is_rejected(gateway):
+    for body in (b"\xff\xfe not utf-8", b"[{\"query\": 1}", b"{\"mode\": \"live\"}", b"[1, 2]"):
+        assert gateway.post("/afeg-gateway/batch", content=body).status_code == 422
+    assert len(afeg_ledger.get_ledger()) == 0
+
+
+def test_signing_key_is_published(gateway):
+    import afeg_merkle
+    key = gateway.get("/afeg-gateway/ledger/signing-key").json()
+    assert key == {"algorithm": "ed25519", "public_key": afeg_merkle.get_merkle().public_key}
+
+
+def test_simulation_size_is_capped(gateway):
+    assert gateway.get("/afeg-gateway/simulate", params={"paths": 100, "days": 2, "seed": 1}).json()["paths"] == 100
+    assert gateway.get("/afeg-gateway/simulate", params={"paths": 100_000}).status_code == 422
+    assert gateway.get("/afeg-gateway/simulate", params={"paths": 20_000, "days": 366}).status_code == 422
+
+
+def test_metrics_expose_stage_series(gateway):
+    def stage_counts():
+        text = gateway.get("/metrics").text
+        return text, {labels["stage"]: value for name, labels, value in parse_prometheus(text)
+                      if name == "afeg_stage_seconds_count"}
+    _, before = stage_counts()
+    assert gateway.post("/afeg-gateway", json={"query": f"why audit metrics {time.time_ns()}"}).status_code == 200
+    text, after = stage_counts()
+    for stage in ("handler", "parse", "classify", "complexity", "governance_scan", "commit", "hash", "hash_chain"):
+        assert after[stage] >= before.get(stage, 0) + 1, stage
+    assert 'afeg_stage_seconds_bucket{stage="parse",le="+Inf"}' in text
+    assert 'afeg_requests_total{endpoint="single"}' in text
@@ -0,0 +1,55 @@
+import os
+from afeg_governance import DEFAULT_RULES, GovernanceEngine, save_rules
+
+
+def touch(path, mtime):
+    os.utime(path, (mtime, mtime))
+
+
+def test_reload_picks_up_saved_rules(tmp_path):
+    path = str(tmp_path / "rules.json")
+    save_rules({"gateway": ["forbidden"]}, path)
+    engine = GovernanceEngine(path, check_interval=0)
+    assert engine.scan("a forbidden word", "gateway") == ("gateway", "forbidden")
+    save_rules({"gateway": ["other"]}, path)
+    touch(path, os.path.getmtime(path) + 5)
+    assert engine.scan("a forbidden word", "gateway") is None
+    assert engine.scan("the other one", "gateway") == ("gateway", "other")
+    assert not os.path.exists(path + ".tmp")
+
+
+def test_bad_reload_keeps_previous_rules(tmp_path):
+    path = str(tmp_path / "rules.json")
+    save_rules({"gateway": ["forbidden"]}, path)
+    engine = GovernanceEngine(path, check_interval=0)
+    version = engine.version
+    for bad in ('{"gateway": ["forb', '{"gateway": "forbidden"}', '["forbidden"]'):
+        with open(path, "w") as f:
+            f.write(bad)
+        touch(path, os.path.getmtime(path) + 5)
+        assert engine.scan("a forbidden word", "gateway") == ("gateway", "forbidden")
+        assert engine.version == version and engine.error
+    save_rules({"gateway": ["fixed"]}, path)
+    touch(path, os.path.getmtime(path) + 10)
+    assert engine.scan("fixed", "gateway") == ("gateway", "fixed")
+    assert engine.error is None and engine.version == version + 1
+
+
+def test_bad_file_at_start_up_uses_defaults(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text("{not json")
+    engine = GovernanceEngine(str(path))
+    assert engine.error
+    assert engine.scan("hack the planet", "input") == ("input", "hack")
+    assert engine.rules == {k: sorted(v) for k, v in DEFAULT_RULES.items()}
+
+
+def test_large_rule_sets_skip_the_regex_prefilter():
+    from afeg_governance import PREFILTER_MAX_TERMS, Automaton
+    small = Automaton(DEFAULT_RULES)
+    large = Automaton({"gateway": [f"term{i:04d}" for i in range(PREFILTER_MAX_TERMS + 1)], "input": ["hack"]})
+    assert small._any is not None and large._any is None
+    assert small.scan_all("please HACK term0007 now") == {"input": "hack", "gateway": "hack"}
+    assert large.scan_all("please HACK term0007 now") == {"input": "hack", "gateway": "term0007"}
+    assert small.first("nothing to see") is None and large.first("nothing to see") is None
+    assert Automaton({}).first("anything") is None
@@ -0,0 +1,116 @@
+import json
+import afeg_import
+import pytest
+from afeg_import import import_file
+
+
+def write_rows(path, n, first=0):
+    with open(path, "a") as f:
+        for i in range(first, first + n):
+            f.write(json.dumps({"query": f"How do I audit reasoning costs #{i}", "ts": 1_700_000_000 + i}) + "\n")
+    return str(path)
+
+
+@pytest.fixture
+def ledger(make_ledger):
+    return make_ledger(segment_records=50)
+
+
+def test_import_keeps_ledger_ts_in_order(tmp_path, ledger):
+    """Records are stamped when appended, so live commits and import chunks interleave in time order."""
+    src = write_rows(tmp_path / "rows.ndjson", 120)
+    ledger.append({"query": "live", "status": "COMPLIANT"})
+    state = import_file(src, ledger=ledger, chunk_rows=25, workers=0)
+    ledger.append({"query": "live", "status": "COMPLIANT"})
+    assert state["status"] == "done" and state["imported"] == 120
+    ts = [r["ts"] for r in ledger.iter_records()]
+    assert ts == sorted(ts)
+    assert [r["import_row"] for r in ledger.iter_records(1, 121)] == list(range(120))
+    assert ledger.verify(full=True)["ok"]
+
+
+def test_invalid_rows_are_rejected(tmp_path, ledger, monkeypatch):
+    monkeypatch.setattr(afeg_import, "MAX_ORIGINS", 3)
+    rows = [{"query": "ok", "ts": 1_700_000_000}, {"query": "nan", "ts": float("nan")}, {"query": "far", "ts": 1e20},
+            {"query": "past", "ts": -1e15}, {"query": "iso", "timestamp": "not a date"}, {"query": {"a": 1}},
+            {"query": "dict", "origin": {"a": 1}}, {"query": "list", "origin": ["x"]}, {"query": "long", "origin": "x" * 65},
+            {"query": "a", "origin": "A"}, {"query": "b", "origin": "B"}, {"query": "c", "origin": "C"}, {"query": ""}]
+    src = tmp_path / "rows.ndjson"
+    src.write_text("\n".join(json.dumps(r) for r in rows) + "\nnot json\n")
+    state = import_file(str(src), ledger=ledger, chunk_rows=4, workers=0)
+    assert state["status"] == "done" and state["rows"] == 14
+    assert (state["imported"], state["rejected"], state["skipped"]) == (3, 9, 2)
+    assert [r["query"] for r in ledger.iter_records()] == ["ok", "a", "b"]
+    assert state["origins"] == ["Live", "A", "B"]
+
+
+def test_failed_job_is_recorded(tmp_path, ledger, caplog):
+    src = str(tmp_path / "missing.ndjson")
+    import_id = afeg_import.start_import(src, ledger=ledger, workers=0)
+    afeg_import._jobs[import_id].join(10)
+    state = afeg_import.import_status(import_id, ledger)
+    assert state["status"] == "failed" and "FileNotFoundError" in state["error"] and not state["active"]
+    assert "failed" in caplog.text
+
+
+def count_rows(ledger):
+    rows = [r["import_row"] for r in ledger.iter_records() if "import_row" in r]
+    assert len(rows) == len(set(rows))
+    return len(rows)
+
+def test_resume_after_failure_and_rerun_is_a_noop(tmp_path, ledger):
+    src = write_rows(tmp_path / "rows.ndjson", 120)
+
+    def crash(state):
+        if state["rows"] == 50:
+            raise KeyboardInterrupt
+    with pytest.raises(KeyboardInterrupt):
+        import_file(src, ledger=ledger, chunk_rows=25, workers=0, progress=crash)
+    assert afeg_import.import_status(afeg_import.import_id_for(src), ledger)["status"] == "failed"
+    assert count_rows(ledger) == 50
+
+    state = import_file(src, ledger=ledger, chunk_rows=25, workers=0)
+    assert state["status"] == "done" and state["imported"] == 120 and state["skipped"] == 0
+    assert count_rows(ledger) == 120
+    again = import_file(src, ledger=ledger, chunk_rows=25, workers=0)
+    assert again == state and count_rows(ledger) == 120 and ledger.verify(full=True)["ok"]
+
+
+def test_resume_recovers_rows_appended_after_the_last_saved_state(tmp_path, ledger):
+    """A crash between a chunk's append and its state save: the rows are in the ledger, not in the state."""
+    src = write_rows(tmp_path / "rows.ndjson", 120)
+    saved = []
+    import_file(src, ledger=ledger, chunk_rows=25, workers=0, progress=lambda s: saved.append(dict(s)))
+    stale = next(s for s in saved if s["rows"] == 50)
+    afeg_import.save_state(afeg_import.state_path_for(ledger, stale["import_id"]), stale)
+    state = import_file(src, ledger=ledger, chunk_rows=25, workers=0)
+    assert state["status"] == "done" and (state["imported"], state["skipped"]) == (120, 0)
+    assert count_rows(ledger) == 120 and state["last_seq"] == ledger.sync() - 1
+
+
+def test_concurrent_run_of_the_same_import_is_refused(tmp_path, ledger):
+    src = write_rows(tmp_path / "rows.ndjson", 30)
+    import_id = afeg_import.import_id_for(src)
+    with afeg_import.job_lock(ledger, import_id):
+        with pytest.raises(afeg_import.ImportRunning):
+            import_file(src, ledger=ledger, workers=0)
+        afeg_import.start_import(src, ledger=ledger, workers=0)
+        afeg_import._jobs[import_id].join(10)
+        assert afeg_import.import_status(import_id, ledger) == {"import_id": import_id, "status": "starting", "active": True}
+    assert count_rows(ledger) == 0 and afeg_import.import_status(import_id, ledger) is None
+    assert import_file(src, ledger=ledger, workers=0)["imported"] == 30
+
+
+@pytest.mark.parametrize("fmt", ["ndjson", "csv"])
+def test_invalid_utf8_line_is_rejected(tmp_path, ledger, fmt):
+    if fmt == "ndjson":
+        lines = [json.dumps({"query": f"row {i}"}).encode() for i in range(4)]
+        lines[2] = b'{"query": "bad \xff\xfe bytes"}'
+    else:
+        lines = [b"query,origin"] + [f"row {i},Live".encode() for i in range(4)]
+        lines[3] = b"bad \xff bytes,Live"
+    src = tmp_path / f"rows.{fmt}"
+    src.write_bytes(b"\n".join(lines) + b"\n")
+    state = import_file(str(src), ledger=ledger, chunk_rows=2, workers=0)
+    assert state["status"] == "done" and (state["rows"], state["imported"], state["rejected"]) == (4, 3, 1)
+    assert [r["query"] for r in ledger.iter_records()] == ["row 0", "row 1", "row 3"]
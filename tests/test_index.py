@@ -0,0 +1,66 @@
+import os, time
+from afeg_index import attach_index
+
+WORDS = ["audit", "treasury", "grid", "london", "reasoning", "vat", "cluster"]
+
+
+def entry(i):
+    return {"query": f"{WORDS[i % 7]} {WORDS[i * 3 % 7]} report {i}", "status": "COMPLIANT", "kvu": float(i)}
+
+
+def expected_substring(ledger, term):
+    return [r["seq"] for r in reversed(list(ledger.iter_records())) if term in r["query"].lower()]
+
+def expected_prefix(ledger, prefix):
+    return [r["seq"] for r in reversed(list(ledger.iter_records())) if r["hash"].startswith(prefix)]
+
+def check(index, ledger):
+    for term in ("treasury", "GRID lon", "report 1", "rt 4", "zzz"):
+        assert index.query_substring(term, limit=1000) == expected_substring(ledger, term.lower())
+    for record in ledger.iter_records(0, 20):
+        for n in (1, 3, 4, 9, 16, 20):
+            prefix = record["hash"][:n]
+            assert index.hash_prefix(prefix, limit=1000) == expected_prefix(ledger, prefix)
+
+
+def test_snapshot_is_mapped_and_tail_replayed(ledger):
+    ledger.append_many([entry(i) for i in range(150)])
+    index = attach_index(ledger, save_every=0)
+    check(index, ledger)
+    index.save()
+    assert index.base is not None and len(index.base) == 150
+    ledger.append_many([entry(i) for i in range(150, 200)])
+    check(index, ledger)  # snapshot + delta
+
+    reopened = attach_index(ledger, save_every=0)
+    assert reopened.base.seq == 149 and reopened._deltas[-1].count == 50
+    check(reopened, ledger)
+    reopened.save()
+    assert len(reopened.base) == 200
+    check(reopened, ledger)
+    assert [n for n in os.listdir(ledger.path) if n.startswith("index-")] == [os.path.basename(reopened.base.path)]
+
+
+def test_background_save_once_delta_is_large(ledger):
+    index = attach_index(ledger, save_every=40)
+    ledger.append_many([entry(i) for i in range(100)])
+    for _ in range(200):
+        if index.base is not None and not index._saving:
+            break
+        time.sleep(0.01)
+    assert index.base is not None and index.base.seq >= 39
+    check(index, ledger)
+
+
+def test_stale_snapshot_is_ignored(make_ledger, ledger):
+    ledger.append_many([entry(i) for i in range(30)])
+    attach_index(ledger, save_every=0).save()
+    other = make_ledger("other")
+    other.append_many([entry(i + 1) for i in range(30)])
+    for name in os.listdir(ledger.path):
+        if name.startswith("index"):
+            os.rename(os.path.join(ledger.path, name), os.path.join(other.path, name))
+    index = attach_index(other, save_every=0)
+    assert index.base is None
+    check(index, other)
+
@@ -0,0 +1,106 @@
+import json, os
+import pytest
+import afeg_merkle
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from afeg_ledger import LedgerReader
+from afeg_merkle import attach_merkle, build_levels, inclusion_proof, leaf_hash, merkle_root, verify_proof
+from conftest import entry
+
+
+@pytest.fixture
+def ledger(tmp_path, make_ledger, monkeypatch):
+    monkeypatch.setenv("AFEG_SIGNING_KEY_FILE", str(tmp_path / "keys" / "signing-key.pem"))
+    return make_ledger(segment_records=7)
+
+
+def fill(ledger, blocks=(5, 1, 8, 3)):
+    """Append ``blocks[i]`` records in hour ``i`` (ts 0, 3600, ...), then one in the next hour to seal them."""
+    n = 0
+    for hour, size in enumerate(list(blocks) + [1]):
+        ledger.append_many([entry(n + i) for i in range(size)], [hour * 3600.0 + i for i in range(size)])
+        n += size
+    return n
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 8, 13])
+def test_inclusion_proofs(size):
+    hashes = [f"{i:064x}" for i in range(size)]
+    levels = build_levels([leaf_hash(h) for h in hashes])
+    root = merkle_root([leaf_hash(h) for h in hashes])
+    for i, h in enumerate(hashes):
+        assert verify_proof(h, inclusion_proof(levels, i), root)
+    assert not verify_proof(f"{size:064x}", inclusion_proof(levels, 0), root)
+
+
+def test_published_roots_and_proofs(ledger):
+    cp = attach_merkle(ledger)
+    fill(ledger)
+    assert [r["size"] for r in cp.roots] == [5, 1, 8, 3]
+    assert all(cp.verify_signature(r) for r in cp.roots)
+    for seq in range(17):
+        proof = cp.proof(seq)
+        assert verify_proof(proof["record_hash"], proof["path"], proof["block"]["root"])
+    open_proof = cp.proof(17)
+    assert open_proof["block"]["open"] and verify_proof(open_proof["record_hash"], open_proof["path"], open_proof["block"]["root"])
+
+
+def test_resume_uses_published_roots(ledger):
+    attach_merkle(ledger)
+    fill(ledger)
+    cp = attach_merkle(ledger)  # e.g. another worker starting up
+    proof = cp.proof(9)
+    assert verify_proof(proof["record_hash"], proof["path"], proof["block"]["root"])
+    assert len(cp.roots) == 4
+
+
+def test_verify_blocks_detects_tampering(ledger):
+    cp = attach_merkle(ledger)
+    fill(ledger)
+    assert cp.verify_blocks(cp.roots, workers=1)["ok"]
+    seg = os.path.join(ledger.path, "segment-000001.ndjson")
+    with open(seg) as f:
+        lines = f.readlines()
+    record = json.loads(lines[1])
+    record["kvu"] = 1e6
+    lines[1] = json.dumps(record, separators=(",", ":")) + "\n"
+    with open(seg, "w") as f:
+        f.writelines(lines)
+    result = cp.verify_blocks(cp.roots, workers=1)
+    assert not result["ok"]
+    assert [r["ok"] for r in result["results"]] == [True, True, False, True]
+
+
+def test_verification_reads_without_repairing(ledger):
+    """Verification workers must not take the writer's lock, truncate the tail or rewrite the idx."""
+    cp = attach_merkle(ledger)
+    fill(ledger)
+    seg = os.path.join(ledger.path, "segment-000002.ndjson")
+    with open(seg, "ab") as f:
+        f.write(b'{"seq":18,"ts"')  # a write in progress
+    size, idx = os.path.getsize(seg), os.path.getsize(seg[:-6] + "idx")
+    assert afeg_merkle._verify_block((ledger.path, ledger.segment_records, cp.roots[-1]))["ok"]
+    assert os.path.getsize(seg) == size and os.path.getsize(seg[:-6] + "idx") == idx
+    with pytest.raises(IndexError):
+        list(LedgerReader(ledger.path, ledger.segment_records).iter_records(17, 19))
+
+
+def test_roots_verify_with_the_public_key_only(ledger):
+    cp = attach_merkle(ledger)
+    fill(ledger)
+    root = cp.roots[0]
+    assert afeg_merkle.verify_root(cp.public_key, root)
+    assert not afeg_merkle.verify_root(cp.public_key, dict(root, root="0" * 64))
+    other = afeg_merkle.public_key_hex(Ed25519PrivateKey.generate())
+    assert not afeg_merkle.verify_root(other, root)
+    assert not any(n.endswith((".key", ".pem")) for n in os.listdir(ledger.path))
+
+
+def test_signing_key_outside_the_ledger(ledger, tmp_path):
+    with pytest.raises(ValueError):
+        afeg_merkle.load_signing_key(ledger.path, os.path.join(ledger.path, "signing-key.pem"))
+    path = str(tmp_path / "keys" / "race.pem")
+    afeg_merkle._create_signing_key(path)
+    first = afeg_merkle.public_key_hex(afeg_merkle.load_signing_key(ledger.path, path))
+    afeg_merkle._create_signing_key(path)  # another worker losing the race keeps the first key
+    assert afeg_merkle.public_key_hex(afeg_merkle.load_signing_key(ledger.path, path)) == first
+    assert os.listdir(tmp_path / "keys") == ["race.pem"]  # no tmp files left behind
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+import afeg_simulation
+from afeg_simulation import HOURLY_CURVE, NATIONAL_DAILY_KVU, REGION_SHARES, _simulate_chunk, simulate
+
+
+def reference_chunk(paths, days, seed, jitter, daily_sigma):
+    """Loop-by-loop version of ``_simulate_chunk`` over the same random draws."""
+    rng = np.random.default_rng(seed)
+    shares = [v / sum(REGION_SHARES.values()) for v in REGION_SHARES.values()]
+    shock = rng.lognormal(-daily_sigma ** 2 / 2, daily_sigma, (paths, days, len(shares), 1))
+    noise = rng.uniform(*jitter, (paths, days, len(shares), 24))
+    daily, hourly, regions = np.zeros((paths, days)), np.zeros((paths, 24)), np.zeros((paths, len(shares)))
+    for p in range(paths):
+        for d in range(days):
+            for r, share in enumerate(shares):
+                for h in range(24):
+                    kvu = NATIONAL_DAILY_KVU * share * HOURLY_CURVE[h] * shock[p, d, r, 0] * noise[p, d, r, h]
+                    daily[p, d] += kvu
+                    hourly[p, h] += kvu / days
+                    regions[p, r] += kvu
+    return daily, hourly, regions
+
+
+def without_timing(result):
+    return {k: v for k, v in result.items() if k != "elapsed_s"}
+
+
+def test_vectorised_chunk_matches_reference():
+    args = (3, 2, np.random.SeedSequence(11), (0.6, 1.4), 0.1)
+    for got, want in zip(_simulate_chunk(args), reference_chunk(*args)):
+        np.testing.assert_allclose(got, want, rtol=1e-9)
+
+
+def test_seeded_runs_are_deterministic(monkeypatch):
+    monkeypatch.setattr(afeg_simulation, "MAX_CHUNK_ELEMENTS", 5 * 288)  # several chunks
+    first = simulate(paths=40, days=3, seed=7, workers=0)
+    assert without_timing(simulate(paths=40, days=3, seed=7, workers=0)) == without_timing(first)
+    assert simulate(paths=40, days=3, seed=8, workers=0)["total"] != first["total"]
+
+
+def test_pool_matches_in_process(monkeypatch):
+    monkeypatch.setattr(afeg_simulation, "MAX_CHUNK_ELEMENTS", 5 * 288)
+    in_process = simulate(paths=20, days=2, seed=3, workers=0)
+    assert without_timing(simulate(paths=20, days=2, seed=3, workers=2)) == without_timing(in_process)
+
+
+def test_job_size_is_capped():
+    with pytest.raises(ValueError):
+        simulate(paths=afeg_simulation.MAX_PATHS + 1)
+    with pytest.raises(ValueError):
+        simulate(paths=1_000, days=afeg_simulation.MAX_PATH_DAYS // 1_000 + 1)
@@ -0,0 +1,78 @@
+import os
+import pytest
+import afeg_view
+from afeg_index import attach_index
+from afeg_view import attach_view
+
+
+def entry(i):
+    return {"query": f"query {i} {'risky' if i % 5 == 0 else 'plain'}", "kvu": float(i * 7 % 11),
+            "status": "INTERCEPT" if i % 5 == 0 else "COMPLIANT", "origin": ("Live", "Surge")[i % 2]}
+
+
+@pytest.fixture
+def ledger(ledger):
+    ledger.append_many([entry(i) for i in range(120)])
+    return ledger
+
+
+def all_pages(view, **kwargs):
+    seqs, cursor = [], None
+    while True:
+        page = view.page(limit=7, cursor=cursor, **kwargs)
+        seqs.extend(r["seq"] for r in page["rows"])
+        if page["next_cursor"] is None:
+            return seqs
+        cursor = page["next_cursor"]
+
+def expected(ledger, sort, order, keep=lambda r: True):
+    rows = [r for r in ledger.iter_records() if keep(r)]
+    key = {"ts": lambda r: r["seq"], "kvu": lambda r: (r["kvu"], r["seq"]),
+           "status": lambda r: (r["status"], -r["seq"] if order == "asc" else r["seq"])}[sort]
+    return [r["seq"] for r in sorted(rows, key=key, reverse=order == "desc")]
+
+
+@pytest.mark.parametrize("sort", ["ts", "kvu", "status"])
+@pytest.mark.parametrize("order", ["desc", "asc"])
+def test_pages_cover_the_ledger_in_order(ledger, sort, order):
+    view = attach_view(ledger, save_every=0)
+    assert all_pages(view, sort=sort, order=order) == expected(ledger, sort, order)
+    surge = lambda r: r["origin"] == "Surge" and r["kvu"] >= 3
+    assert all_pages(view, sort=sort, order=order, origin=["Surge"], min_kvu=3) == expected(ledger, sort, order, surge)
+
+
+def test_kvu_order_picks_up_new_rows(ledger):
+    view = attach_view(ledger, save_every=0)
+    first = view.page(sort="kvu", limit=5)
+    ledger.append_many([{"query": "late", "kvu": 100.0, "status": "COMPLIANT"}, {"query": "late", "kvu": 5.0, "status": "COMPLIANT"}])
+    assert view.page(sort="kvu", limit=1)["rows"][0]["seq"] == 120
+    assert all_pages(view, sort="kvu", order="asc") == expected(ledger, "kvu", "asc")
+    assert first["rows"][0]["kvu"] == 10.0
+
+
+def test_columns_are_saved_and_restored(ledger):
+    view = attach_view(ledger, save_every=0)
+    view.save()
+    ledger.append_many([entry(i) for i in range(120, 130)])
+    reopened = attach_view(ledger, save_every=0)
+    assert reopened._saved == 120 and len(reopened.columns) == 130
+    for sort in ("ts", "kvu", "status"):
+        assert all_pages(reopened, sort=sort, origin=["Live"]) == all_pages(view, sort=sort, origin=["Live"])
+
+
+def test_saved_columns_for_another_chain_are_ignored(make_ledger, ledger):
+    attach_view(ledger, save_every=0).save()
+    other = make_ledger("other")
+    other.append_many([entry(i + 1) for i in range(120)])
+    os.replace(os.path.join(ledger.path, "view.npz"), os.path.join(other.path, "view.npz"))
+    view = attach_view(other, save_every=0)
+    assert view._saved == 0 and len(view.columns) == 120
+
+
+def test_search_truncation_is_reported(ledger, monkeypatch):
+    view = attach_view(ledger, attach_index(ledger, save_every=0), save_every=0)
+    page = view.page(q="risky")
+    assert not page["truncated"] and len(page["rows"]) == 24
+    monkeypatch.setattr(afeg_view, "SEARCH_LIMIT", 10)
+    page = view.page(q="risky")
+    assert page["truncated"] and [r["seq"] for r in page["rows"]] == list(range(115, 65, -5))